@@ -0,0 +1,118 @@
+import copy
+import hashlib
+import hmac
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from rest_framework.authentication import BasicAuthentication, TokenAuthentication
+
+# Seconds a verified credential is trusted without re-checking it
+AUTH_CACHE_TTL = float(os.getenv("EFB_AUTH_CACHE_TTL", "60"))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("EFB_AUTH_CACHE_MAX_ENTRIES", "1024"))
+
+
+class CredentialCache:
+    """
+    In-process map of keyed credential hash -> (expires_at, user, auth).
+    Raw credentials are never stored, only an HMAC keyed with SECRET_KEY.
+    """
+
+    def __init__(self, ttl=AUTH_CACHE_TTL, max_entries=AUTH_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(*parts):
+        msg = "\0".join(parts).encode("utf-8")
+        return hmac.new(settings.SECRET_KEY.encode("utf-8"), msg, hashlib.sha256).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, user, auth = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+        # Copy so per-request attributes never leak between requests
+        return copy.copy(user), auth
+
+    def set(self, key, user, auth):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._evict()
+            self._entries[key] = (time.monotonic() + self.ttl, user, auth)
+
+    # Drop expired entries, then the oldest ones if still full
+    def _evict(self):
+        now = time.monotonic()
+        for k in [k for k, (exp, _, _) in self._entries.items() if exp <= now]:
+            del self._entries[k]
+        while len(self._entries) >= self.max_entries:
+            del self._entries[next(iter(self._entries))]
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for k in [k for k, (_, user, _) in self._entries.items() if user.pk == user_id]:
+                del self._entries[k]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+credential_cache = CredentialCache()
+
+
+class CachedBasicAuthentication(BasicAuthentication):
+    """
+    BasicAuthentication that skips password hashing for recently verified credentials.
+    """
+
+    def authenticate_credentials(self, userid, password, request=None):
+        key = credential_cache.key("basic", userid, password)
+        hit = credential_cache.get(key)
+        if hit is not None:
+            return hit
+        user, auth = super().authenticate_credentials(userid, password, request)
+        credential_cache.set(key, user, auth)
+        return user, auth
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication that skips the token lookup for recently verified tokens.
+    """
+
+    def authenticate_credentials(self, key):
+        cache_key = credential_cache.key("token", key)
+        hit = credential_cache.get(cache_key)
+        if hit is not None:
+            return hit
+        user, token = super().authenticate_credentials(key)
+        credential_cache.set(cache_key, user, token)
+        return user, token
+
+
+# Password, activation or token changes drop the user's cached credentials
+# Other worker processes only pick the change up when their entries expire (TTL)
+def _invalidate_user(sender, instance, **kwargs):
+    credential_cache.invalidate_user(instance.pk)
+
+
+def _invalidate_token_user(sender, instance, **kwargs):
+    credential_cache.invalidate_user(instance.user_id)
+
+
+post_save.connect(_invalidate_user, sender=settings.AUTH_USER_MODEL, dispatch_uid="efb_auth_user_saved")
+post_delete.connect(_invalidate_user, sender=settings.AUTH_USER_MODEL, dispatch_uid="efb_auth_user_deleted")
+post_save.connect(_invalidate_token_user, sender="authtoken.Token", dispatch_uid="efb_auth_token_saved")
+post_delete.connect(_invalidate_token_user, sender="authtoken.Token", dispatch_uid="efb_auth_token_deleted")
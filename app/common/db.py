@@ -0,0 +1,38 @@
+import os
+
+from django.db.backends.signals import connection_created
+
+# Set to 0 to keep SQLite's defaults (rollback journal, full fsync)
+SQLITE_TUNE = os.getenv("EFB_SQLITE_TUNE", "1") not in {"0", "false", "no"}
+# Readers never block the writer, and the writer never blocks readers
+SQLITE_JOURNAL_MODE = os.getenv("EFB_SQLITE_JOURNAL_MODE", "WAL")
+# NORMAL fsyncs at checkpoints only; with WAL a crash can lose the last commits, never corrupt the file
+SQLITE_SYNCHRONOUS = os.getenv("EFB_SQLITE_SYNCHRONOUS", "NORMAL")
+# Wait this long for a lock instead of failing with "database is locked"
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("EFB_SQLITE_BUSY_TIMEOUT_MS", "5000"))
+# Bytes of the file read through mmap instead of read() calls
+SQLITE_MMAP_SIZE = int(os.getenv("EFB_SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+# Page cache per connection, negative values are KiB
+SQLITE_CACHE_SIZE = int(os.getenv("EFB_SQLITE_CACHE_SIZE", "-20000"))
+
+
+def sqlite_pragmas():
+    return [
+        f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}",
+        f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}",
+        f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}",
+        f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}",
+        f"PRAGMA cache_size={SQLITE_CACHE_SIZE}",
+    ]
+
+
+# Runs once per new connection; with CONN_MAX_AGE that is once per worker thread, not per request
+def _configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != "sqlite" or not SQLITE_TUNE:
+        return
+    with connection.cursor() as cursor:
+        for pragma in sqlite_pragmas():
+            cursor.execute(pragma)
+
+
+connection_created.connect(_configure_sqlite, dispatch_uid="efb_sqlite_pragmas")
@@ -1,19 +1,191 @@
+import atexit
 import logging
+import logging.handlers
 import os
+import queue
+import sys
+import threading
+import time
+from collections import Counter
 
 import structlog
 
 
+def _parse_sample(spec):
+    rates = {}
+    for item in spec.split(","):
+        event, _, every = item.strip().partition("=")
+        if event and every:
+            rates[event] = max(1, int(every))
+    return rates
+
+
+# High-frequency events: "event=N" keeps one line in N
+LOG_SAMPLE = _parse_sample(os.getenv("EFB_LOG_SAMPLE", "simulation.user_done=10"))
+# Events never written one by one, only counted
+LOG_AGGREGATE = {
+    e.strip()
+    for e in os.getenv("EFB_LOG_AGGREGATE", "classify.catalog_hit,classify.catalog_miss,openai.call").split(",")
+    if e.strip()
+}
+# Seconds between "log.counters" lines for sampled and aggregated events
+LOG_COUNTERS_INTERVAL = float(os.getenv("EFB_LOG_COUNTERS_INTERVAL", "60"))
+# Write from a background thread, set to 0 to write inline
+LOG_ASYNC = os.getenv("EFB_LOG_ASYNC", "1") not in {"0", "false", "no"}
+
+
+class EventVolume:
+    """
+    structlog processor for hot-path events: counts sampled and aggregated
+    events, drops the lines that should not be written, and periodically
+    logs the counts as a single "log.counters" event. A daemon thread writes
+    the counts every interval, so quiet periods after a burst are reported too.
+    """
+
+    def __init__(self, sample, aggregate, interval):
+        self.sample = sample
+        self.aggregate = aggregate
+        self.interval = interval
+        self._seen = Counter()
+        self._window = Counter()
+        self._flushed_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._timer = None
+        self._stopped = threading.Event()
+
+    def __call__(self, logger, method_name, event_dict):
+        event = event_dict.get("event")
+        if event not in self.aggregate and event not in self.sample:
+            return event_dict
+        with self._lock:
+            self._seen[event] += 1
+            self._window[event] += 1
+            seen = self._seen[event]
+        self._ensure_timer()
+        self._emit_counters()
+
+        if event in self.aggregate:
+            raise structlog.DropEvent
+        every = self.sample[event]
+        if (seen - 1) % every:
+            raise structlog.DropEvent
+        event_dict["sampled_1_in"] = every
+        return event_dict
+
+    def _emit_counters(self, force=False):
+        # The counters line goes through the processors too, do not recurse
+        if getattr(self._local, "emitting", False):
+            return
+        with self._lock:
+            now = time.monotonic()
+            if not self._window or (not force and now - self._flushed_at < self.interval):
+                return
+            counts, self._window = dict(self._window), Counter()
+            seconds = now - self._flushed_at
+            self._flushed_at = now
+        self._local.emitting = True
+        try:
+            structlog.get_logger("common.logging").info("log.counters", counts=counts, seconds=round(seconds, 1))
+        finally:
+            self._local.emitting = False
+
+    # Started by the first counted event; threads do not survive fork, so a
+    # forked worker starts its own on its first event
+    def _ensure_timer(self):
+        timer = self._timer
+        if (timer is not None and timer.is_alive()) or self.interval <= 0 or self._stopped.is_set():
+            return
+        with self._lock:
+            if self._timer is not None and self._timer.is_alive():
+                return
+            self._timer = threading.Thread(target=self._tick, name="log-counters", daemon=True)
+            self._timer.start()
+
+    def _tick(self):
+        while not self._stopped.wait(self.interval):
+            self._emit_counters()
+
+    # Write the pending counts now (end of a command, process exit)
+    def flush(self):
+        self._emit_counters(force=True)
+
+    def stop(self):
+        self._stopped.set()
+
+
+# Resolves sys.stdout on every write, so a swapped stdout (tests, reloads) is followed
+class _StdoutHandler(logging.StreamHandler):
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+event_volume = EventVolume(LOG_SAMPLE, LOG_AGGREGATE, LOG_COUNTERS_INTERVAL)
+
+_output = None
+_queue_handler = None
+_listener = None
+
+
+def _start_listener():
+    global _listener
+    log_queue = queue.SimpleQueue()
+    _queue_handler.queue = log_queue
+    _listener = logging.handlers.QueueListener(log_queue, _output)
+    _listener.start()
+
+
+# The writer thread does not survive fork (gunicorn --preload), start a new one in the child
+def _after_fork():
+    if _queue_handler is not None:
+        _start_listener()
+
+
+def _shutdown():
+    event_volume.stop()
+    event_volume.flush()
+    if _listener is not None:
+        _listener.stop()
+
+
+def flush_counters():
+    event_volume.flush()
+
+
+# Every line (structlog and stdlib) is a JSON or plain message on stdout
+# With LOG_ASYNC, callers only enqueue; a background thread does the writes
 def configure_logging():
+    global _output, _queue_handler
     level = os.getenv("LOG_LEVEL", "INFO").upper()
-    logging.basicConfig(level=level, format="%(message)s")
+
+    if _output is None:
+        _output = _StdoutHandler()
+        _output.setFormatter(logging.Formatter("%(message)s"))
+        root = logging.getLogger()
+        if LOG_ASYNC:
+            _queue_handler = logging.handlers.QueueHandler(queue.SimpleQueue())
+            _start_listener()
+            root.addHandler(_queue_handler)
+            os.register_at_fork(after_in_child=_after_fork)
+        else:
+            root.addHandler(_output)
+        atexit.register(_shutdown)
+    logging.getLogger().setLevel(level)
+
     structlog.configure(
         processors=[
             structlog.contextvars.merge_contextvars,
+            event_volume,
             structlog.processors.add_log_level,
             structlog.processors.TimeStamper(fmt="iso"),
             structlog.processors.JSONRenderer(),
         ],
+        logger_factory=structlog.stdlib.LoggerFactory(),
         wrapper_class=structlog.make_filtering_bound_logger(getattr(logging, level, logging.INFO)),
         cache_logger_on_first_use=True,
     )
@@ -0,0 +1,256 @@
+"""
+Counters and histograms in Prometheus text format, without a client library.
+
+Each process keeps its own registry. With EFB_METRICS_DIR set, every process
+also dumps it to <dir>/<pid>-<id>.json (at most every EFB_METRICS_FLUSH_INTERVAL
+seconds) and render() merges all dumps, so one scrape covers every gunicorn
+worker. Dumps of exited workers are folded into one exited.json, so counters
+never go backwards and the number of files stays one per live process.
+"""
+import fcntl
+import json
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+
+METRICS_DIR = os.getenv("EFB_METRICS_DIR", "")
+FLUSH_INTERVAL = float(os.getenv("EFB_METRICS_FLUSH_INTERVAL", "1"))
+# Sum of the dumps of exited processes
+EXITED_FILE = "exited.json"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+# name -> (type, help, buckets)
+METRICS = {
+    "efb_http_request_duration_seconds": ("histogram", "Request latency by view", LATENCY_BUCKETS),
+    "efb_http_response_size_bytes": ("histogram", "Response body size by view", SIZE_BUCKETS),
+    "efb_db_queries_per_request": ("histogram", "DB queries run while serving a request", COUNT_BUCKETS),
+    "efb_db_time_per_request_seconds": ("histogram", "DB time spent while serving a request", LATENCY_BUCKETS),
+    "efb_llm_request_duration_seconds": ("histogram", "OpenAI request latency by purpose", LATENCY_BUCKETS),
+    "efb_llm_tokens_total": ("counter", "OpenAI tokens by purpose and direction", None),
+    "efb_llm_cost_usd_total": ("counter", "Estimated OpenAI cost by purpose", None),
+    "efb_llm_errors_total": ("counter", "Failed OpenAI requests by purpose", None),
+    "efb_response_cache_requests_total": ("counter", "Response cache lookups by namespace and result", None),
+}
+
+
+class Registry:
+    """
+    Per-process metric values keyed by (name, sorted label pairs).
+    Histograms are stored as [bucket counts..., +Inf count, sum].
+    """
+
+    def __init__(self, directory=METRICS_DIR, flush_interval=FLUSH_INTERVAL):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._values = {}
+        self._pid = os.getpid()
+        self._file = None
+        self._flushed_at = time.monotonic()
+
+    # A forked worker starts empty and gets its own dump file
+    def _check_fork(self):
+        if self._pid != os.getpid():
+            self._reset()
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._check_fork()
+            self._values[key] = self._values.get(key, 0) + amount
+        self._maybe_flush()
+
+    def observe(self, name, value, **labels):
+        buckets = METRICS[name][2]
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._check_fork()
+            hist = self._values.get(key)
+            if hist is None:
+                hist = self._values[key] = [0] * (len(buckets) + 2)
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    hist[i] += 1
+            hist[-2] += 1
+            hist[-1] += value
+        self._maybe_flush()
+
+    def _snapshot(self):
+        with self._lock:
+            self._check_fork()
+            return [
+                [name, list(labels), list(v) if isinstance(v, list) else v]
+                for (name, labels), v in self._values.items()
+            ]
+
+    def _maybe_flush(self):
+        if self.directory and time.monotonic() - self._flushed_at >= self.flush_interval:
+            self.flush()
+
+    # Atomic replace, a concurrent render never reads a half-written dump
+    def flush(self):
+        if not self.directory:
+            return
+        directory = Path(self.directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        # Under the lock: two threads must not create two dumps for one process
+        with self._lock:
+            self._check_fork()
+            self._flushed_at = time.monotonic()
+            if self._file is None:
+                self._file = directory / f"{self._pid}-{uuid.uuid4().hex[:8]}.json"
+            path = self._file
+        tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps(self._snapshot()))
+        os.replace(tmp, path)
+
+    # Entries of this process, or of every process dump when a directory is set
+    def collect(self):
+        if not self.directory:
+            return self._snapshot()
+        self.flush()
+        prune(self.directory)
+        directory = Path(self.directory)
+        exited = _read(directory / EXITED_FILE) or {"folded": [], "entries": []}
+        entries = list(exited["entries"])
+        folded = set(exited["folded"])
+        for path in directory.glob("*.json"):
+            if path.name != EXITED_FILE and path.name not in folded:
+                entries.extend(_read(path) or [])
+        return entries
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+def _dump_pid(path):
+    pid, _, _ = path.stem.partition("-")
+    return int(pid) if pid.isdigit() else None
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _read(path):
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+
+
+# Fold the dumps of exited processes (all of them, or only `pids`) into EXITED_FILE
+# Serialized with a lock file; the names folded last are kept in EXITED_FILE so a crash
+# between writing it and deleting them never counts a dump twice
+def prune(directory=METRICS_DIR, pids=None):
+    directory = Path(directory)
+    if not directory.is_dir():
+        return 0
+    with open(directory / ".lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        exited = directory / EXITED_FILE
+        state = _read(exited) or {"folded": [], "entries": []}
+        dead = []
+        for path in directory.glob("*.json"):
+            pid = _dump_pid(path)
+            if pid is not None and (pid in pids if pids is not None else not _alive(pid)):
+                dead.append(path)
+        if not dead:
+            return 0
+        already = set(state["folded"])
+        entries = list(state["entries"])
+        for path in dead:
+            if path.name not in already:
+                entries.extend(_read(path) or [])
+        folded = [
+            [name, [list(pair) for pair in labels], value]
+            for (name, labels), value in _merge(entries).items()
+        ]
+        tmp = exited.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"folded": [path.name for path in dead], "entries": folded}))
+        os.replace(tmp, exited)
+        for path in dead:
+            path.unlink(missing_ok=True)
+    return len(dead)
+
+
+# Gunicorn child_exit hook: fold the worker's dump right away
+def mark_process_dead(pid, directory=METRICS_DIR):
+    if directory:
+        prune(directory, pids={pid})
+
+
+def _merge(entries):
+    merged = {}
+    for name, labels, value in entries:
+        if name not in METRICS:
+            continue
+        key = (name, tuple(tuple(pair) for pair in labels))
+        if key not in merged:
+            merged[key] = list(value) if isinstance(value, list) else value
+        elif isinstance(value, list):
+            merged[key] = [a + b for a, b in zip(merged[key], value, strict=True)]
+        else:
+            merged[key] += value
+    return merged
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(pairs, **extra):
+    items = [*pairs, *extra.items()]
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+def _fmt(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# Prometheus text exposition format (version 0.0.4)
+def render(registry=None):
+    merged = _merge((registry or default_registry).collect())
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        series = sorted(
+            ((labels, v) for (n, labels), v in merged.items() if n == name),
+            key=lambda item: item[0],
+        )
+        if not series:
+            continue
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in series:
+            if kind == "histogram":
+                # Bucket counts are stored cumulative already
+                for bound, count in zip(buckets, value, strict=False):
+                    lines.append(f"{name}_bucket{_labels(labels, le=_fmt(bound))} {count}")
+                lines.append(f"{name}_bucket{_labels(labels, le='+Inf')} {value[-2]}")
+                lines.append(f"{name}_sum{_labels(labels)} {_fmt(value[-1])}")
+                lines.append(f"{name}_count{_labels(labels)} {value[-2]}")
+            else:
+                lines.append(f"{name}{_labels(labels)} {_fmt(value)}")
+    return "\n".join(lines) + "\n"
+
+
+default_registry = Registry()
+inc = default_registry.inc
+observe = default_registry.observe
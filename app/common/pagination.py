@@ -0,0 +1,45 @@
+import os
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+
+# Above this many rows, list pages stop counting exactly
+EXACT_COUNT_LIMIT = int(os.getenv("EFB_EXACT_COUNT_LIMIT", "10000"))
+
+
+# Row count from table statistics, None when the backend has none
+def estimate_rows(model, using="default"):
+    connection = connections[using]
+    table = connection.ops.quote_name(model._meta.db_table)
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [model._meta.db_table])
+        elif connection.vendor == "sqlite":
+            # Highest rowid: one index seek, overestimates after deletes
+            cursor.execute(f"SELECT MAX(rowid) FROM {table}")
+        else:
+            return None
+        row = cursor.fetchone()
+    return max(0, int(row[0])) if row and row[0] is not None else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for tables too large for a COUNT(*) per page load.
+    An unfiltered list reports the table estimate; a filtered one counts at
+    most EXACT_COUNT_LIMIT rows, so pages past the limit need a narrower filter.
+    """
+
+    @cached_property
+    def count(self):
+        qs = self.object_list
+        if not isinstance(qs, QuerySet):
+            return super().count
+        if not qs.query.where:
+            estimate = estimate_rows(qs.model, qs.db)
+            if estimate is not None and estimate > EXACT_COUNT_LIMIT:
+                return estimate
+        # COUNT over a LIMIT subquery stops scanning at the limit
+        return qs[:EXACT_COUNT_LIMIT].count()
@@ -0,0 +1,204 @@
+"""
+Opt-in cProfile run of a single request, for staff only.
+
+Send "X-EFB-Profile: 1" (or add ?_profile=1) with staff credentials (session,
+Token or Basic). The response carries X-EFB-Profile-Id and the pstats file
+can be downloaded from /ops/profiles/<id>. At most EFB_PROFILE_MAX_PER_MINUTE
+requests per worker are profiled, the rest are served normally. One request
+is profiled at a time per worker (Python 3.12 allows a single active
+profiler): overlapping ones are served unprofiled with "X-EFB-Profile: busy".
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+PROFILE_DIR = Path(os.getenv("EFB_PROFILE_DIR") or Path(tempfile.gettempdir()) / "efb-profiles")
+MAX_PER_MINUTE = int(os.getenv("EFB_PROFILE_MAX_PER_MINUTE", "10"))
+KEEP = int(os.getenv("EFB_PROFILE_KEEP", "50"))
+
+HEADER = "HTTP_X_EFB_PROFILE"
+QUERY_FLAG = "_profile"
+PROFILE_ID_RE = re.compile(r"^\d+-[0-9a-f]{8}$")
+
+_lock = threading.Lock()
+_recent = deque()
+# Held while a request is being profiled
+_active = threading.Lock()
+
+
+def requested(request):
+    return request.META.get(HEADER) == "1" or request.GET.get(QUERY_FLAG) == "1"
+
+
+# Sliding one-minute window per worker process
+def _take_slot():
+    now = time.monotonic()
+    with _lock:
+        while _recent and now - _recent[0] >= 60:
+            _recent.popleft()
+        if len(_recent) >= MAX_PER_MINUTE:
+            return False
+        _recent.append(now)
+        return True
+
+
+def reset_rate_limit():
+    with _lock:
+        _recent.clear()
+
+
+# Session user, else the API authenticators (cached, so no extra hashing)
+def _staff_user(request):
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        return user if user.is_staff else None
+    drf_request = Request(
+        request,
+        authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES],
+    )
+    try:
+        user = drf_request.user
+    except exceptions.APIException:
+        return None
+    return user if user is not None and user.is_authenticated and user.is_staff else None
+
+
+def _save(profiler, request, response, elapsed, user):
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    profile_id = f"{int(time.time())}-{uuid.uuid4().hex[:8]}"
+    profiler.dump_stats(str(PROFILE_DIR / f"{profile_id}.prof"))
+    match = request.resolver_match
+    meta = {
+        "id": profile_id,
+        "view": match.view_name if match else None,
+        "method": request.method,
+        "path": request.get_full_path(),
+        "status": response.status_code,
+        "ms": round(elapsed * 1000, 1),
+        "user": user.get_username(),
+        "created_at": int(time.time()),
+    }
+    (PROFILE_DIR / f"{profile_id}.json").write_text(json.dumps(meta))
+    _prune()
+    return profile_id
+
+
+# Keep the newest KEEP profiles
+def _prune():
+    metas = sorted(PROFILE_DIR.glob("*.json"), reverse=True)
+    for path in metas[KEEP:]:
+        path.unlink(missing_ok=True)
+        path.with_suffix(".prof").unlink(missing_ok=True)
+
+
+# Newest first
+def list_profiles():
+    if not PROFILE_DIR.is_dir():
+        return []
+    profiles = []
+    for path in sorted(PROFILE_DIR.glob("*.json"), reverse=True):
+        try:
+            profiles.append(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            continue
+    return profiles
+
+
+# Path of the pstats file, None for unknown or malformed ids
+def profile_path(profile_id):
+    if not PROFILE_ID_RE.match(profile_id):
+        return None
+    path = PROFILE_DIR / f"{profile_id}.prof"
+    return path if path.is_file() else None
+
+
+# Top functions by cumulative time, as pstats prints them
+def summary(path, limit=40):
+    out = io.StringIO()
+    pstats.Stats(str(path), stream=out).sort_stats("cumulative").print_stats(limit)
+    return out.getvalue()
+
+
+class RequestProfilerMiddleware:
+    """
+    Under ASGI the profile covers the event loop thread only, so work done in
+    sync_to_async threads (ORM calls) shows up as time spent waiting.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not requested(request):
+            return self.get_response(request)
+        user = _staff_user(request)
+        if user is None:
+            return self.get_response(request)
+        if not _active.acquire(blocking=False):
+            return self._unprofiled(self.get_response(request), "busy")
+        try:
+            if not _take_slot():
+                return self._unprofiled(self.get_response(request), "rate-limited")
+            profiler = cProfile.Profile()
+            start = time.perf_counter()
+            response = profiler.runcall(self.get_response, request)
+            elapsed = time.perf_counter() - start
+        finally:
+            _active.release()
+        return self._attach(response, _save(profiler, request, response, elapsed, user))
+
+    async def __acall__(self, request):
+        if not requested(request):
+            return await self.get_response(request)
+        user = await sync_to_async(_staff_user)(request)
+        if user is None:
+            return await self.get_response(request)
+        if not _active.acquire(blocking=False):
+            return self._unprofiled(await self.get_response(request), "busy")
+        try:
+            if not _take_slot():
+                return self._unprofiled(await self.get_response(request), "rate-limited")
+            profiler = cProfile.Profile()
+            start = time.perf_counter()
+            profiler.enable()
+            try:
+                response = await self.get_response(request)
+            finally:
+                profiler.disable()
+            elapsed = time.perf_counter() - start
+        finally:
+            _active.release()
+        profile_id = await sync_to_async(_save)(profiler, request, response, elapsed, user)
+        return self._attach(response, profile_id)
+
+    @staticmethod
+    def _unprofiled(response, reason):
+        response["X-EFB-Profile"] = reason
+        return response
+
+    @staticmethod
+    def _attach(response, profile_id):
+        response["X-EFB-Profile-Id"] = profile_id
+        response["X-EFB-Profile-Url"] = f"/ops/profiles/{profile_id}"
+        return response
@@ -0,0 +1,60 @@
+import time
+from contextlib import contextmanager
+
+
+class StageTimer:
+    """
+    Wall time and call count per named stage.
+    Stages can nest, a stage's time excludes its child stages, so the
+    totals never count the same second twice.
+    """
+
+    def __init__(self):
+        self._totals = {}
+        self._stack = []
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        self._stack.append(0.0)
+        try:
+            yield
+        finally:
+            children = self._stack.pop()
+            elapsed = time.perf_counter() - start
+            self._record(name, elapsed - children)
+            if self._stack:
+                self._stack[-1] += elapsed
+
+    # Record time measured elsewhere (e.g. a transaction commit)
+    def add(self, name, seconds, calls=1):
+        self._record(name, seconds, calls)
+        if self._stack:
+            self._stack[-1] += seconds
+
+    def _record(self, name, seconds, calls=1):
+        entry = self._totals.setdefault(name, [0, 0.0])
+        entry[0] += calls
+        entry[1] += seconds
+
+    # Rows sorted by time, plus "other" for whatever wall time no stage covered
+    def report(self, wall_seconds):
+        rows = [
+            {"stage": name, "calls": calls, "seconds": round(seconds, 6)}
+            for name, (calls, seconds) in self._totals.items()
+        ]
+        covered = sum(seconds for _, seconds in self._totals.values())
+        rows.append({"stage": "other", "calls": None, "seconds": round(max(0.0, wall_seconds - covered), 6)})
+        rows.sort(key=lambda row: -row["seconds"])
+        for row in rows:
+            row["share"] = round(row["seconds"] / wall_seconds, 4) if wall_seconds else None
+        return rows
+
+    @staticmethod
+    def format_table(rows):
+        lines = [f"{'stage':<18} {'calls':>7} {'seconds':>10} {'share':>7}"]
+        for row in rows:
+            calls = "" if row["calls"] is None else row["calls"]
+            share = "" if row["share"] is None else f"{row['share']:.1%}"
+            lines.append(f"{row['stage']:<18} {calls:>7} {row['seconds']:>10.3f} {share:>7}")
+        return "\n".join(lines)
@@ -3,4 +3,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings.base")
+# Serve read endpoints with the async views, set EFB_ASYNC_READS=0 to opt out
+os.environ.setdefault("EFB_ASYNC_READS", "1")
 application = get_asgi_application()
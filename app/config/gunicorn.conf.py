@@ -0,0 +1,19 @@
+# Gunicorn settings shared by the WSGI and ASGI serving modes (-c config/gunicorn.conf.py)
+import os
+
+# EFB_PRELOAD=1 imports the app once in the master and forks warm workers
+preload_app = os.getenv("EFB_PRELOAD", "0").lower() in {"1", "true", "yes"}
+
+
+# Runs in the master after the preload, before the workers are forked
+def when_ready(server):
+    if not server.cfg.preload_app:
+        return
+    from foods.startup import warm
+    warm()
+
+
+# A recycled or crashed worker's metrics dump is folded into the exited totals
+def child_exit(server, worker):
+    from common import metrics
+    metrics.mark_process_dead(worker.pid)
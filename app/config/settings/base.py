@@ -26,10 +26,11 @@ INSTALLED_APPS = [
     "django.contrib.staticfiles",
     "rest_framework",
     "rest_framework.authtoken",
-    "foods",
+    "foods.app.FoodsConfig",
 ]
 
 MIDDLEWARE = [
+    "common.middleware.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -37,6 +38,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "common.profiling.RequestProfilerMiddleware",
 ]
 
 TEMPLATES = [
@@ -56,6 +58,9 @@ TEMPLATES = [
 ]
 
 ROOT_URLCONF = "config.urls"
+
+# Route read endpoints to async views (set by config/asgi.py)
+EFB_ASYNC_READS = os.getenv("EFB_ASYNC_READS", "0") == "1"
 WSGI_APPLICATION = "config.wsgi.application"
 ASGI_APPLICATION = "config.asgi.application"
 
@@ -83,17 +88,48 @@ else:
         }
     }
 
+# Reuse a worker's connection across requests (SQLite PRAGMAs run once per connection, see common.db)
+# Off for the async views: sync_to_async threads change between requests and would leak connections
+CONN_MAX_AGE = int(os.getenv("EFB_CONN_MAX_AGE", "0" if EFB_ASYNC_READS else "60"))
+DATABASES["default"]["CONN_MAX_AGE"] = CONN_MAX_AGE
+DATABASES["default"]["CONN_HEALTH_CHECKS"] = CONN_MAX_AGE > 0
+
+# Response cache, file-based when a shared dir is set so gunicorn workers share entries
+EFB_CACHE_DIR = os.getenv("EFB_CACHE_DIR", "")
+EFB_CACHE_TIMEOUT = int(os.getenv("EFB_CACHE_TIMEOUT", "300"))
+
+if EFB_CACHE_DIR:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": EFB_CACHE_DIR,
+            "TIMEOUT": EFB_CACHE_TIMEOUT,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "efb",
+            "TIMEOUT": EFB_CACHE_TIMEOUT,
+        }
+    }
+
 STATIC_ROOT = Path(__file__).resolve().parents[2] / "staticfiles"
 
 REST_FRAMEWORK = {
     "DEFAULT_RENDERER_CLASSES": ["rest_framework.renderers.JSONRenderer"],
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
-        "rest_framework.authentication.BasicAuthentication",
+        "common.authentication.CachedTokenAuthentication",
+        "common.authentication.CachedBasicAuthentication",
     ],
     "DEFAULT_PERMISSION_CLASSES": ["rest_framework.permissions.IsAuthenticated"],
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.LimitOffsetPagination",
     "PAGE_SIZE": 50,
+    # Per-user request rates for the views that set a throttle scope
+    "DEFAULT_THROTTLE_RATES": {
+        "classify": os.getenv("EFB_CLASSIFY_THROTTLE", "30/min"),
+    },
 }
 
 configure_logging()
@@ -1,32 +1,136 @@
+import uuid
+
 from django.contrib import admin
+from django.db.models import Q
+
+from common.pagination import EstimatedCountPaginator
+
+from .models import (
+    Conversation,
+    FavoriteFood,
+    FoodCatalog,
+    PromptTemplate,
+    RunSummary,
+    SimulationRun,
+    UserProfile,
+)
+from .normalize import normalize_food_name
+
+# Highest code point, "prefix" <= value < "prefix" + MAX_CHAR covers every value starting with prefix
+MAX_CHAR = "\U0010ffff"
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Changelist for tables with millions of rows: estimated counts, FK widgets
+    that never load a whole table, and search restricted to indexed lookups.
+
+    search_lookups maps a field to "uuid" (exact match, ignored unless the term
+    is a UUID) or "prefix" (index range scan on the normalized food name).
+    """
+
+    paginator = EstimatedCountPaginator
+    # No second COUNT(*) for the "N of M selected" total
+    show_full_result_count = False
+    search_lookups = {}
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term or not self.search_lookups:
+            return queryset, False
+        query = Q()
+        for field, kind in self.search_lookups.items():
+            if kind == "uuid":
+                try:
+                    query |= Q(**{field: uuid.UUID(term)})
+                except ValueError:
+                    continue
+            elif kind == "prefix":
+                # Stored names are normalized (accents, aliases, plurals), so the term is too
+                prefix = normalize_food_name(term)
+                if prefix:
+                    query |= Q(**{f"{field}__gte": prefix, f"{field}__lt": prefix + MAX_CHAR})
+        return (queryset.filter(query) if query else queryset.none()), False
+
 
-from .models import Conversation, FavoriteFood, FoodCatalog, UserProfile
+# Fixed choices, a field filter would scan the table for its distinct values
+class RankFilter(admin.SimpleListFilter):
+    title = "rank"
+    parameter_name = "rank"
+
+    def lookups(self, request, model_admin):
+        return [(str(rank), str(rank)) for rank in (1, 2, 3)]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(rank=int(self.value()))
+        return queryset
 
 
 @admin.register(UserProfile)
-class UserProfileAdmin(admin.ModelAdmin):
+class UserProfileAdmin(LargeTableAdmin):
     list_display = ("id", "diet", "run_id", "created_at")
     list_filter = ("diet",)
     search_fields = ("id", "run_id")
+    search_help_text = "Full user or run id"
+    search_lookups = {"id": "uuid", "run_id": "uuid"}
+    raw_id_fields = ("run",)
 
 
 @admin.register(Conversation)
-class ConversationAdmin(admin.ModelAdmin):
+class ConversationAdmin(LargeTableAdmin):
     list_display = ("user", "role", "model", "total_tokens", "estimated_cost_usd", "created_at")
-    list_filter = ("role", "model")
-    search_fields = ("user__id", "run_id")
-    readonly_fields = ("created_at",)
+    list_select_related = ("user",)
+    list_filter = ("role",)
+    search_fields = ("user_id", "run_id")
+    search_help_text = "Full user or run id"
+    search_lookups = {"user_id": "uuid", "run_id": "uuid"}
+    readonly_fields = ("created_at", "full_prompt")
+    raw_id_fields = ("user", "run", "prompt_template")
+
+    @admin.display(description="Prompt (rendered)")
+    def full_prompt(self, obj):
+        return obj.prompt_text
 
 
 @admin.register(FavoriteFood)
-class FavoriteFoodAdmin(admin.ModelAdmin):
+class FavoriteFoodAdmin(LargeTableAdmin):
     list_display = ("user", "rank", "name_raw", "food_name", "catalog", "created_at")
-    list_filter = ("rank",)
-    search_fields = ("user__id", "name_raw", "food_name")
+    list_select_related = ("user", "catalog")
+    list_filter = (RankFilter,)
+    search_fields = ("user_id", "food_name")
+    search_help_text = "Full user id, or the start of a normalized food name"
+    search_lookups = {"user_id": "uuid", "food_name": "prefix"}
+    raw_id_fields = ("user", "catalog")
 
 
 @admin.register(FoodCatalog)
-class FoodCatalogAdmin(admin.ModelAdmin):
+class FoodCatalogAdmin(LargeTableAdmin):
     list_display = ("food_name", "diet", "source", "confidence", "updated_at")
     list_filter = ("diet", "source")
     search_fields = ("food_name",)
+    search_help_text = "Start of the food name"
+    search_lookups = {"food_name": "prefix"}
+
+
+@admin.register(RunSummary)
+class RunSummaryAdmin(admin.ModelAdmin):
+    list_display = ("run_id", "users", "total_tokens", "estimated_cost_usd", "llm_calls", "catalog_hit_rate", "updated_at")
+    search_fields = ("=run__id",)
+    readonly_fields = ("created_at", "updated_at")
+    raw_id_fields = ("run",)
+
+
+@admin.register(SimulationRun)
+class SimulationRunAdmin(admin.ModelAdmin):
+    list_display = ("id", "status", "requested_users", "completed_users", "started_at", "finished_at")
+    list_filter = ("status",)
+    search_fields = ("=id",)
+    readonly_fields = ("started_at", "finished_at")
+
+
+@admin.register(PromptTemplate)
+class PromptTemplateAdmin(admin.ModelAdmin):
+    list_display = ("content_hash", "created_at")
+    search_fields = ("=content_hash",)
+    readonly_fields = ("content_hash", "template", "created_at")
@@ -0,0 +1,200 @@
+"""
+Favorites analytics on integer-coded NumPy arrays.
+
+Catalog rows and favorites are loaded once per data version into flat arrays
+(catalog index per row, user code per favorite). Popularity, the sparse food
+co-occurrence matrix, diet mix per cuisine bucket and label confidence
+histograms are then vectorized ops, not Python loops over FavoriteFood rows.
+"""
+import threading
+
+import numpy as np
+from django.db import connection
+
+from foods import versioning
+from foods.models import Conversation, DietLabel, FavoriteFood, FoodCatalog, MessageRole
+
+DIETS = list(DietLabel.values)
+DIET_CODES = {diet: code for code, diet in enumerate(DIETS)}
+CONFIDENCE_BINS = np.linspace(0.0, 1.0, 11)
+TOP_N = 20
+# Bucket of users whose prompt had no cuisine hint (hint disabled, or prompts stored before templates)
+NO_BUCKET = "none"
+# Rows per round-trip when loading favorites
+FETCH_SIZE = 10000
+
+_lock = threading.Lock()
+_cached = {"token": None, "dataset": None}
+
+
+class Dataset:
+    """
+    Catalog and favorites as arrays. Catalog rows are numbered 0..n-1 in primary
+    key order; favorites are distinct (user code, catalog index) pairs sorted by
+    user then food. Favorites without a catalog row are left out.
+    """
+
+    def __init__(self, ids, names, diets, confidences, users, items, buckets, bucket_diets):
+        self.ids = ids
+        self.names = names
+        self.diets = diets
+        self.confidences = confidences
+        self.users = users
+        self.items = items
+        self.buckets = buckets
+        self.bucket_diets = bucket_diets
+
+    @classmethod
+    def load(cls):
+        rows = list(FoodCatalog.objects.order_by("pk").values_list("pk", "food_name", "diet", "confidence"))
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        names = [row[1] for row in rows]
+        diets = np.array([DIET_CODES.get(row[2], DIET_CODES[DietLabel.UNKNOWN]) for row in rows], dtype=np.int8)
+        confidences = np.array([np.nan if row[3] is None else row[3] for row in rows], dtype=np.float64)
+
+        favorites = list(
+            FavoriteFood.objects
+            .filter(catalog__isnull=False)
+            .order_by("user_id")
+            .values_list("user_id", "catalog_id")
+            .iterator(chunk_size=FETCH_SIZE)
+        )
+        users, items = cls._code_favorites(favorites, ids)
+
+        answers = list(
+            Conversation.objects
+            .filter(role=MessageRole.A)
+            .values_list("prompt_params__bucket", "user__diet")
+            .iterator(chunk_size=FETCH_SIZE)
+        )
+        buckets, bucket_diets = cls._bucket_diets(answers)
+        return cls(ids, names, diets, confidences, users, items, buckets, bucket_diets)
+
+    # Rows arrive ordered by user: a new user code starts wherever the id changes
+    @staticmethod
+    def _code_favorites(favorites, catalog_ids):
+        if not favorites:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        user_ids = np.empty(len(favorites), dtype=object)
+        user_ids[:] = [user_id for user_id, _ in favorites]
+        users = np.concatenate(([0], np.cumsum(user_ids[1:] != user_ids[:-1])))
+        items = np.searchsorted(catalog_ids, np.array([cid for _, cid in favorites], dtype=np.int64))
+        # One row per (user, food), sorted by user then food
+        n = max(len(catalog_ids), 1)
+        keys = np.unique(users * n + items)
+        return keys // n, keys % n
+
+    # users x diets count matrix per cuisine bucket, from the A message of each user
+    @staticmethod
+    def _bucket_diets(answers):
+        if not answers:
+            return [], np.zeros((0, len(DIETS)), dtype=np.int64)
+        labels = np.array([bucket or NO_BUCKET for bucket, _ in answers])
+        diets = np.array([DIET_CODES.get(diet, DIET_CODES[DietLabel.UNKNOWN]) for _, diet in answers])
+        buckets, codes = np.unique(labels, return_inverse=True)
+        counts = np.bincount(codes * len(DIETS) + diets, minlength=len(buckets) * len(DIETS))
+        return buckets.tolist(), counts.reshape(len(buckets), len(DIETS))
+
+    @property
+    def user_count(self):
+        return int(self.users[-1]) + 1 if len(self.users) else 0
+
+    # Users per catalog food
+    def popularity(self):
+        return np.bincount(self.items, minlength=len(self.names))
+
+    # Upper-triangular sparse co-occurrence matrix as COO arrays: (food a, food b, users), a < b
+    def cooccurrence(self):
+        if not len(self.items):
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, empty
+        n = len(self.names)
+        # Pair each favorite with the ones d rows later that belong to the same user
+        max_per_user = int(np.bincount(self.users).max())
+        keys = []
+        for d in range(1, max_per_user):
+            same_user = self.users[d:] == self.users[:-d]
+            keys.append(self.items[:-d][same_user] * n + self.items[d:][same_user])
+        if not keys:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, empty
+        pairs, counts = np.unique(np.concatenate(keys), return_counts=True)
+        return pairs // n, pairs % n, counts
+
+
+# Arrays for the current data version, loaded once per version and process
+# Never cached inside a transaction, it could hold rows that get rolled back
+def dataset():
+    token, _ = versioning.current()
+    with _lock:
+        if _cached["token"] == token:
+            return _cached["dataset"]
+        data = Dataset.load()
+        if not connection.in_atomic_block:
+            _cached.update(token=token, dataset=data)
+        return data
+
+
+def reset_cache():
+    with _lock:
+        _cached.update(token=None, dataset=None)
+
+
+def _food(data, index):
+    return {"food_name": data.names[index], "diet": DIETS[data.diets[index]]}
+
+
+def top_foods(data, n=TOP_N):
+    counts = data.popularity()
+    order = np.argsort(-counts, kind="stable")[:n]
+    users = max(data.user_count, 1)
+    return [
+        {**_food(data, i), "users": int(counts[i]), "share": round(counts[i] / users, 4)}
+        for i in order
+        if counts[i]
+    ]
+
+
+# Most frequent pairs; lift > 1 means the two foods are liked together more than chance
+def top_pairs(data, n=TOP_N):
+    a, b, counts = data.cooccurrence()
+    popularity = data.popularity()
+    order = np.lexsort((b, a, -counts))[:n]
+    lift = counts[order] * data.user_count / (popularity[a[order]] * popularity[b[order]])
+    return [
+        {"foods": [_food(data, a[i]), _food(data, b[i])], "users": int(counts[i]), "lift": round(float(x), 3)}
+        for i, x in zip(order, lift, strict=True)
+    ]
+
+
+def bucket_mix(data):
+    return {
+        bucket: {"users": int(row.sum()), **{diet: int(count) for diet, count in zip(DIETS, row, strict=True)}}
+        for bucket, row in zip(data.buckets, data.bucket_diets, strict=True)
+    }
+
+
+# Histogram of LLM label confidence per diet, rows without a confidence left out
+def confidence_histograms(data):
+    known = ~np.isnan(data.confidences)
+    out = {"bins": [round(float(x), 2) for x in CONFIDENCE_BINS]}
+    for code, diet in enumerate(DIETS):
+        values = data.confidences[known & (data.diets == code)]
+        if not len(values):
+            continue
+        counts, _ = np.histogram(values, bins=CONFIDENCE_BINS)
+        out[diet] = {"count": int(len(values)), "mean": round(float(values.mean()), 4), "histogram": counts.tolist()}
+    return out
+
+
+def report(top=TOP_N):
+    data = dataset()
+    return {
+        "users": data.user_count,
+        "favorites": int(len(data.items)),
+        "catalog_foods": len(data.names),
+        "top_foods": top_foods(data, top),
+        "top_pairs": top_pairs(data, top),
+        "buckets": bucket_mix(data),
+        "confidence": confidence_histograms(data),
+    }
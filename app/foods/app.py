@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class FoodsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "foods"
+
+    def ready(self):
+        from common import db  # noqa: F401
+
+        from . import signals  # noqa: F401
@@ -0,0 +1,260 @@
+"""
+Run archival: one gzipped JSONL file per run, deleted and restored in
+bounded chunks so no single transaction holds the SQLite write lock for long.
+
+File layout: a "run" line (run fields and its summary), then one "user" line
+per simulated user with its favorites and messages embedded. Prompt templates
+and catalog entries are stored by content, not by id, so a file restores into
+any database.
+"""
+import gzip
+import json
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import structlog
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from foods import pairs, prompts, versioning
+from foods.models import (
+    Conversation,
+    FavoriteFood,
+    FoodCatalog,
+    RunStatus,
+    RunSummary,
+    SimulationRun,
+    UserProfile,
+)
+
+log = structlog.get_logger(__name__)
+
+ARCHIVE_DIR = Path(os.getenv("EFB_ARCHIVE_DIR") or "archives")
+# Users deleted or restored per transaction (with their messages and favorites)
+CHUNK_SIZE = int(os.getenv("EFB_ARCHIVE_CHUNK_SIZE", "500"))
+FORMAT_VERSION = 1
+
+
+class ArchiveError(Exception):
+    pass
+
+
+# Runs to archive: finished runs older than older_than_days, never the keep_last newest
+def select_runs(run_ids=None, older_than_days=None, keep_last=None):
+    qs = SimulationRun.objects.exclude(status=RunStatus.RUNNING).order_by("-started_at")
+    if run_ids:
+        qs = qs.filter(id__in=run_ids)
+    if older_than_days is not None:
+        qs = qs.filter(started_at__lt=timezone.now() - timedelta(days=older_than_days))
+    if keep_last:
+        newest = SimulationRun.objects.order_by("-started_at").values_list("id", flat=True)[:keep_last]
+        qs = qs.exclude(id__in=list(newest))
+    return list(qs)
+
+
+def archive_path(run_id, out_dir=None):
+    return Path(out_dir or ARCHIVE_DIR) / f"run-{run_id}.jsonl.gz"
+
+
+# Concrete column values by attribute name (user_id, run_id, ...)
+def _fields(obj, exclude=()):
+    return {
+        f.attname: getattr(obj, f.attname)
+        for f in obj._meta.concrete_fields
+        if f.attname not in exclude
+    }
+
+
+def _user_row(user):
+    foods = []
+    for fav in user.foods.all():
+        row = _fields(fav, exclude=("id", "user_id", "catalog_id"))
+        row["catalog"] = fav.catalog.food_name if fav.catalog_id else None
+        foods.append(row)
+    messages = []
+    for msg in user.messages.all():
+        row = _fields(msg, exclude=("id", "user_id", "run_id", "prompt_template_id"))
+        row["prompt_template"] = msg.prompt_template.template if msg.prompt_template_id else None
+        messages.append(row)
+    return {"type": "user", **_fields(user, exclude=("run_id",)), "foods": foods, "messages": messages}
+
+
+# DjangoJSONEncoder rounds datetimes to milliseconds, archives keep them exact
+class _Encoder(DjangoJSONEncoder):
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def _dump(fh, row):
+    fh.write(json.dumps(row, cls=_Encoder) + "\n")
+
+
+# Stream one run to a gzipped JSONL file, written under a temporary name then renamed
+def write_archive(run, path, chunk_size=CHUNK_SIZE):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    summary = RunSummary.objects.filter(run_id=run.id).first()
+    users_qs = (
+        UserProfile.objects
+        .filter(run_id=run.id)
+        .order_by("pk")
+        .prefetch_related(
+            Prefetch("foods", queryset=FavoriteFood.objects.select_related("catalog").order_by("rank")),
+            Prefetch("messages", queryset=Conversation.objects.select_related("prompt_template").order_by("pk")),
+        )
+    )
+    users = 0
+    with gzip.open(tmp, "wt", encoding="utf-8") as fh:
+        _dump(fh, {
+            "type": "run",
+            "format": FORMAT_VERSION,
+            **_fields(run),
+            "summary": _fields(summary, exclude=("run_id",)) if summary else None,
+        })
+        for user in users_qs.iterator(chunk_size=chunk_size):
+            _dump(fh, _user_row(user))
+            users += 1
+    os.replace(tmp, path)
+    return users
+
+
+# Delete a run's users (cascading to messages and favorites) chunk by chunk, then the run
+def delete_run(run_id, chunk_size=CHUNK_SIZE):
+    deleted = 0
+    while True:
+        ids = list(UserProfile.objects.filter(run_id=run_id).order_by("pk").values_list("pk", flat=True)[:chunk_size])
+        if not ids:
+            break
+        with transaction.atomic(), pairs.manual():
+            # One batched update instead of the per-user signal handlers
+            pairs.remove(pairs.groups_for_users(ids))
+            Conversation.objects.filter(user_id__in=ids).delete()
+            FavoriteFood.objects.filter(user_id__in=ids).delete()
+            UserProfile.objects.filter(pk__in=ids).delete()
+        deleted += len(ids)
+    with transaction.atomic():
+        # Messages without a user (none written by simulate_foods, but the FK allows it)
+        Conversation.objects.filter(run_id=run_id).delete()
+        SimulationRun.objects.filter(id=run_id).delete()
+    return deleted
+
+
+# Archive then delete; the file is read back and counted before anything is deleted
+def archive_run(run, out_dir=None, chunk_size=CHUNK_SIZE, delete=True):
+    path = archive_path(run.id, out_dir)
+    written = write_archive(run, path, chunk_size)
+    expected = UserProfile.objects.filter(run_id=run.id).count()
+    if written != expected or sum(1 for _ in read_archive(path)) != written + 1:
+        raise ArchiveError(f"archive of run {run.id} is incomplete ({written} of {expected} users), nothing deleted")
+    deleted = delete_run(run.id, chunk_size) if delete else 0
+    log.info("archive.run_done", run_id=str(run.id), path=str(path), users=written, deleted=deleted)
+    return path, written
+
+
+def read_archive(path):
+    with gzip.open(path, "rt", encoding="utf-8") as fh:
+        for line in fh:
+            if line.strip():
+                yield json.loads(line)
+
+
+# auto_now_add overwrites created_at on insert: put the archived values back with one executemany
+# bulk_create fills in the new pks (SQLite 3.35+, PostgreSQL), in order
+def _bulk_create(model, objs):
+    field = model._meta.get_field("created_at")
+    stamps = [field.to_python(obj.created_at) for obj in objs]
+    model.objects.bulk_create(objs)
+    pk = model._meta.pk
+    params = [
+        (field.get_db_prep_save(stamp, connection), pk.get_db_prep_save(obj.pk, connection))
+        for obj, stamp in zip(objs, stamps, strict=True)
+        if obj.pk is not None and stamp is not None
+    ]
+    if params:
+        qn = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"UPDATE {qn(model._meta.db_table)} SET {qn(field.column)} = %s WHERE {qn(pk.column)} = %s",
+                params,
+            )
+
+
+def _catalog_groups(favorites):
+    groups = {}
+    for fav in favorites:
+        if fav.catalog_id is not None:
+            groups.setdefault(fav.user_id, []).append(fav.catalog_id)
+    return list(groups.values())
+
+
+def _flush(users, run_id):
+    catalog_ids = dict(
+        FoodCatalog.objects
+        .filter(food_name__in={f["catalog"] for u in users for f in u["foods"] if f["catalog"]})
+        .values_list("food_name", "id")
+    )
+    profiles, favorites, messages = [], [], []
+    for row in users:
+        foods = row.pop("foods")
+        msgs = row.pop("messages")
+        row.pop("type")
+        profiles.append(UserProfile(**row, run_id=run_id))
+        for fav in foods:
+            catalog = fav.pop("catalog")
+            favorites.append(FavoriteFood(**fav, user_id=row["id"], catalog_id=catalog_ids.get(catalog)))
+        for msg in msgs:
+            template = msg.pop("prompt_template")
+            if template is not None:
+                msg["prompt_template_id"] = prompts.template_id(template)
+            messages.append(Conversation(**msg, user_id=row["id"], run_id=run_id))
+
+    with transaction.atomic():
+        _bulk_create(UserProfile, profiles)
+        _bulk_create(FavoriteFood, favorites)
+        _bulk_create(Conversation, messages)
+        pairs.add(_catalog_groups(favorites))
+        # bulk_create sends no signals
+        versioning.bump(versioning.SCOPE_USERS)
+
+
+# Load an archive back; refuses a run that is still (or again) in the database
+def restore_archive(path, chunk_size=CHUNK_SIZE):
+    rows = read_archive(path)
+    head = next(rows, None)
+    if not head or head.get("type") != "run":
+        raise ArchiveError(f"{path} is not a run archive")
+    if head.get("format") != FORMAT_VERSION:
+        raise ArchiveError(f"{path} has format {head.get('format')}, expected {FORMAT_VERSION}")
+    run_id = head["id"]
+    if SimulationRun.objects.filter(id=run_id).exists():
+        raise ArchiveError(f"run {run_id} already exists")
+
+    head.pop("type")
+    head.pop("format")
+    summary = head.pop("summary")
+    with transaction.atomic():
+        run = SimulationRun.objects.create(**head)
+        if summary:
+            created_at = summary.pop("created_at")
+            RunSummary.objects.create(run=run, **summary)
+            RunSummary.objects.filter(run=run).update(created_at=created_at)
+
+    restored = 0
+    pending = []
+    for row in rows:
+        pending.append(row)
+        if len(pending) >= chunk_size:
+            _flush(pending, run.id)
+            restored += len(pending)
+            pending = []
+    if pending:
+        _flush(pending, run.id)
+        restored += len(pending)
+    log.info("archive.restore_done", run_id=str(run.id), path=str(path), users=restored)
+    return run, restored
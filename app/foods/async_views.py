@@ -0,0 +1,124 @@
+"""
+Async variants of the read endpoints, routed instead of the sync ones
+when EFB_ASYNC_READS is on (the default under config/asgi.py).
+"""
+from collections import defaultdict
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from . import charts, response_cache, summaries, versioning
+from .models import FavoriteFood, UserProfile
+from .versioning import aconditional_on_data
+from .views import VEG_DIETS, _validate_veg_users
+
+
+# Error response built by DRF's exception handler, as APIView.handle_exception does:
+# 401 with WWW-Authenticate from the first authenticator, else 403
+def _drf_error(drf_request, exc):
+    if isinstance(exc, exceptions.NotAuthenticated | exceptions.AuthenticationFailed):
+        authenticators = drf_request.authenticators
+        header = authenticators[0].authenticate_header(drf_request) if authenticators else None
+        if header:
+            exc.auth_header = header
+        else:
+            exc.status_code = 403
+    response = api_settings.EXCEPTION_HANDLER(exc, {"request": drf_request, "view": None, "args": (), "kwargs": {}})
+    response.accepted_renderer = JSONRenderer()
+    response.accepted_media_type = JSONRenderer.media_type
+    response.renderer_context = {"request": drf_request, "response": response}
+    return response.render()
+
+
+# Same method check, authenticators and IsAuthenticated check as the @api_view(["GET"]) views,
+# run before the conditional decorator; csrf_exempt like APIView, no session auth is used
+def _authenticated(view):
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        drf_request = Request(
+            request,
+            authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES],
+        )
+        try:
+            user = await sync_to_async(lambda: drf_request.user)()
+            if not (user and user.is_authenticated):
+                raise exceptions.NotAuthenticated()
+            if request.method not in ("GET", "HEAD"):
+                raise exceptions.MethodNotAllowed(request.method)
+        except exceptions.APIException as exc:
+            return _drf_error(drf_request, exc)
+        request.user = user
+        return await view(request, *args, **kwargs)
+
+    return csrf_exempt(wrapper)
+
+
+async def _veg_users_data():
+    qs = UserProfile.objects.filter(diet__in=VEG_DIETS).values("id", "run_id", "diet")
+    users = [u async for u in qs]
+
+    top3 = defaultdict(list)
+    favs = (
+        FavoriteFood.objects
+        .filter(user__diet__in=VEG_DIETS)
+        .order_by("pk")
+        .values_list("user_id", "food_name")
+    )
+    async for user_id, food_name in favs:
+        top3[user_id].append(food_name)
+
+    data = [
+        {"user_id": u["id"], "run_id": u["run_id"], "diet": u["diet"], "top3": top3[u["id"]]}
+        for u in users
+    ]
+    return _validate_veg_users(data)
+
+
+@_authenticated
+@aconditional_on_data()
+async def veg_users_view(request):
+    version, _ = await versioning.afor_request(request)
+    data = await response_cache.aget_or_set("veg_users", request.GET, version, _veg_users_data)
+    return HttpResponse(JSONRenderer().render(data), content_type="application/json")
+
+
+@_authenticated
+@aconditional_on_data()
+async def stats_view(request):
+    data = await summaries.astats(request.GET.getlist("run_id"))
+    return HttpResponse(JSONRenderer().render(data), content_type="application/json")
+
+
+async def _render_diets_png(params):
+    counts = await summaries.adiet_counts(params.getlist("run_id"), params.getlist("diet"))
+    # Rendering is CPU-bound, keep it off the event loop
+    return await sync_to_async(charts.pie_png, thread_sensitive=False)(counts)
+
+
+@aconditional_on_data()
+async def diets_png(request):
+    version, _ = await versioning.afor_request(request)
+    png = await response_cache.aget_or_set(
+        "diets_png", request.GET, version, lambda: _render_diets_png(request.GET)
+    )
+    return HttpResponse(png, content_type="image/png")
+
+
+async def _render_diets_svg(params):
+    counts = await summaries.adiet_counts(params.getlist("run_id"), params.getlist("diet"))
+    return charts.pie_svg(counts)
+
+
+@aconditional_on_data()
+async def diets_svg(request):
+    version, _ = await versioning.afor_request(request)
+    svg = await response_cache.aget_or_set(
+        "diets_svg", request.GET, version, lambda: _render_diets_svg(request.GET)
+    )
+    return HttpResponse(svg, content_type="image/svg+xml")
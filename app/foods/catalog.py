@@ -1,18 +1,97 @@
+import bisect
 import csv
 import os
+import time
+from datetime import timedelta
 
 import structlog
 from django.core.exceptions import ValidationError
-from django.db import transaction
+from django.db import connection, transaction
 from django.db.utils import DataError, IntegrityError
 
+from foods import versioning
 from foods.models import DietLabel, FoodCatalog
-from foods.normalize import normalize_food_name
+from foods.normalize import normalize_food_name, normalize_many
 from foods.openai_client import OpenAIClient
 
 log = structlog.get_logger(__name__)
 
 SEED_PATH = os.path.join(os.path.dirname(__file__), "seeds", "food_catalog.csv")
+# Seconds between catalog version checks of the in-process snapshot
+SNAPSHOT_TTL = float(os.getenv("EFB_CATALOG_SNAPSHOT_TTL", "5"))
+# Rows updated this long before the newest one seen are read again on refresh,
+# so a transaction that committed after a later one is not missed
+SNAPSHOT_OVERLAP = timedelta(seconds=60)
+SEARCH_LIMIT = 10
+SEARCH_MAX_LIMIT = 50
+# POST /api/classify/: names per request, and catalog misses sent to the LLM per request
+CLASSIFY_MAX_FOODS = int(os.getenv("EFB_CLASSIFY_MAX_FOODS", "100"))
+CLASSIFY_LLM_LIMIT = int(os.getenv("EFB_CLASSIFY_LLM_LIMIT", "50"))
+LLM_DIETS = {DietLabel.VEGAN, DietLabel.VEGETARIAN, DietLabel.OMNIVORE}
+
+# Highest code point, prefix <= key < prefix + _MAX_CHAR covers every key starting with prefix
+_MAX_CHAR = "\U0010ffff"
+
+
+class PrefixIndex:
+    """
+    Sorted arrays of catalog names for prefix search: full names, and every
+    later word start ("pizza" -> "margherita pizza"). A query is two bisects
+    plus at most `limit` matches read, whatever the catalog size.
+    Never mutated once built, updated() returns a new index.
+    """
+
+    def __init__(self, objs=()):
+        self._rows = {obj.food_name: (obj.diet, obj.source) for obj in objs}
+        self._names = sorted(self._rows)
+        self._words = sorted(entry for name in self._names for entry in self._word_entries(name))
+
+    @staticmethod
+    def _word_entries(name):
+        words = name.split(" ")
+        return [(" ".join(words[i:]), name) for i in range(1, len(words))]
+
+    def __len__(self):
+        return len(self._rows)
+
+    # New index with the given rows added or replaced, sharing nothing with this one
+    def updated(self, objs):
+        index = PrefixIndex()
+        index._rows = dict(self._rows)
+        index._names = list(self._names)
+        index._words = list(self._words)
+        for obj in objs:
+            if obj.food_name not in index._rows:
+                bisect.insort(index._names, obj.food_name)
+                for entry in self._word_entries(obj.food_name):
+                    bisect.insort(index._words, entry)
+            index._rows[obj.food_name] = (obj.diet, obj.source)
+        return index
+
+    # Names starting with prefix first, then names with a later word starting with it
+    def search(self, prefix, limit=SEARCH_LIMIT):
+        found = []
+        start = bisect.bisect_left(self._names, prefix)
+        end = bisect.bisect_left(self._names, prefix + _MAX_CHAR)
+        found.extend(self._names[start:min(end, start + limit)])
+
+        start = bisect.bisect_left(self._words, (prefix,))
+        end = bisect.bisect_left(self._words, (prefix + _MAX_CHAR,))
+        seen = set(found)
+        for _, name in self._words[start:end]:
+            if len(found) >= limit:
+                break
+            if name not in seen:
+                seen.add(name)
+                found.append(name)
+
+        return [
+            {"food_name": name, "diet": self._rows[name][0], "source": self._rows[name][1]}
+            for name in found
+        ]
+
+
+_snapshot = {"token": None, "checked_at": None, "synced_at": None, "by_name": {}, "index": PrefixIndex()}
 
 # Returns cleaned data or raise ValidationError
 def _validate_catalog_row(row):
@@ -90,15 +169,73 @@ def ensure_seed_loaded():
         log.info("catalog.seed_loaded", count=inserts)
     return inserts
 
+# Load the whole catalog into this process, keyed by food name
+# Gunicorn calls it before fork with --preload so workers start warm
+def warm():
+    token, _ = versioning.current((versioning.SCOPE_CATALOG,))
+    by_name = {obj.food_name: obj for obj in FoodCatalog.objects.all()}
+    _snapshot.update(
+        token=token,
+        checked_at=time.monotonic(),
+        synced_at=max((obj.updated_at for obj in by_name.values()), default=None),
+        by_name=by_name,
+        index=PrefixIndex(by_name.values()),
+    )
+    return len(by_name)
+
+def reset_snapshot():
+    _snapshot.update(token=None, checked_at=None, synced_at=None, by_name={}, index=PrefixIndex())
+
+# Apply the rows written since the last load; a full reload when rows were deleted or renamed
+# The dict and index are replaced, never mutated, threads reading the old ones are unaffected
+def _refresh(token):
+    synced_at = _snapshot["synced_at"]
+    if synced_at is None:
+        return warm()
+    changed = list(FoodCatalog.objects.filter(updated_at__gte=synced_at - SNAPSHOT_OVERLAP))
+    by_name = dict(_snapshot["by_name"])
+    by_name.update((obj.food_name, obj) for obj in changed)
+    if FoodCatalog.objects.count() != len(by_name):
+        return warm()
+    _snapshot.update(
+        token=token,
+        checked_at=time.monotonic(),
+        synced_at=max([synced_at, *(obj.updated_at for obj in changed)]),
+        by_name=by_name,
+        index=_snapshot["index"].updated(changed),
+    )
+    return len(changed)
+
+# Catalog snapshot, refreshed when the catalog version moved (checked every SNAPSHOT_TTL)
+# Never refreshed inside a transaction, it could pick up rows that get rolled back
+def snapshot():
+    checked_at = _snapshot["checked_at"]
+    now = time.monotonic()
+    if connection.in_atomic_block or (checked_at is not None and now - checked_at < SNAPSHOT_TTL):
+        return _snapshot["by_name"]
+    token, _ = versioning.current((versioning.SCOPE_CATALOG,))
+    if token != _snapshot["token"]:
+        _refresh(token)
+    else:
+        _snapshot["checked_at"] = now
+    return _snapshot["by_name"]
+
+# Prefix search over the snapshot, no query while it is fresh
+def search(query, limit=SEARCH_LIMIT):
+    snapshot()
+    return _snapshot["index"].search(normalize_food_name(query), limit)
+
+# Snapshot first, the DB for names added since it was loaded
 def lookup(food_name):
     norm = normalize_food_name(food_name)
-    try:
-        obj = FoodCatalog.objects.get(food_name=norm)
-        log.info("classify.catalog_hit", food=norm, label=obj.diet)
-        return obj
-    except FoodCatalog.DoesNotExist:
+    obj = snapshot().get(norm)
+    if obj is None:
+        obj = FoodCatalog.objects.filter(food_name=norm).first()
+    if obj is None:
         log.info("classify.catalog_miss", food=norm)
         return None
+    log.info("classify.catalog_hit", food=norm, label=obj.diet)
+    return obj
 
 # If not in catalog, ask LLM
 def expand_with_llm(food_name, client=None):
@@ -139,3 +276,60 @@ def expand_with_llm(food_name, client=None):
         cost_usd=round(client.cost_usd(), 6)
     )
     return obj
+
+# Label a list of names: snapshot, then one query for the rest, then one LLM request
+# for up to llm_limit misses, saved with a single upsert. Results follow the input order.
+def classify_many(names, client=None, llm_limit=CLASSIFY_LLM_LIMIT):
+    norms = normalize_many(names)
+    max_len = FoodCatalog._meta.get_field("food_name").max_length
+    distinct = [name for name in dict.fromkeys(norms) if name and len(name) <= max_len]
+    known = snapshot()
+    found = {name: known[name] for name in distinct if name in known}
+    rest = [name for name in distinct if name not in found]
+    if rest:
+        found.update((obj.food_name, obj) for obj in FoodCatalog.objects.filter(food_name__in=rest))
+
+    misses = [name for name in distinct if name not in found]
+    to_llm = misses[:max(0, llm_limit)]
+    llm = {"sent": 0, "skipped": len(misses) - len(to_llm), "cost_usd": 0.0}
+    labels = {}
+    if to_llm:
+        try:
+            if client is None:
+                client = OpenAIClient()
+            labels = client.classify_food_diets(to_llm)
+            llm["sent"] = len(to_llm)
+            llm["cost_usd"] = round(client.cost_usd(), 6)
+        except RuntimeError as e:
+            # No API key or call budget exhausted: misses stay unlabeled
+            log.warning("catalog.classify_llm_unavailable", foods=len(to_llm), error=str(e))
+            llm["skipped"] += len(to_llm)
+
+    new = [
+        FoodCatalog(food_name=name, diet=diet, source="llm", confidence=confidence)
+        for name, (diet, confidence) in labels.items()
+        if diet in LLM_DIETS
+    ]
+    created = {}
+    if new:
+        with transaction.atomic():
+            # A row written meanwhile (seed, admin, another request) wins over this batch
+            FoodCatalog.objects.bulk_create(new, ignore_conflicts=True)
+            # bulk_create sends no post_save, so the version is bumped here
+            versioning.bump(versioning.SCOPE_CATALOG)
+        # Re-read: with ignore_conflicts the objects get no pk and may not be what is stored
+        created = {obj.food_name: obj for obj in FoodCatalog.objects.filter(food_name__in=[n.food_name for n in new])}
+        log.info("catalog.llm_cached_batch", count=len(new), cost_usd=llm["cost_usd"])
+
+    results = []
+    for raw, norm in zip(names, norms, strict=True):
+        obj = found.get(norm) or created.get(norm)
+        results.append({
+            "name": raw,
+            "food_name": norm,
+            "diet": obj.diet if obj else DietLabel.UNKNOWN,
+            "confidence": obj.confidence if obj else None,
+            "source": obj.source if obj else None,
+            "cached": norm in found,
+        })
+    return {"results": results, "llm": llm}
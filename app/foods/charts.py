@@ -0,0 +1,92 @@
+"""
+Diet breakdown pie chart.
+matplotlib is only imported on the first PNG render; the SVG renderer is
+plain Python and never touches it.
+"""
+import functools
+import io
+import math
+import os
+
+from django.utils.html import escape
+
+# Rendered PNGs kept per process, keyed by the diet-count vector
+CHART_CACHE_SIZE = int(os.getenv("EFB_CHART_CACHE_SIZE", "128"))
+
+# matplotlib's default "tab10" cycle, so PNG and SVG slices match
+PALETTE = ["#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd", "#8c564b"]
+NO_DATA = (("no data", 1),)
+
+
+# [{"diet", "c"}] rows -> hashable ((label, count), ...) vector
+def _vector(counts):
+    return tuple((c["diet"], int(c["c"])) for c in counts) or NO_DATA
+
+
+@functools.lru_cache(maxsize=CHART_CACHE_SIZE)
+def _render_png(vector):
+    # Object-oriented API: no pyplot global state, safe across threads
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(4.2, 4.2))
+    ax = fig.subplots()
+    ax.pie([v for _, v in vector], labels=[label for label, _ in vector],
+           autopct="%1.1f%%", startangle=90)
+    ax.axis("equal")
+
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", bbox_inches="tight")
+    return buf.getvalue()
+
+
+def pie_png(counts):
+    return _render_png(_vector(counts))
+
+
+def _point(cx, cy, r, angle):
+    return cx + r * math.cos(angle), cy - r * math.sin(angle)
+
+
+# Same layout as the PNG: counter-clockwise from 12 o'clock, percent inside, label outside
+@functools.lru_cache(maxsize=CHART_CACHE_SIZE)
+def _render_svg(vector, size):
+    total = sum(v for _, v in vector)
+    cx = cy = size / 2
+    r = size * 0.32
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {size} {size}" '
+        f'width="{size}" height="{size}" font-family="sans-serif" font-size="{size / 24:.1f}">'
+    ]
+
+    start = math.pi / 2
+    for i, (label, value) in enumerate(vector):
+        frac = value / total
+        end = start + frac * 2 * math.pi
+        color = PALETTE[i % len(PALETTE)]
+        if frac >= 1:
+            parts.append(f'<circle cx="{cx}" cy="{cy}" r="{r}" fill="{color}"/>')
+        else:
+            x0, y0 = _point(cx, cy, r, start)
+            x1, y1 = _point(cx, cy, r, end)
+            large = 1 if frac > 0.5 else 0
+            parts.append(
+                f'<path d="M{cx},{cy} L{x0:.2f},{y0:.2f} A{r},{r} 0 {large} 0 {x1:.2f},{y1:.2f} Z" '
+                f'fill="{color}"/>'
+            )
+
+        mid = (start + end) / 2
+        px, py = _point(cx, cy, r * 0.6, mid)
+        lx, ly = _point(cx, cy, r * 1.18, mid)
+        anchor = "start" if math.cos(mid) > 0.1 else "end" if math.cos(mid) < -0.1 else "middle"
+        parts.append(f'<text x="{px:.2f}" y="{py:.2f}" text-anchor="middle" dominant-baseline="middle">'
+                     f'{frac * 100:.1f}%</text>')
+        parts.append(f'<text x="{lx:.2f}" y="{ly:.2f}" text-anchor="{anchor}" dominant-baseline="middle">'
+                     f'{escape(label)}</text>')
+        start = end
+
+    parts.append("</svg>")
+    return "".join(parts)
+
+
+def pie_svg(counts, size=320):
+    return _render_svg(_vector(counts), size)
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from foods import archive
+
+
+class Command(BaseCommand):
+    help = (
+        "Archive finished simulation runs to gzipped JSONL and delete them in small transactions, "
+        "or restore archived runs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--run-id", action="append", dest="run_ids", help="Archive these runs (repeatable)")
+        parser.add_argument("--older-than", type=int, dest="older_than_days", help="Archive runs started more than N days ago")
+        parser.add_argument("--keep-last", type=int, help="Never archive the N most recent runs")
+        parser.add_argument("--out-dir", help=f"Archive directory (default EFB_ARCHIVE_DIR or {archive.ARCHIVE_DIR})")
+        parser.add_argument("--chunk-size", type=int, default=archive.CHUNK_SIZE, help="Users per delete/restore transaction")
+        parser.add_argument("--keep-data", action="store_true", help="Write the archives but delete nothing")
+        parser.add_argument("--dry-run", action="store_true", help="List the runs that would be archived")
+        parser.add_argument("--restore", action="append", metavar="PATH", help="Restore an archive file (repeatable)")
+
+    def handle(self, *args, **opts):
+        chunk_size = max(1, int(opts["chunk_size"]))
+        if opts["restore"]:
+            for path in opts["restore"]:
+                try:
+                    run, users = archive.restore_archive(path, chunk_size)
+                except (archive.ArchiveError, OSError) as e:
+                    raise CommandError(str(e)) from e
+                self.stdout.write(self.style.SUCCESS(f"Restored run {run.id} ({users} users) from {path}"))
+            return
+
+        if not (opts["run_ids"] or opts["older_than_days"] is not None or opts["keep_last"]):
+            raise CommandError("Select runs with --run-id, --older-than and/or --keep-last")
+
+        runs = archive.select_runs(opts["run_ids"], opts["older_than_days"], opts["keep_last"])
+        if opts["dry_run"]:
+            for run in runs:
+                self.stdout.write(f"{run.id} {run.status} started={run.started_at:%Y-%m-%d} users={run.completed_users}")
+            self.stdout.write(f"{len(runs)} runs would be archived.")
+            return
+
+        total = 0
+        for run in runs:
+            try:
+                path, users = archive.archive_run(run, opts["out_dir"], chunk_size, delete=not opts["keep_data"])
+            except archive.ArchiveError as e:
+                raise CommandError(str(e)) from e
+            total += users
+            self.stdout.write(f"{run.id}: {users} users -> {path}")
+        verb = "Archived" if opts["keep_data"] else "Archived and deleted"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {len(runs)} runs, {total} users."))
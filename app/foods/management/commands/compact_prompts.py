@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from foods import prompts, schema
+from foods.models import Conversation
+
+
+class Command(BaseCommand):
+    help = "Replace literal conversation prompts with shared PromptTemplate rows plus per-message parameters."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=2000, help="Conversations updated per transaction")
+        parser.add_argument("--dry-run", action="store_true", help="Report what would be compacted, write nothing")
+        parser.add_argument("--vacuum", action="store_true", help="Run VACUUM afterwards to give the space back")
+
+    def handle(self, *args, **opts):
+        batch_size = max(1, int(opts["batch_size"]))
+        dry_run = opts["dry_run"]
+
+        if not dry_run:
+            added = schema.sync()
+            if added:
+                self.stdout.write(f"Added to the schema: {', '.join(added)}")
+
+        qs = (
+            Conversation.objects
+            .filter(prompt_template__isnull=True)
+            .exclude(prompt="")
+            .only("id", "prompt")
+            .order_by("pk")
+        )
+        rows = freed = 0
+        templates = set()
+        last_pk = 0
+        while True:
+            batch = list(qs.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+
+            for conv in batch:
+                template, params = prompts.split(conv.prompt)
+                templates.add(prompts.content_hash(template))
+                freed += len(conv.prompt.encode("utf-8"))
+                if not dry_run:
+                    # Template rows commit on their own, the ids are cached from then on
+                    conv.prompt_template_id = prompts.template_id(template)
+                    conv.prompt_params = params or None
+                    conv.prompt = ""
+            if not dry_run:
+                with transaction.atomic():
+                    Conversation.objects.bulk_update(batch, ["prompt", "prompt_template", "prompt_params"])
+            rows += len(batch)
+
+        verb = "Would compact" if dry_run else "Compacted"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {rows} conversations into {len(templates)} templates, "
+            f"~{freed / 1024 / 1024:.1f} MiB of prompt text."
+        ))
+
+        if opts["vacuum"] and not dry_run:
+            with connection.cursor() as cursor:
+                cursor.execute("VACUUM")
+            self.stdout.write("VACUUM done.")
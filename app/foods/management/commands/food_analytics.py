@@ -0,0 +1,44 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from foods import analytics
+
+
+class Command(BaseCommand):
+    help = "Food popularity, co-occurring pairs, diet mix per cuisine bucket and label confidence."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=analytics.TOP_N, help="Foods and pairs to list")
+        parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+
+    def handle(self, *args, **opts):
+        report = analytics.report(opts["top"])
+        if opts["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(
+            f"users={report['users']} favorites={report['favorites']} catalog_foods={report['catalog_foods']}"
+        )
+
+        self.stdout.write("\nTop foods")
+        for row in report["top_foods"]:
+            self.stdout.write(f"  {row['food_name']:<32}{row['diet']:<12}{row['users']:>8}{row['share']:>8.1%}")
+
+        self.stdout.write("\nTop pairs")
+        for row in report["top_pairs"]:
+            pair = " + ".join(food["food_name"] for food in row["foods"])
+            self.stdout.write(f"  {pair:<52}{row['users']:>8}  lift {row['lift']:.2f}")
+
+        self.stdout.write("\nDiet mix per bucket")
+        diets = analytics.DIETS
+        self.stdout.write(f"  {'bucket':<20}{'users':>8}" + "".join(f"{d:>12}" for d in diets))
+        for bucket, row in report["buckets"].items():
+            self.stdout.write(f"  {bucket:<20}{row['users']:>8}" + "".join(f"{row[d]:>12}" for d in diets))
+
+        self.stdout.write("\nLabel confidence")
+        for diet in diets:
+            row = report["confidence"].get(diet)
+            if row:
+                self.stdout.write(f"  {diet:<12}n={row['count']:<8}mean={row['mean']:.3f}  {row['histogram']}")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from foods import pairs
+
+
+class Command(BaseCommand):
+    help = "Recompute the food co-occurrence index (FoodPair) from favorites."
+
+    def handle(self, *args, **opts):
+        rebuilt = pairs.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rebuilt} food pairs."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from foods import summaries
+
+
+class Command(BaseCommand):
+    help = "Recompute per-run rollups (RunSummary) from users, conversations and favorites."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--run-id", action="append", dest="run_ids", help="Limit to these run ids")
+
+    def handle(self, *args, **opts):
+        rebuilt = summaries.rebuild(opts.get("run_ids"))
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rebuilt} run summaries."))
@@ -0,0 +1,77 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from foods import pairs, versioning
+from foods.models import FavoriteFood, FoodCatalog
+from foods.normalize import normalize_many
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-key FoodCatalog and FavoriteFood food names with the current normalizer "
+        "(run after changing food_aliases.csv). Catalog rows that now share a name are merged."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Report what would change, write nothing")
+
+    def handle(self, *args, **opts):
+        dry_run = opts["dry_run"]
+        with transaction.atomic():
+            renamed, merged = self._rekey_catalog(dry_run)
+            favorites = self._rekey_favorites(dry_run)
+            if dry_run:
+                transaction.set_rollback(True)
+            elif renamed or merged or favorites:
+                # QuerySet.update() sends no signals
+                versioning.bump(versioning.SCOPE_CATALOG)
+                versioning.bump(versioning.SCOPE_USERS)
+                # Merged rows and newly linked favorites change the pair counts
+                pairs.rebuild()
+
+        prefix = "Would re-key" if dry_run else "Re-keyed"
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}: {renamed} catalog names renamed, {merged} merged into an existing name, "
+            f"{favorites} favorites."
+        ))
+
+    # Rename each stale catalog row, or fold it into the row already holding the new name
+    # (the existing row's label wins, favorites are repointed)
+    def _rekey_catalog(self, dry_run):
+        rows = list(FoodCatalog.objects.order_by("pk").values_list("pk", "food_name"))
+        keys = normalize_many([name for _, name in rows])
+        by_name = {name: pk for pk, name in rows}
+        renamed = merged = 0
+        for (pk, name), key in zip(rows, keys, strict=True):
+            if key == name or not key:
+                continue
+            target = by_name.get(key)
+            if target is None:
+                if not dry_run:
+                    # updated_at drives the catalog snapshot refresh
+                    FoodCatalog.objects.filter(pk=pk).update(food_name=key, updated_at=timezone.now())
+                by_name[key] = pk
+                renamed += 1
+            else:
+                if not dry_run:
+                    FavoriteFood.objects.filter(catalog_id=pk).update(catalog_id=target)
+                    FoodCatalog.objects.filter(pk=pk).delete()
+                merged += 1
+            del by_name[name]
+        return renamed, merged
+
+    # food_name is the normalized name_raw; favorites without a catalog row get one if it now matches
+    def _rekey_favorites(self, dry_run):
+        raws = list(FavoriteFood.objects.values_list("name_raw", flat=True).distinct())
+        catalog_ids = dict(FoodCatalog.objects.values_list("food_name", "pk"))
+        changed = 0
+        for raw, key in zip(raws, normalize_many(raws), strict=True):
+            stale = FavoriteFood.objects.filter(name_raw=raw).exclude(food_name=key)
+            if dry_run:
+                changed += stale.count()
+                continue
+            changed += stale.update(food_name=key)
+            if key in catalog_ids:
+                FavoriteFood.objects.filter(name_raw=raw, catalog__isnull=True).update(catalog_id=catalog_ids[key])
+        return changed
@@ -1,14 +1,27 @@
+import cProfile
+import json
 import os
-import uuid
+import time
 
 from django.core.management.base import BaseCommand
 from django.db import transaction
+from django.utils import timezone
 import structlog
 
-from foods import catalog
+from common.logging import flush_counters
+from common.timing import StageTimer
+from foods import catalog, pairs, prompts, summaries
 from foods.diet import derive_user_diet
-from foods.models import Conversation, DietLabel, FavoriteFood, MessageRole, UserProfile
-from foods.normalize import normalize_food_name
+from foods.models import (
+    Conversation,
+    DietLabel,
+    FavoriteFood,
+    MessageRole,
+    RunStatus,
+    SimulationRun,
+    UserProfile,
+)
+from foods.normalize import normalize_many
 from foods.openai_client import (
     OPENAI_MODEL,
     PRICE_PER_1K_INPUT,
@@ -40,60 +53,147 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument("--runs", type=int, default=100, help="Number of users to simulate")
+        parser.add_argument("--profile-out", help="Write the per-stage timings as JSON to this file")
+        parser.add_argument("--cprofile", help="Run the simulation under cProfile, write pstats to this file")
 
     def handle(self, *args, **opts):
         runs = int(opts.get("runs", 100))
-        run_uuid = uuid.uuid4()
+        self.timer = StageTimer()
+        wall_start = time.perf_counter()
 
-        # Ensure catalog seeded/available
-        catalog.ensure_seed_loaded()
+        # Ensure catalog seeded/available, then serve lookups from memory
+        with self.timer.stage("catalog.load"):
+            catalog.ensure_seed_loaded()
+            catalog.warm()
 
         client = OpenAIClient()
-        model_label = OPENAI_MODEL
+        # Lets the client split response parsing out of the LLM wait
+        client.timer = self.timer
+        run = SimulationRun.objects.create(
+            requested_users=runs,
+            params={
+                "runs": runs,
+                "model": OPENAI_MODEL,
+                "bucket_hint": BUCKET_HINT,
+                "dry_run": bool(getattr(client, "_dry_run", False)),
+            },
+        )
+        run_uuid = run.id
+        summaries.start_run(run_uuid)
 
         self.stdout.write(self.style.MIGRATE_HEADING(f"simulate_foods: runs={runs} run_id={run_uuid}"))
 
+        self._completed_users = 0
+        profiler = cProfile.Profile() if opts.get("cprofile") else None
+        try:
+            if profiler:
+                profiler.runcall(self._simulate, run_uuid, runs, client)
+            else:
+                self._simulate(run_uuid, runs, client)
+        except Exception as e:
+            run.status = RunStatus.FAILED
+            run.error = str(e)
+            self._finish(run)
+            raise
+        finally:
+            if profiler:
+                profiler.dump_stats(opts["cprofile"])
+        run.status = RunStatus.COMPLETED
+        self._finish(run)
+        self._report_stages(run_uuid, runs, client, time.perf_counter() - wall_start, opts.get("profile_out"))
+        # Catalog hit/miss counts of this run, instead of one line per food
+        flush_counters()
+
+        # Summarize token/cost for the whole run
+        input_tokens = int(getattr(client, "input_tokens", 0) or 0)
+        output_tokens = int(getattr(client, "output_tokens", 0) or 0)
+        total_cost = client.cost_usd()
+        self.stdout.write(self.style.SUCCESS(
+            f"Done. users={runs} run_id={run_uuid} "
+            f"llm_input_tokens={input_tokens} "
+            f"llm_output_tokens={output_tokens} "
+            f"llm_cost_usd≈{total_cost:.5f}"
+        ))
+
+    # Per-stage table on stdout, optionally the same numbers as JSON
+    def _report_stages(self, run_uuid, runs, client, wall_seconds, profile_out):
+        rows = self.timer.report(wall_seconds)
+        self.stdout.write(StageTimer.format_table(rows))
+        if not profile_out:
+            return
+        profile = {
+            "run_id": str(run_uuid),
+            "users": runs,
+            "wall_seconds": round(wall_seconds, 6),
+            "llm_calls": int(getattr(client, "calls", 0) or 0),
+            "stages": rows,
+        }
+        with open(profile_out, "w", encoding="utf-8") as f:
+            json.dump(profile, f, indent=2)
+        self.stdout.write(f"Stage profile written to {profile_out}")
+
+    def _finish(self, run):
+        run.completed_users = self._completed_users
+        run.finished_at = timezone.now()
+        run.save(update_fields=["status", "error", "completed_users", "finished_at"])
+
+    # One transaction per simulated user, a failure keeps the users already committed
+    def _simulate(self, run_uuid, runs, client):
+        model_label = OPENAI_MODEL
+
         # Track previously seen trios to nudge variety
         seen_trios = set()
         seen_foods = set()
 
+        timer = self.timer
         for i in range(runs):
+            # The snapshot is frozen inside the transaction: pick up catalog edits between users
+            catalog.snapshot()
             with transaction.atomic():
                 # Create user with UNKNOWN diet initially
-                user = UserProfile.objects.create(diet=DietLabel.UNKNOWN, run_id=run_uuid)
+                with timer.stage("db.write"):
+                    user = UserProfile.objects.create(diet=DietLabel.UNKNOWN, run_id=run_uuid)
 
-                bucket = CUISINE_BUCKETS[i % len(CUISINE_BUCKETS)] if BUCKET_HINT else None
+                with timer.stage("prompt.compose"):
+                    bucket = CUISINE_BUCKETS[i % len(CUISINE_BUCKETS)] if BUCKET_HINT else None
 
-                seed_text = f"(seed:{run_uuid}-{i})"
-                base_prompt = (
-                    "Give your top-3 favorite foods.\n"
-                    "Return exactly three short food names (no brands), as a JSON array of three strings.\n"
-                    "Prefer items typical of a single cuisine or region so the three feel coherent."
-                )
-                guardrails = (
-                    "Avoid globally popular defaults unless they truly fit the chosen cuisine: "
-                    "pizza, sushi, tacos, burger, pasta."
-                )
-                bucket_line = f"Use the perspective of {bucket} cuisine." if bucket else ""
-                composed_prompt = f"{base_prompt}\n{bucket_line}\n{guardrails}\n{seed_text}"
+                    seed_text = f"(seed:{run_uuid}-{i})"
+                    base_prompt = (
+                        "Give your top-3 favorite foods.\n"
+                        "Return exactly three short food names (no brands), as a JSON array of three strings.\n"
+                        "Prefer items typical of a single cuisine or region so the three feel coherent."
+                    )
+                    guardrails = (
+                        "Avoid globally popular defaults unless they truly fit the chosen cuisine: "
+                        "pizza, sushi, tacos, burger, pasta."
+                    )
+                    bucket_line = f"Use the perspective of {bucket} cuisine." if bucket else ""
+                    composed_prompt = f"{base_prompt}\n{bucket_line}\n{guardrails}\n{seed_text}"
 
-                # Track client token counters before top-3 call
+                # Track client call/token counters before top-3 call
+                calls_before = int(getattr(client, "calls", 0) or 0)
                 a_in_before = int(getattr(client, "input_tokens", 0) or 0)
                 a_out_before = int(getattr(client, "output_tokens", 0) or 0)
 
-                foods = client.ask_top_three_favorite_foods(composed_prompt)
+                with timer.stage("llm.top3"):
+                    foods = client.ask_top_three_favorite_foods(composed_prompt)
 
-                trio_key = tuple(sorted([normalize_food_name(x) for x in foods]))
+                with timer.stage("normalize"):
+                    normalized = normalize_many(foods)
+                    trio_key = tuple(sorted(normalized))
                 if trio_key in seen_trios:
                     log.info("top3.duplicate_detected", foods=foods)
                     # Retry with fixed avoid set
                     avoid_line = f"\nAvoid repeating {seen_trios}."
-                    foods = client.ask_top_three_favorite_foods(composed_prompt + avoid_line)
-                    trio_key = tuple(sorted([normalize_food_name(x) for x in foods]))
+                    with timer.stage("llm.top3"):
+                        foods = client.ask_top_three_favorite_foods(composed_prompt + avoid_line)
+                    with timer.stage("normalize"):
+                        normalized = normalize_many(foods)
+                        trio_key = tuple(sorted(normalized))
                     log.info("top3.retry_unique", foods=foods)
 
                 seen_trios.add(trio_key)
-                seen_foods.update([normalize_food_name(x) for x in foods])
+                seen_foods.update(normalized)
 
                 # Client token counters after top-3 call
                 a_in_after = int(getattr(client, "input_tokens", 0) or 0)
@@ -104,34 +204,36 @@ class Command(BaseCommand):
                 a_cost_usd = (a_prompt_tokens / 1000.0) * PRICE_PER_1K_INPUT + \
                              (a_completion_tokens / 1000.0) * PRICE_PER_1K_OUTPUT
 
-                # Store Conversation A
-                Conversation.objects.create(
-                    user=user,
-                    role=MessageRole.A,
-                    prompt=composed_prompt,
-                    response="",
-                    model=model_label,
-                    prompt_tokens=a_prompt_tokens,
-                    completion_tokens=a_completion_tokens,
-                    total_tokens=a_total_tokens,
-                    estimated_cost_usd=round(a_cost_usd, 6),
-                    run_id=run_uuid,
-                )
+                # Store Conversations A and B, the prompt as a shared template plus its bucket/seed
+                with timer.stage("db.write"):
+                    stored_prompt = prompts.compact(composed_prompt)
+                    Conversation.objects.create(
+                        user=user,
+                        role=MessageRole.A,
+                        **stored_prompt,
+                        response="",
+                        model=model_label,
+                        prompt_tokens=a_prompt_tokens,
+                        completion_tokens=a_completion_tokens,
+                        total_tokens=a_total_tokens,
+                        estimated_cost_usd=round(a_cost_usd, 6),
+                        run_id=run_uuid,
+                    )
 
-                # Store Conversation B
-                b_response_text = ", ".join(foods)
-                b_msg = Conversation.objects.create(
-                    user=user,
-                    role=MessageRole.B,
-                    prompt=composed_prompt,
-                    response=b_response_text,
-                    model=model_label,
-                    prompt_tokens=None,
-                    completion_tokens=None,
-                    total_tokens=None,
-                    estimated_cost_usd=None,
-                    run_id=run_uuid,
-                )
+                    # Store Conversation B
+                    b_response_text = ", ".join(foods)
+                    b_msg = Conversation.objects.create(
+                        user=user,
+                        role=MessageRole.B,
+                        **stored_prompt,
+                        response=b_response_text,
+                        model=model_label,
+                        prompt_tokens=None,
+                        completion_tokens=None,
+                        total_tokens=None,
+                        estimated_cost_usd=None,
+                        run_id=run_uuid,
+                    )
 
                 # Track client counters before classification loop
                 b_in_before = int(getattr(client, "input_tokens", 0) or 0)
@@ -139,25 +241,34 @@ class Command(BaseCommand):
 
                 # Insert favorites with normalization + catalog lookup/expansion
                 diets_seen = []
-                for rank, raw in enumerate(foods, start=1):
-                    norm = normalize_food_name(raw)
-                    cat = catalog.lookup(norm)
+                catalog_ids = []
+                catalog_hits = 0
+                for rank, (raw, norm) in enumerate(zip(foods, normalized, strict=True), start=1):
+                    with timer.stage("catalog.lookup"):
+                        cat = catalog.lookup(norm)
+                    catalog_hits += int(cat is not None)
                     if cat is None:
                         # LLM classification, only triggers if a food not in catalog
-                        cat = catalog.expand_with_llm(norm, client=client)
+                        with timer.stage("llm.classify"):
+                            cat = catalog.expand_with_llm(norm, client=client)
 
-                    FavoriteFood.objects.create(
-                        user=user,
-                        rank=rank,
-                        name_raw=raw,
-                        food_name=norm,
-                        catalog=cat,
-                    )
+                    # Counted in food_pair once per user below
+                    with timer.stage("db.write"), pairs.manual():
+                        FavoriteFood.objects.create(
+                            user=user,
+                            rank=rank,
+                            name_raw=raw,
+                            food_name=norm,
+                            catalog=cat,
+                        )
                     diets_seen.append(cat.diet if cat else DietLabel.UNKNOWN)
+                    if cat is not None:
+                        catalog_ids.append(cat.pk)
 
                 # Derive user's diet from the three labels
                 user.diet = derive_user_diet(diets_seen)
-                user.save(update_fields=["diet"])
+                with timer.stage("db.write"):
+                    user.save(update_fields=["diet"])
 
                 # Client counters after classification loop
                 b_in_after = int(getattr(client, "input_tokens", 0) or 0)
@@ -168,17 +279,29 @@ class Command(BaseCommand):
                 b_cost_usd = (b_prompt_tokens / 1000.0) * PRICE_PER_1K_INPUT + \
                              (b_completion_tokens / 1000.0) * PRICE_PER_1K_OUTPUT
 
-                # Update Conversation B with token/cost
-                b_msg.prompt_tokens = b_prompt_tokens
-                b_msg.completion_tokens = b_completion_tokens
-                b_msg.total_tokens = b_total_tokens
-                b_msg.estimated_cost_usd = round(b_cost_usd, 6)
-                b_msg.save(update_fields=[
-                    "prompt_tokens",
-                    "completion_tokens",
-                    "total_tokens",
-                    "estimated_cost_usd"
-                ])
+                # Update Conversation B with token/cost and the run rollup
+                with timer.stage("db.write"):
+                    b_msg.prompt_tokens = b_prompt_tokens
+                    b_msg.completion_tokens = b_completion_tokens
+                    b_msg.total_tokens = b_total_tokens
+                    b_msg.estimated_cost_usd = round(b_cost_usd, 6)
+                    b_msg.save(update_fields=[
+                        "prompt_tokens",
+                        "completion_tokens",
+                        "total_tokens",
+                        "estimated_cost_usd"
+                    ])
+
+                    summaries.record_user(
+                        run_uuid,
+                        diet=user.diet,
+                        tokens=a_total_tokens + b_total_tokens,
+                        cost_usd=a_cost_usd + b_cost_usd,
+                        llm_calls=int(getattr(client, "calls", 0) or 0) - calls_before,
+                        catalog_lookups=len(foods),
+                        catalog_hits=catalog_hits,
+                    )
+                    pairs.add([catalog_ids])
 
                 log.info(
                     "simulation.user_done",
@@ -189,14 +312,6 @@ class Command(BaseCommand):
                     a_tokens=a_total_tokens,
                     b_tokens=b_total_tokens,
                 )
-
-        # Summarize token/cost for the whole run
-        input_tokens = int(getattr(client, "input_tokens", 0) or 0)
-        output_tokens = int(getattr(client, "output_tokens", 0) or 0)
-        total_cost = client.cost_usd()
-        self.stdout.write(self.style.SUCCESS(
-            f"Done. users={runs} run_id={run_uuid} "
-            f"llm_input_tokens={input_tokens} "
-            f"llm_output_tokens={output_tokens} "
-            f"llm_cost_usd≈{total_cost:.5f}"
-        ))
+                body_done = time.perf_counter()
+            timer.add("db.commit", time.perf_counter() - body_done)
+            self._completed_users += 1
@@ -1,6 +1,8 @@
+import string
 import uuid
 
 from django.db import models
+from django.utils import timezone
 
 
 class DietLabel(models.TextChoices):
@@ -15,6 +17,41 @@ class MessageRole(models.TextChoices):
     B = "B", "Responder"
 
 
+class RunStatus(models.TextChoices):
+    RUNNING = "running", "Running"
+    COMPLETED = "completed", "Completed"
+    FAILED = "failed", "Failed"
+
+
+class SimulationRun(models.Model):
+    """
+    One simulate_foods invocation.
+    Users and conversations point here, so listing runs never scans users.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    status = models.CharField(
+        max_length=12,
+        choices=RunStatus.choices,
+        default=RunStatus.RUNNING
+    )
+    params = models.JSONField(default=dict, blank=True)
+    requested_users = models.PositiveIntegerField(default=0)
+    completed_users = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default="")
+    started_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = "simulation_run"
+        indexes = [
+            models.Index(fields=["started_at"]),
+            models.Index(fields=["status"]),
+        ]
+
+    def __str__(self):
+        return f"run:{self.id} [{self.status}]"
+
+
 class FoodCatalog(models.Model):
     """
     Cache of food names and their diet labels.
@@ -53,20 +90,46 @@ class UserProfile(models.Model):
         choices=DietLabel.choices,
         default=DietLabel.UNKNOWN
     )
-    run_id = models.UUIDField(null=True, blank=True)
+    # db_column keeps the "run_id" column/attribute, the FK adds its own index
+    run = models.ForeignKey(
+        SimulationRun,
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+        related_name="users",
+        db_column="run_id",
+    )
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         db_table = "user_profile"
         indexes = [
             models.Index(fields=["diet"]),
-            models.Index(fields=["run_id"]),
         ]
 
     def __str__(self):
         return f"user:{self.id} diet:{self.diet}"
 
 
+class PromptTemplate(models.Model):
+    """
+    Deduplicated prompt text, keyed by its SHA-256.
+    Per-user values are "${name}" placeholders filled from Conversation.prompt_params.
+    """
+    content_hash = models.CharField(max_length=64, unique=True)
+    template = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "prompt_template"
+
+    def __str__(self):
+        return f"prompt:{self.content_hash[:12]}"
+
+    def render(self, params):
+        return string.Template(self.template).substitute(params or {})
+
+
 class Conversation(models.Model):
     """
     Single message in a conversation (either A or B).
@@ -74,7 +137,16 @@ class Conversation(models.Model):
     """
     user = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name="messages")
     role = models.CharField(max_length=1, choices=MessageRole.choices)
+    # Literal prompt, kept for rows that have no template (see prompt_text)
     prompt = models.TextField(blank=True, default="")
+    prompt_template = models.ForeignKey(
+        PromptTemplate,
+        null=True,
+        blank=True,
+        on_delete=models.PROTECT,
+        related_name="messages",
+    )
+    prompt_params = models.JSONField(null=True, blank=True)
     response = models.TextField(blank=True, default="")
     model = models.CharField(max_length=64, blank=True, default="")
 
@@ -89,7 +161,14 @@ class Conversation(models.Model):
         blank=True
     )
 
-    run_id = models.UUIDField(null=True, blank=True)
+    run = models.ForeignKey(
+        SimulationRun,
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+        related_name="messages",
+        db_column="run_id",
+    )
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -97,12 +176,17 @@ class Conversation(models.Model):
         indexes = [
             models.Index(fields=["user"]),
             models.Index(fields=["role"]),
-            models.Index(fields=["run_id"]),
         ]
 
     def __str__(self):
         return f"{self.role} msg for {self.user_id} @ {self.created_at:%Y-%m-%d %H:%M:%S}"
 
+    @property
+    def prompt_text(self):
+        if self.prompt_template_id is None:
+            return self.prompt
+        return self.prompt_template.render(self.prompt_params)
+
 
 class FavoriteFood(models.Model):
     """
@@ -123,7 +207,96 @@ class FavoriteFood(models.Model):
         ]
         indexes = [
             models.Index(fields=["user", "rank"]),
+            # Admin prefix search
+            models.Index(fields=["food_name"]),
         ]
 
     def __str__(self):
         return f"{self.user_id} #{self.rank} {self.name_raw}"
+
+
+class FoodPair(models.Model):
+    """
+    Co-occurrence index: users who favorited both foods, kept up to date as
+    favorites are written. Stored in both directions, so the foods related to
+    one food are a single index range.
+    """
+    food = models.ForeignKey(FoodCatalog, on_delete=models.CASCADE, related_name="+")
+    related = models.ForeignKey(FoodCatalog, on_delete=models.CASCADE, related_name="+")
+    users = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = "food_pair"
+        constraints = [
+            models.UniqueConstraint(fields=["food", "related"], name="unique_food_pair")
+        ]
+        indexes = [
+            models.Index(fields=["food", "-users", "related"]),
+        ]
+
+    def __str__(self):
+        return f"{self.food_id} + {self.related_id} x{self.users}"
+
+
+class RunSummary(models.Model):
+    """
+    Per-run rollup, incremented as each simulated user is persisted.
+    Aggregate reads scan one row per run instead of every message.
+    """
+    run = models.OneToOneField(
+        SimulationRun,
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name="summary",
+        db_column="run_id",
+    )
+    users = models.PositiveIntegerField(default=0)
+
+    # Diet histogram
+    vegan = models.PositiveIntegerField(default=0)
+    vegetarian = models.PositiveIntegerField(default=0)
+    omnivore = models.PositiveIntegerField(default=0)
+    unknown = models.PositiveIntegerField(default=0)
+
+    # Token/costs accounting
+    total_tokens = models.BigIntegerField(default=0)
+    estimated_cost_usd = models.DecimalField(max_digits=14, decimal_places=6, default=0)
+    llm_calls = models.PositiveIntegerField(default=0)
+
+    # Catalog effectiveness
+    catalog_lookups = models.PositiveIntegerField(default=0)
+    catalog_hits = models.PositiveIntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "run_summary"
+
+    def __str__(self):
+        return f"run:{self.run_id} users:{self.users}"
+
+    @property
+    def catalog_hit_rate(self):
+        if not self.catalog_lookups:
+            return None
+        return round(self.catalog_hits / self.catalog_lookups, 4)
+
+    def diet_histogram(self):
+        return {label: getattr(self, label) for label in DietLabel.values}
+
+
+class DataVersion(models.Model):
+    """
+    Write counter per data scope (users, catalog).
+    Bumped once per committed transaction, read by conditional GETs.
+    """
+    scope = models.CharField(max_length=16, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "data_version"
+
+    def __str__(self):
+        return f"{self.scope} v{self.version}"
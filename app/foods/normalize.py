@@ -1,25 +1,97 @@
+import csv
+import os
 import re
+import unicodedata
+from functools import lru_cache
 
-_COMMON_TYPO_FIXES = {
-    "avocato": "avocado",
-    "humus": "hummus",
-    "bolonese": "bolognese",
-    "omlette": "omelette",
-    "margharita": "margherita",
-}
+ALIASES_PATH = os.getenv(
+    "EFB_FOOD_ALIASES_PATH", os.path.join(os.path.dirname(__file__), "seeds", "food_aliases.csv")
+)
+# Distinct names remembered per process; simulate_foods and lookups repeat the same few hundred
+CACHE_SIZE = int(os.getenv("EFB_NORMALIZE_CACHE_SIZE", "4096"))
 
 _MULTI_SPACE = re.compile(r"\s+")
 _NON_WORD_EDGES = re.compile(r"^[^a-z0-9]+|[^a-z0-9]+$", re.IGNORECASE)
 
-# Normalize with lowercase, strip, collapse spaces, typo fixes.
+
+# "alias,canonical" rows, "#" comment lines; returns (word fixes, phrase fixes)
+def load_aliases(path):
+    words, phrases = {}, {}
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = csv.DictReader(line for line in f if line.strip() and not line.startswith("#"))
+        for row in rows:
+            alias = _fold(row["alias"])
+            canonical = _fold(row["canonical"])
+            (phrases if " " in alias else words)[alias] = canonical
+    return words, phrases
+
+
+# Lowercase, accents removed ("Crème Brûlée" -> "creme brulee"), spaces collapsed
+def _fold(text):
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return _MULTI_SPACE.sub(" ", text.strip().lower())
+
+
+class Normalizer:
+    """
+    Food name normalizer with its alias tables compiled once: a dict for word
+    fixes and a single alternation regex for phrases. Results are memoized in
+    a bounded LRU cache.
+    """
+
+    def __init__(self, words=None, phrases=None, cache_size=CACHE_SIZE):
+        self.words = dict(words or {})
+        # Phrases match after the word fixes, so their aliases are stored word-fixed too
+        self.phrases = {self._fix_words(alias): canonical for alias, canonical in (phrases or {}).items()}
+        alternatives = "|".join(re.escape(p) for p in sorted(self.phrases, key=len, reverse=True))
+        # Whole space-separated tokens only, "mac n cheese" must not match inside "imac n cheeses"
+        self._phrase_re = re.compile(rf"(?<!\S)(?:{alternatives})(?!\S)") if alternatives else None
+        self._cached = lru_cache(maxsize=cache_size)(self._normalize)
+
+    @classmethod
+    def from_file(cls, path, cache_size=CACHE_SIZE):
+        words, phrases = load_aliases(path)
+        return cls(words, phrases, cache_size)
+
+    def _fix_words(self, s):
+        return " ".join(self.words.get(tok, tok) for tok in s.split(" ") if tok)
+
+    def _normalize(self, name):
+        s = _NON_WORD_EDGES.sub("", _fold(name))
+        s = self._fix_words(s)
+        if self._phrase_re is not None:
+            s = self._phrase_re.sub(lambda m: self.phrases[m.group(0)], s)
+        return s
+
+    def __call__(self, name):
+        return self._cached(name or "")
+
+    # Same order as names; repeated names are normalized once
+    def many(self, names):
+        done = {}
+        out = []
+        for name in names:
+            key = name or ""
+            if key not in done:
+                done[key] = self._cached(key)
+            out.append(done[key])
+        return out
+
+    def cache_info(self):
+        return self._cached.cache_info()
+
+    def cache_clear(self):
+        self._cached.cache_clear()
+
+
+default_normalizer = Normalizer.from_file(ALIASES_PATH) if os.path.exists(ALIASES_PATH) else Normalizer()
+
+
+# Normalize with lowercase, accent folding, trimmed edges, collapsed spaces, typo/plural fixes.
 def normalize_food_name(name):
-    original = name or ""
-    s = original.strip().lower()
-    s = _NON_WORD_EDGES.sub("", s)
-    s = _MULTI_SPACE.sub(" ", s)
+    return default_normalizer(name)
 
-    # Typo fixes on word tokens
-    tokens = [ _COMMON_TYPO_FIXES.get(tok, tok) for tok in s.split(" ") if tok ]
-    fixed = " ".join(tokens)
 
-    return fixed
+def normalize_many(names):
+    return default_normalizer.many(names)
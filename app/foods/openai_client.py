@@ -2,9 +2,13 @@ import json
 import os
 import re
 import time
+from contextlib import nullcontext
+from functools import cached_property
 
 import structlog
 
+from common import metrics
+
 from .normalize import normalize_food_name
 
 log = structlog.get_logger(__name__)
@@ -28,15 +32,26 @@ class OpenAIClient:
         if self._dry_run == 0:
             if not OPENAI_API_KEY:
                 raise RuntimeError("OPENAI_API_KEY is required for live runs.")
-            try:
-                from openai import OpenAI
-                self._client = OpenAI(api_key=OPENAI_API_KEY)
-            except Exception as e:
-                log.warning("openai_import_failed", error=str(e))
-                raise
 
         self.input_tokens = 0
         self.output_tokens = 0
+        # Live (billed) requests sent through this client
+        self.calls = 0
+        # Optional common.timing.StageTimer, set by simulate_foods
+        self.timer = None
+
+    def _stage(self, name):
+        return self.timer.stage(name) if self.timer is not None else nullcontext()
+
+    # The SDK (httpx, pydantic) is only imported on the first live request
+    @cached_property
+    def _client(self):
+        try:
+            from openai import OpenAI
+        except Exception as e:
+            log.warning("openai_import_failed", error=str(e))
+            raise
+        return OpenAI(api_key=OPENAI_API_KEY)
 
     # Budget control
     def _consume_budget(self, reason):
@@ -52,6 +67,23 @@ class OpenAIClient:
         return (self.input_tokens / 1000.0) * PRICE_PER_1K_INPUT + \
                (self.output_tokens / 1000.0) * PRICE_PER_1K_OUTPUT
 
+    # Add a response's usage to the run counters and the per-purpose metrics
+    def _record_usage(self, purpose, ms, resp):
+        usage = getattr(resp, "usage", None)
+        prompt_tokens = int(getattr(usage, "prompt_tokens", 0) or 0) if usage else 0
+        completion_tokens = int(getattr(usage, "completion_tokens", 0) or 0) if usage else 0
+        self.input_tokens += prompt_tokens
+        self.output_tokens += completion_tokens
+
+        metrics.observe("efb_llm_request_duration_seconds", ms / 1000.0, purpose=purpose)
+        metrics.inc("efb_llm_tokens_total", prompt_tokens, purpose=purpose, direction="input")
+        metrics.inc("efb_llm_tokens_total", completion_tokens, purpose=purpose, direction="output")
+        metrics.inc(
+            "efb_llm_cost_usd_total",
+            (prompt_tokens / 1000.0) * PRICE_PER_1K_INPUT + (completion_tokens / 1000.0) * PRICE_PER_1K_OUTPUT,
+            purpose=purpose,
+        )
+
     @staticmethod
     def _strip_markdown_fences(s):
         s = s.strip()
@@ -122,6 +154,7 @@ class OpenAIClient:
             return foods
 
         self._consume_budget("ask_top_three_favorite_foods")
+        self.calls += 1
 
         system = (
             "Return exactly three food names as a JSON array of three short strings. "
@@ -143,21 +176,88 @@ class OpenAIClient:
             )
             ms = int((time.time() - start) * 1000)
             text = (resp.choices[0].message.content or "").strip()
+            self._record_usage("top3", ms, resp)
 
-            usage = getattr(resp, "usage", None)
-            if usage:
-                self.input_tokens += int(getattr(usage, "prompt_tokens", 0) or 0)
-                self.output_tokens += int(getattr(usage, "completion_tokens", 0) or 0)
-
-            foods = self._parse_three_foods(text)
+            with self._stage("llm.parse"):
+                foods = self._parse_three_foods(text)
             log.info("llm.top3", result=foods, ms=ms)
             return foods
         except Exception as e:
             # Include a snippet of the model text for debugging
             snippet = (text or "")[:160]
             log.warning("llm.error.top3", error=str(e), raw_snippet=snippet)
+            metrics.inc("efb_llm_errors_total", purpose="top3")
             raise
 
+    @staticmethod
+    def _parse_diet_map(text, food_names):
+        s = OpenAIClient._strip_markdown_fences(text)
+        try:
+            data = json.loads(s)
+        except Exception:
+            m = re.search(r"\{.*\}", s, flags=re.DOTALL)
+            data = json.loads(m.group(0)) if m else None
+        if not isinstance(data, dict):
+            raise ValueError(f"Expected a JSON object; got: {s[:120]}")
+
+        by_key = {str(k).strip().lower(): v for k, v in data.items()}
+        labels = {}
+        for name in food_names:
+            entry = by_key.get(name.lower())
+            if not isinstance(entry, dict):
+                continue
+            diet = str(entry.get("diet", "")).strip().lower()
+            if diet not in {"vegan", "vegetarian", "omnivore"}:
+                continue
+            try:
+                confidence = float(entry["confidence"])
+            except (KeyError, TypeError, ValueError):
+                confidence = None
+            labels[name] = (diet, confidence)
+        return labels
+
+    # Classify several foods in one request; returns {name: (diet, confidence)}, unlabeled names left out
+    def classify_food_diets(self, food_names):
+        if self._dry_run:
+            from .models import FoodCatalog
+            rows = FoodCatalog.objects.filter(food_name__in=food_names).values_list("food_name", "diet", "confidence")
+            labels = {name: (diet, confidence) for name, diet, confidence in rows}
+            log.info("llm.classify_batch", foods=len(food_names), labeled=len(labels), ms=0, got="dry_run")
+            return labels
+
+        self._consume_budget("classify_food_diets")
+        self.calls += 1
+
+        prompt = (
+            "Classify each food item below into one label:\n"
+            "- VEGAN: contains no animal products.\n"
+            "- VEGETARIAN: may include dairy/eggs, but no meat/fish.\n"
+            "- OMNIVORE: includes meat or fish.\n"
+            "Return STRICT JSON, no markdown fences: an object with each food exactly as written as key and "
+            "{\"diet\": \"<vegan|vegetarian|omnivore>\", \"confidence\": <float between 0 and 1>} as value.\n"
+            f"Foods: {json.dumps(food_names)}"
+        )
+        text = ""
+        try:
+            start = time.time()
+            resp = self._client.chat.completions.create(
+                model=OPENAI_MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0,
+            )
+            ms = int((time.time() - start) * 1000)
+            text = (resp.choices[0].message.content or "").strip()
+            self._record_usage("classify_batch", ms, resp)
+
+            with self._stage("llm.parse"):
+                labels = self._parse_diet_map(text, food_names)
+            log.info("llm.classify_batch", foods=len(food_names), labeled=len(labels), ms=ms)
+            return labels
+        except Exception as e:
+            log.warning("llm.error.classify_batch", error=str(e), raw_snippet=text[:160])
+            metrics.inc("efb_llm_errors_total", purpose="classify_batch")
+            return {}
+
     def classify_food_diet(self, food_name):
         if self._dry_run:
             from .models import FoodCatalog
@@ -182,6 +282,7 @@ class OpenAIClient:
             return "unknown", None
 
         self._consume_budget("classify_food_diet")
+        self.calls += 1
 
         prompt = (
             "Classify the single food item below into one label:\n"
@@ -201,19 +302,16 @@ class OpenAIClient:
             )
             ms = int((time.time() - start) * 1000)
             text = (resp.choices[0].message.content or "").strip().upper()
+            self._record_usage("classify", ms, resp)
 
-            usage = getattr(resp, "usage", None)
-            if usage:
-                self.input_tokens += int(getattr(usage, "prompt_tokens", 0) or 0)
-                self.output_tokens += int(getattr(usage, "completion_tokens", 0) or 0)
-
-            try:
-                data = json.loads(text)
-                diet = str(data.get("diet", "")).lower()
-                confidence = float(data.get("confidence", 0.0))
-            except Exception:
-                diet = text.strip().lower()
-                confidence = None
+            with self._stage("llm.parse"):
+                try:
+                    data = json.loads(text)
+                    diet = str(data.get("diet", "")).lower()
+                    confidence = float(data.get("confidence", 0.0))
+                except Exception:
+                    diet = text.strip().lower()
+                    confidence = None
 
             if diet in {"vegan", "vegetarian", "omnivore"}:
                 log.info(
@@ -230,4 +328,5 @@ class OpenAIClient:
 
         except Exception as e:
             log.warning("llm.error.classify", error=str(e))
+            metrics.inc("efb_llm_errors_total", purpose="classify")
             return None
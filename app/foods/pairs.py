@@ -0,0 +1,145 @@
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from itertools import combinations
+
+from django.db import connection, transaction
+
+from foods import catalog, versioning
+from foods.models import DietLabel, FavoriteFood, FoodCatalog, FoodPair
+from foods.normalize import normalize_food_name
+
+RELATED_LIMIT = 10
+RELATED_MAX_LIMIT = 50
+# Suggestions a diet can eat: vegans see vegan foods, vegetarians vegan and vegetarian
+SUITABLE_DIETS = {
+    DietLabel.VEGAN: [DietLabel.VEGAN],
+    DietLabel.VEGETARIAN: [DietLabel.VEGAN, DietLabel.VEGETARIAN],
+    DietLabel.OMNIVORE: [DietLabel.VEGAN, DietLabel.VEGETARIAN, DietLabel.OMNIVORE],
+}
+# Rows per INSERT batch when rebuilding
+BATCH_SIZE = 5000
+
+_local = threading.local()
+
+
+# Pair counts in both directions for groups of catalog ids (one group per user)
+def _pair_counts(groups):
+    counts = Counter()
+    for ids in groups:
+        for a, b in combinations(sorted(set(ids)), 2):
+            counts[(a, b)] += 1
+            counts[(b, a)] += 1
+    return counts
+
+
+# Add signed user counts to pair rows with one upsert per batch, no read
+def _write(counts):
+    counts = {pair: n for pair, n in counts.items() if n}
+    if not counts:
+        return 0
+    qn = connection.ops.quote_name
+    table = qn(FoodPair._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {table} ({qn('food_id')}, {qn('related_id')}, {qn('users')}) VALUES (%s, %s, %s) "
+            f"ON CONFLICT ({qn('food_id')}, {qn('related_id')}) "
+            f"DO UPDATE SET {qn('users')} = {table}.{qn('users')} + EXCLUDED.{qn('users')}",
+            [(a, b, n) for (a, b), n in counts.items()],
+        )
+    lowered = {a for (a, _), n in counts.items() if n < 0}
+    if lowered:
+        FoodPair.objects.filter(food_id__in=lowered, users__lte=0).delete()
+    return len(counts)
+
+
+# Count a new user's favorites, called in the transaction that writes them
+def add(groups):
+    return _write(_pair_counts(groups))
+
+
+def remove(groups):
+    return _write({pair: -n for pair, n in _pair_counts(groups).items()})
+
+
+def groups_for_users(user_ids):
+    groups = defaultdict(list)
+    rows = FavoriteFood.objects.filter(user_id__in=user_ids, catalog__isnull=False).values_list("user_id", "catalog_id")
+    for user_id, catalog_id in rows:
+        groups[user_id].append(catalog_id)
+    return list(groups.values())
+
+
+def _group(user_id):
+    return list(FavoriteFood.objects.filter(user_id=user_id, catalog__isnull=False).values_list("catalog_id", flat=True))
+
+
+# Writers that count their own favorites in one batch (simulate_foods, archive)
+# turn off the per-row tracking done by the FavoriteFood signal handlers
+@contextmanager
+def manual():
+    previous = getattr(_local, "manual", False)
+    _local.manual = True
+    try:
+        yield
+    finally:
+        _local.manual = previous
+
+
+# Per-row tracking for saves and deletes outside those writers (admin, shell):
+# remember the users' catalog foods before the write, apply the difference after it
+def before_change(user_ids):
+    if getattr(_local, "manual", False):
+        return
+    pending = _local.__dict__.setdefault("pending", {})
+    for user_id in user_ids:
+        pending[user_id] = _group(user_id)
+
+
+# A cascade deletes every collected row before the first post_delete, so the
+# first call sees the final state of all pending users
+def after_change():
+    pending = _local.__dict__.pop("pending", {})
+    for user_id, before in pending.items():
+        counts = _pair_counts([_group(user_id)])
+        counts.subtract(_pair_counts([before]))
+        _write(counts)
+
+
+# Recompute the whole index from favorites (backfill, or after bulk writes that skipped it)
+def rebuild():
+    from foods import analytics
+
+    data = analytics.Dataset.load()
+    a, b, counts = data.cooccurrence()
+    a_ids, b_ids = data.ids[a].tolist(), data.ids[b].tolist()
+    counts = counts.tolist()
+    rows = [
+        pair
+        for x, y, n in zip(a_ids, b_ids, counts, strict=True)
+        for pair in (FoodPair(food_id=x, related_id=y, users=n), FoodPair(food_id=y, related_id=x, users=n))
+    ]
+    with transaction.atomic():
+        FoodPair.objects.all().delete()
+        FoodPair.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+        # bulk_create sends no signals
+        versioning.bump(versioning.SCOPE_USERS)
+    return len(counts)
+
+
+# Foods most often favorited together with food_name; None when it is not in the catalog
+# One index range on (food, -users): cost grows with limit, not with users
+def related_foods(food_name, diet=None, limit=RELATED_LIMIT):
+    norm = normalize_food_name(food_name)
+    food = catalog.snapshot().get(norm) or FoodCatalog.objects.filter(food_name=norm).first()
+    if food is None:
+        return None
+    qs = FoodPair.objects.filter(food_id=food.pk)
+    if diet:
+        qs = qs.filter(related__diet__in=SUITABLE_DIETS[diet])
+    rows = qs.order_by("-users", "related_id").values_list("related__food_name", "related__diet", "users")[:limit]
+    return {
+        "food_name": food.food_name,
+        "diet": food.diet,
+        "related": [{"food_name": name, "diet": d, "users": users} for name, d, users in rows],
+    }
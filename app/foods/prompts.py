@@ -0,0 +1,65 @@
+import hashlib
+import re
+
+from django.db import transaction
+
+from foods.models import PromptTemplate
+
+# Prompt lines carrying per-user values; the captured part becomes a placeholder
+PARAM_LINES = (
+    ("bucket", re.compile(r"^Use the perspective of (?P<value>.+) cuisine\.$")),
+    ("seed", re.compile(r"^\(seed:(?P<value>[^()]*)\)$")),
+)
+
+# content_hash -> PromptTemplate id, filled only with committed rows
+_template_ids = {}
+
+
+def _escape(text):
+    return text.replace("$", "$$")
+
+
+# Prompt text -> (template, params) such that the template rendered with params gives the text back
+def split(text):
+    lines, params = [], {}
+    for line in text.split("\n"):
+        for name, pattern in PARAM_LINES:
+            match = pattern.match(line)
+            if match and name not in params:
+                params[name] = match.group("value")
+                start, end = match.span("value")
+                line = _escape(line[:start]) + "${" + name + "}" + _escape(line[end:])
+                break
+        else:
+            line = _escape(line)
+        lines.append(line)
+    template = "\n".join(lines)
+    if PromptTemplate(template=template).render(params) != text:
+        return _escape(text), {}
+    return template, params
+
+
+def content_hash(template):
+    return hashlib.sha256(template.encode("utf-8")).hexdigest()
+
+
+def template_id(template):
+    digest = content_hash(template)
+    cached = _template_ids.get(digest)
+    if cached is not None:
+        return cached
+    obj, _ = PromptTemplate.objects.get_or_create(content_hash=digest, defaults={"template": template})
+    # A rolled-back transaction must not leave a dangling id in the cache
+    transaction.on_commit(lambda: _template_ids.setdefault(digest, obj.pk))
+    return obj.pk
+
+
+def reset_cache():
+    _template_ids.clear()
+
+
+# Fields to store on a Conversation instead of the literal prompt
+def compact(text):
+    template, params = split(text)
+    return {"prompt": "", "prompt_template_id": template_id(template), "prompt_params": params or None}
+
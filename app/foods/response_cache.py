@@ -0,0 +1,81 @@
+import hashlib
+import threading
+
+from django.core.cache import cache
+
+from common import metrics
+
+# Query params each cached view reads; anything else (cache-busters, profiler flag,
+# unknown params) shares the same entry instead of growing the cache
+KEY_PARAMS = {
+    "veg_users": (),
+    "dashboard": ("run_id", "diet", "page"),
+    "diets_png": ("run_id", "diet"),
+    "diets_svg": ("run_id", "diet"),
+    "food_stats": ("top",),
+}
+
+_lock = threading.Lock()
+_stats = {}
+
+
+# Stable key: namespace + data version + the sorted params that namespace reads
+def cache_key(namespace, params, version):
+    items = [
+        (k, sorted(params.getlist(k)))
+        for k in KEY_PARAMS[namespace]
+        if k in params
+    ]
+    digest = hashlib.sha1(repr(items).encode("utf-8")).hexdigest()
+    return f"efb:{namespace}:{version}:{digest}"
+
+
+def _record(namespace, hit):
+    with _lock:
+        counts = _stats.setdefault(namespace, {"hits": 0, "misses": 0})
+        counts["hits" if hit else "misses"] += 1
+    metrics.inc("efb_response_cache_requests_total", namespace=namespace, result="hit" if hit else "miss")
+
+
+# Return the cached value or build, store and return it
+# A new data version changes the key, so writes invalidate without explicit deletes
+def get_or_set(namespace, params, version, builder):
+    key = cache_key(namespace, params, version)
+    value = cache.get(key)
+    if value is not None:
+        _record(namespace, hit=True)
+        return value
+
+    _record(namespace, hit=False)
+    value = builder()
+    cache.set(key, value)
+    return value
+
+
+async def aget_or_set(namespace, params, version, builder):
+    key = cache_key(namespace, params, version)
+    value = await cache.aget(key)
+    if value is not None:
+        _record(namespace, hit=True)
+        return value
+
+    _record(namespace, hit=False)
+    value = await builder()
+    await cache.aset(key, value)
+    return value
+
+
+# Hit/miss counters and hit ratio per namespace for this worker process only
+# (the shared metrics registry has the all-worker totals)
+def stats():
+    with _lock:
+        snapshot = {ns: dict(counts) for ns, counts in _stats.items()}
+    for counts in snapshot.values():
+        total = counts["hits"] + counts["misses"]
+        counts["hit_ratio"] = round(counts["hits"] / total, 4) if total else None
+    return snapshot
+
+
+def reset_stats():
+    with _lock:
+        _stats.clear()
@@ -0,0 +1,61 @@
+from django.apps import apps
+from django.db import connections
+
+from foods.models import Conversation
+
+# This app has no migrations: migrate (syncdb) creates missing tables but never alters
+# existing ones. These add what newer models need to tables created before them.
+
+
+def _existing(connection, table):
+    with connection.cursor() as cursor:
+        if table not in connection.introspection.table_names(cursor):
+            return None, None
+        columns = {col.name for col in connection.introspection.get_table_description(cursor, table)}
+        constraints = connection.introspection.get_constraints(cursor, table)
+    return columns, constraints
+
+
+# Nullable columns only, existing rows get NULL
+def ensure_columns(model, field_names, using="default"):
+    connection = connections[using]
+    columns, _ = _existing(connection, model._meta.db_table)
+    if columns is None:
+        return []
+    missing = [model._meta.get_field(name) for name in field_names]
+    missing = [field for field in missing if field.column not in columns]
+    if missing:
+        with connection.schema_editor() as editor:
+            for field in missing:
+                editor.add_field(model, field)
+    return [field.column for field in missing]
+
+
+# Meta.indexes declared after the table was created
+def ensure_indexes(model, using="default"):
+    connection = connections[using]
+    _, constraints = _existing(connection, model._meta.db_table)
+    if constraints is None:
+        return []
+    missing = [index for index in model._meta.indexes if index.name not in constraints]
+    if missing:
+        with connection.schema_editor() as editor:
+            for index in missing:
+                editor.add_index(model, index)
+    return [index.name for index in missing]
+
+
+# False when any of the models' tables is missing (migrate without --run-syncdb)
+def has_tables(models, using="default"):
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        existing = set(connection.introspection.table_names(cursor))
+    return all(model._meta.db_table in existing for model in models)
+
+
+# Run after every migrate (see signals), returns the columns and indexes it added
+def sync(using="default"):
+    added = ensure_columns(Conversation, ("prompt_template", "prompt_params"), using)
+    for model in apps.get_app_config("foods").get_models():
+        added += ensure_indexes(model, using)
+    return added
@@ -1,5 +1,7 @@
 from rest_framework import serializers
 
+from .models import SimulationRun
+
 
 class VegUserSerializer(serializers.Serializer):
     user_id = serializers.UUIDField()
@@ -10,3 +12,20 @@ class VegUserSerializer(serializers.Serializer):
         min_length=1,
         max_length=3
     )
+
+
+class SimulationRunSerializer(serializers.ModelSerializer):
+    run_id = serializers.UUIDField(source="id")
+
+    class Meta:
+        model = SimulationRun
+        fields = [
+            "run_id",
+            "status",
+            "params",
+            "requested_users",
+            "completed_users",
+            "error",
+            "started_at",
+            "finished_at",
+        ]
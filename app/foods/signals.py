@@ -0,0 +1,88 @@
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from foods import pairs, schema, summaries, versioning
+from foods.models import (
+    Conversation,
+    FavoriteFood,
+    FoodCatalog,
+    FoodPair,
+    RunSummary,
+    SimulationRun,
+    UserProfile,
+)
+
+
+# Data versions (ETags, response cache keys, snapshots) move on these signals only.
+# QuerySet.update(), bulk_create() and raw SQL send none: code writing that way
+# calls versioning.bump() for the scope itself, in the same transaction
+# (archive._flush, catalog.classify_many, pairs.rebuild, renormalize_foods)
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+@receiver(post_save, sender=FavoriteFood)
+@receiver(post_delete, sender=FavoriteFood)
+@receiver(post_save, sender=Conversation)
+@receiver(post_delete, sender=Conversation)
+@receiver(post_save, sender=SimulationRun)
+@receiver(post_delete, sender=SimulationRun)
+@receiver(post_save, sender=RunSummary)
+@receiver(post_delete, sender=RunSummary)
+def _bump_users_version(sender, **kwargs):
+    versioning.bump(versioning.SCOPE_USERS)
+
+
+@receiver(post_save, sender=FoodCatalog)
+@receiver(post_delete, sender=FoodCatalog)
+def _bump_catalog_version(sender, **kwargs):
+    versioning.bump(versioning.SCOPE_CATALOG)
+
+
+# Keep food_pair in step with favorites saved or deleted one by one, including
+# the cascades from UserProfile and SimulationRun deletes (admin, shell).
+# QuerySet.update() and bulk_create() send no signals: their callers update
+# the index themselves (simulate_foods, archive) or run pairs.rebuild()
+@receiver(pre_save, sender=FavoriteFood)
+def _favorite_before_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    users = {instance.user_id}
+    if not instance._state.adding:
+        # A favorite moved to another user changes both users' pairs
+        users.update(FavoriteFood.objects.filter(pk=instance.pk).values_list("user_id", flat=True))
+    pairs.before_change(users)
+
+
+@receiver(pre_delete, sender=FavoriteFood)
+def _favorite_before_delete(sender, instance, **kwargs):
+    pairs.before_change([instance.user_id])
+
+
+@receiver(post_save, sender=FavoriteFood)
+@receiver(post_delete, sender=FavoriteFood)
+def _favorite_changed(sender, raw=False, **kwargs):
+    if not raw:
+        pairs.after_change()
+
+
+# Stand-in for migrations: this app has none, syncdb only creates missing tables
+@receiver(post_migrate)
+def _sync_schema(sender, using="default", **kwargs):
+    if sender.label != "foods":
+        return
+    schema.sync(using)
+    # The backfills read and write the default database, and only once syncdb created the tables
+    if using != DEFAULT_DB_ALIAS:
+        return
+    # Runs recorded before the run table existed get a row and a rollup
+    if schema.has_tables([UserProfile, Conversation, SimulationRun, RunSummary], using):
+        created = summaries.backfill_runs()
+        if created:
+            summaries.rebuild(created)
+    # food_pair is created empty on databases that already hold favorites
+    if (
+        schema.has_tables([FoodPair, FavoriteFood, FoodCatalog], using)
+        and not FoodPair.objects.exists()
+        and FavoriteFood.objects.filter(catalog__isnull=False).exists()
+    ):
+        pairs.rebuild()
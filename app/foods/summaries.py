@@ -0,0 +1,263 @@
+from decimal import Decimal
+
+from django.db.models import Count, F, Max, Min, Q, Sum
+from django.utils import timezone
+
+from foods.models import (
+    Conversation,
+    DietLabel,
+    FavoriteFood,
+    RunStatus,
+    RunSummary,
+    SimulationRun,
+    UserProfile,
+)
+
+COUNTER_FIELDS = (
+    "users", *DietLabel.values, "total_tokens", "llm_calls", "catalog_lookups", "catalog_hits",
+)
+
+
+def start_run(run_id):
+    summary, _ = RunSummary.objects.get_or_create(run_id=run_id)
+    return summary
+
+
+# A catalog hit is a favorite matched to a catalog row that existed before its user was
+# created: simulate_foods counts the lookups that found one, rebuild() recovers the same
+# number from created_at (rows the LLM added while classifying that user come later)
+def _catalog_hit():
+    return Q(catalog__isnull=False) & Q(catalog__created_at__lt=F("user__created_at"))
+
+
+# Add one persisted user to its run's rollup (single UPDATE, no read)
+def record_user(run_id, diet, tokens, cost_usd, llm_calls, catalog_lookups, catalog_hits):
+    diet_field = diet if diet in DietLabel.values else DietLabel.UNKNOWN
+    RunSummary.objects.filter(run_id=run_id).update(
+        users=F("users") + 1,
+        **{diet_field: F(diet_field) + 1},
+        total_tokens=F("total_tokens") + int(tokens),
+        estimated_cost_usd=F("estimated_cost_usd") + Decimal(str(round(cost_usd, 6))),
+        llm_calls=F("llm_calls") + int(llm_calls),
+        catalog_lookups=F("catalog_lookups") + int(catalog_lookups),
+        catalog_hits=F("catalog_hits") + int(catalog_hits),
+        updated_at=timezone.now(),
+    )
+
+
+# SimulationRun rows for run_id values written before the run table existed
+# (users and messages point at them, the FK would fail); returns the created ids
+def backfill_runs():
+    known = SimulationRun.objects.values("id")
+    legacy = (
+        UserProfile.objects
+        .exclude(run_id__isnull=True)
+        .exclude(run_id__in=known)
+        .values("run_id")
+        .annotate(n=Count("id"), started=Min("created_at"), finished=Max("created_at"))
+    )
+    created = []
+    for row in legacy:
+        _, was_created = SimulationRun.objects.get_or_create(
+            id=row["run_id"],
+            defaults={
+                "status": RunStatus.COMPLETED,
+                "requested_users": row["n"],
+                "completed_users": row["n"],
+                "started_at": row["started"],
+                "finished_at": row["finished"],
+            },
+        )
+        if was_created:
+            created.append(row["run_id"])
+    # Messages of runs whose users are all gone
+    orphans = (
+        Conversation.objects
+        .exclude(run_id__isnull=True)
+        .exclude(run_id__in=known)
+        .values("run_id")
+        .annotate(started=Min("created_at"))
+    )
+    for row in orphans:
+        _, was_created = SimulationRun.objects.get_or_create(
+            id=row["run_id"],
+            defaults={"status": RunStatus.COMPLETED, "started_at": row["started"], "finished_at": row["started"]},
+        )
+        if was_created:
+            created.append(row["run_id"])
+    return created
+
+
+# Recompute rollups from the base tables (runs created before rollups existed)
+# llm_calls can't be recovered and is kept
+def rebuild(run_ids=None):
+    backfill_runs()
+    users = UserProfile.objects.exclude(run_id__isnull=True)
+    if run_ids:
+        users = users.filter(run_id__in=run_ids)
+
+    diet_counts = {
+        label: Count("id", filter=Q(diet=label)) for label in DietLabel.values
+    }
+    per_run = users.values("run_id").annotate(n=Count("id"), **diet_counts)
+    conv_qs = (
+        Conversation.objects
+        .filter(run_id__in=users.values("run_id"))
+        .values("run_id")
+        .annotate(tokens=Sum("total_tokens"), cost=Sum("estimated_cost_usd"))
+    )
+    tokens = {row["run_id"]: row for row in conv_qs}
+    fav_qs = (
+        FavoriteFood.objects
+        .filter(user__in=users)
+        .values("user__run_id")
+        .annotate(
+            lookups=Count("id"),
+            hits=Count("id", filter=_catalog_hit()),
+        )
+    )
+    favorites = {row["user__run_id"]: row for row in fav_qs}
+
+    rebuilt = 0
+    for row in per_run:
+        run_id = row["run_id"]
+        conv = tokens.get(run_id, {})
+        favs = favorites.get(run_id, {})
+        RunSummary.objects.update_or_create(
+            run_id=run_id,
+            defaults={
+                "users": row["n"],
+                **{label: row[label] for label in DietLabel.values},
+                "total_tokens": conv.get("tokens") or 0,
+                "estimated_cost_usd": conv.get("cost") or 0,
+                "catalog_lookups": favs.get("lookups") or 0,
+                "catalog_hits": favs.get("hits") or 0,
+            },
+        )
+        rebuilt += 1
+    return rebuilt
+
+
+# Users and messages without a run (admin, shell, imports) have no rollup row:
+# unfiltered totals and the diet chart add them with indexed run_id IS NULL reads
+def _runless_queries(users=True, messages=True):
+    queries = []
+    if users:
+        queries.append((
+            UserProfile.objects.filter(run_id__isnull=True),
+            {"users": Count("id"), **{label: Count("id", filter=Q(diet=label)) for label in DietLabel.values}},
+        ))
+    if messages:
+        queries.append((
+            Conversation.objects.filter(run_id__isnull=True),
+            {"total_tokens": Sum("total_tokens"), "estimated_cost_usd": Sum("estimated_cost_usd")},
+        ))
+    return queries
+
+
+def _runless(run_ids=None, **parts):
+    if run_ids:
+        return {}
+    out = {}
+    for qs, aggs in _runless_queries(**parts):
+        out.update(qs.aggregate(**aggs))
+    return out
+
+
+async def _arunless(run_ids=None, **parts):
+    if run_ids:
+        return {}
+    out = {}
+    for qs, aggs in _runless_queries(**parts):
+        out.update(await qs.aaggregate(**aggs))
+    return out
+
+
+def _filtered(run_ids=None):
+    qs = RunSummary.objects.all()
+    if run_ids:
+        qs = qs.filter(run_id__in=run_ids)
+    return qs
+
+
+def as_dict(summary):
+    return {
+        "run_id": str(summary.run_id),
+        "users": summary.users,
+        "diets": summary.diet_histogram(),
+        "total_tokens": summary.total_tokens,
+        "estimated_cost_usd": float(summary.estimated_cost_usd),
+        "llm_calls": summary.llm_calls,
+        "catalog_lookups": summary.catalog_lookups,
+        "catalog_hits": summary.catalog_hits,
+        "catalog_hit_rate": summary.catalog_hit_rate,
+        "created_at": summary.created_at.isoformat(),
+        "updated_at": summary.updated_at.isoformat(),
+    }
+
+
+# Runs plus totals folded in Python, O(runs); totals include the run-less rows
+def _payload(summaries, runless):
+    totals = {field: runless.get(field) or 0 for field in COUNTER_FIELDS}
+    cost = Decimal(runless.get("estimated_cost_usd") or 0)
+    for s in summaries:
+        for field in COUNTER_FIELDS:
+            totals[field] += getattr(s, field)
+        cost += s.estimated_cost_usd
+    lookups = totals.pop("catalog_lookups")
+    hits = totals.pop("catalog_hits")
+    return {
+        "runs": [as_dict(s) for s in summaries],
+        "totals": {
+            "runs": len(summaries),
+            "users": totals.pop("users"),
+            "diets": {label: totals.pop(label) for label in DietLabel.values},
+            **totals,
+            "estimated_cost_usd": float(cost),
+            "catalog_lookups": lookups,
+            "catalog_hits": hits,
+            "catalog_hit_rate": round(hits / lookups, 4) if lookups else None,
+        },
+    }
+
+
+def stats(run_ids=None):
+    return _payload(list(_filtered(run_ids).order_by("-created_at")), _runless(run_ids))
+
+
+async def astats(run_ids=None):
+    return _payload([s async for s in _filtered(run_ids).order_by("-created_at")], await _arunless(run_ids))
+
+
+def totals(run_ids=None):
+    agg = _filtered(run_ids).aggregate(
+        total_tokens=Sum("total_tokens"),
+        total_cost=Sum("estimated_cost_usd"),
+    )
+    runless = _runless(run_ids, users=False)
+    return {
+        "total_tokens": (agg["total_tokens"] or 0) + (runless.get("total_tokens") or 0),
+        "total_cost": round(float(agg["total_cost"] or 0) + float(runless.get("estimated_cost_usd") or 0), 4),
+    }
+
+
+def _diet_aggregates():
+    return {label: Sum(label) for label in DietLabel.values}
+
+
+# Diet histogram for the chart as [{"diet", "c"}] sorted by count, zeros dropped
+def _diet_rows(agg, runless, diets=None):
+    rows = [
+        {"diet": label, "c": (agg[label] or 0) + (runless.get(label) or 0)}
+        for label in DietLabel.values
+        if not diets or label in diets
+    ]
+    return sorted((r for r in rows if r["c"]), key=lambda r: -r["c"])
+
+
+def diet_counts(run_ids=None, diets=None):
+    return _diet_rows(_filtered(run_ids).aggregate(**_diet_aggregates()), _runless(run_ids, messages=False), diets)
+
+
+async def adiet_counts(run_ids=None, diets=None):
+    return _diet_rows(await _filtered(run_ids).aaggregate(**_diet_aggregates()), await _arunless(run_ids, messages=False), diets)
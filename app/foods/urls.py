@@ -1,23 +1,60 @@
+from django.conf import settings
 from django.urls import path
+
 from .views import (
     dashboard,
     simulate,
     diets_png,
+    diets_svg,
     veg_users_view,
+    stats_view,
+    food_stats_view,
+    runs_view,
+    catalog_search_view,
+    classify_view,
+    related_foods_view,
+    veg_users_export_view,
+    users_export_view,
     run_simulation,
+    cache_stats,
+    metrics_view,
+    profiles_view,
+    profile_download,
 )
 
+# Under ASGI the read endpoints are served by their async variants
+# Imported only then, WSGI workers never load the async module
+if settings.EFB_ASYNC_READS:
+    from . import async_views
+
+    veg_users_view = async_views.veg_users_view
+    stats_view = async_views.stats_view
+    diets_png = async_views.diets_png
+    diets_svg = async_views.diets_svg
 
 api_urlpatterns = [
     path("veg-users/", veg_users_view, name="veg-users"),
+    path("veg-users/export", veg_users_export_view, name="veg-users-export"),
+    path("stats/", stats_view, name="stats"),
+    path("stats/foods", food_stats_view, name="food-stats"),
+    path("runs/", runs_view, name="runs"),
+    path("users/export", users_export_view, name="users-export"),
+    path("catalog/search", catalog_search_view, name="catalog-search"),
+    path("classify/", classify_view, name="classify"),
+    path("foods/<str:name>/related", related_foods_view, name="related-foods"),
 ]
 
 ui_urlpatterns = [
     path("", dashboard, name="dashboard"),
     path("simulate", simulate, name="simulate"),
     path("diets.png", diets_png, name="diets-png"),
+    path("diets.svg", diets_svg, name="diets-svg"),
 ]
 
 ops_urlpatterns = [
     path("run-sim/", run_simulation, name="run-sim"),
+    path("cache-stats/", cache_stats, name="cache-stats"),
+    path("metrics", metrics_view, name="metrics"),
+    path("profiles/", profiles_view, name="profiles"),
+    path("profiles/<str:profile_id>", profile_download, name="profile-download"),
 ]
@@ -0,0 +1,112 @@
+import threading
+from functools import wraps
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.views.decorators.http import condition
+
+from foods.models import DataVersion
+
+SCOPE_USERS = "users"
+SCOPE_CATALOG = "catalog"
+ALL_SCOPES = (SCOPE_USERS, SCOPE_CATALOG)
+
+
+# Scopes written by the current transaction of this thread's connection
+_pending = threading.local()
+
+
+def _pending_scopes():
+    scopes = getattr(_pending, "scopes", None)
+    if scopes is None:
+        scopes = _pending.scopes = set()
+    return scopes
+
+
+# Deferred bump: the first callback of a commit bumps, the later ones for the same scope no-op
+# Scopes left behind by a rollback are harmless, every bump() queues its own callback
+class _Bump:
+    def __init__(self, scope):
+        self.scope = scope
+
+    def __call__(self):
+        scopes = _pending_scopes()
+        if self.scope not in scopes:
+            return
+        scopes.discard(self.scope)
+        updated = (
+            DataVersion.objects
+            .filter(scope=self.scope)
+            .update(version=F("version") + 1, updated_at=timezone.now())
+        )
+        if not updated:
+            DataVersion.objects.get_or_create(scope=self.scope, defaults={"version": 1})
+
+
+# Schedule a version bump once the current transaction commits
+# Repeated writes inside one transaction collapse into a single UPDATE
+def bump(scope):
+    _pending_scopes().add(scope)
+    transaction.on_commit(_Bump(scope))
+
+
+def _versions_qs(scopes):
+    return DataVersion.objects.filter(scope__in=scopes).values_list("scope", "version", "updated_at")
+
+
+def _stamp(rows, scopes):
+    versions = {scope: (version, updated_at) for scope, version, updated_at in rows}
+    token = "-".join(f"{scope[0]}{versions.get(scope, (0, None))[0]}" for scope in scopes)
+    stamps = [updated_at for _, updated_at in versions.values()]
+    return token, (max(stamps) if stamps else None)
+
+
+# Returns (token, last_modified) for the given scopes in a single query
+def current(scopes=ALL_SCOPES):
+    return _stamp(list(_versions_qs(scopes)), scopes)
+
+
+async def acurrent(scopes=ALL_SCOPES):
+    return _stamp([row async for row in _versions_qs(scopes)], scopes)
+
+
+# Memoize on the request so ETag, Last-Modified and cache keys share one lookup
+def for_request(request, scopes=ALL_SCOPES):
+    cached = getattr(request, "_efb_data_version", None)
+    if cached is None:
+        cached = current(scopes)
+        request._efb_data_version = cached
+    return cached
+
+
+async def afor_request(request, scopes=ALL_SCOPES):
+    cached = getattr(request, "_efb_data_version", None)
+    if cached is None:
+        cached = await acurrent(scopes)
+        request._efb_data_version = cached
+    return cached
+
+
+# View decorator: ETag/Last-Modified from the data version, 304 before the view body runs
+def conditional_on_data(scopes=ALL_SCOPES):
+    return condition(
+        etag_func=lambda request, *args, **kwargs: for_request(request, scopes)[0],
+        last_modified_func=lambda request, *args, **kwargs: for_request(request, scopes)[1],
+    )
+
+
+# Async variant: load the version with the async ORM first, so Django's
+# condition() only reads the memoized value and never blocks the event loop
+def aconditional_on_data(scopes=ALL_SCOPES):
+    def decorator(view):
+        conditional_view = conditional_on_data(scopes)(view)
+
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            await afor_request(request, scopes)
+            return await conditional_view(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
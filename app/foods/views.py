@@ -1,156 +1,222 @@
 from __future__ import annotations
 
-import io
+import csv
+import json
 import os
+import uuid
 
 from django.core.management import call_command
-from django.db.models import Count, Prefetch, Sum
-from django.http import HttpResponse, JsonResponse
+from django.core.paginator import Paginator
+from django.db.models import OuterRef, Prefetch, Subquery
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import redirect, render
 
-from rest_framework.authentication import BasicAuthentication, TokenAuthentication
 from rest_framework.decorators import (
     api_view,
     authentication_classes,
     permission_classes,
+    throttle_classes,
 )
 from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
-
-import matplotlib
-matplotlib.use("Agg")
-import matplotlib.pyplot as plt
-
-from .models import Conversation, DietLabel, FavoriteFood, UserProfile
-from .serializers import VegUserSerializer
+from rest_framework.throttling import UserRateThrottle
+
+from common import metrics, profiling
+from common.authentication import CachedBasicAuthentication, CachedTokenAuthentication
+
+from .models import (
+    Conversation,
+    DietLabel,
+    FavoriteFood,
+    FoodCatalog,
+    MessageRole,
+    SimulationRun,
+    UserProfile,
+)
+from . import catalog, charts, pairs, response_cache, summaries, versioning
+from .serializers import SimulationRunSerializer, VegUserSerializer
+from .versioning import conditional_on_data
+
+# Rows fetched per round-trip when streaming exports
+EXPORT_CHUNK_SIZE = int(os.getenv("EFB_EXPORT_CHUNK_SIZE", "2000"))
+EXPORT_FORMATS = {"ndjson", "csv"}
+DASHBOARD_PAGE_SIZE = int(os.getenv("EFB_DASHBOARD_PAGE_SIZE", "50"))
+# Dashboard chart: "svg" renders without matplotlib, "png" uses it
+CHART_FORMAT = os.getenv("EFB_CHART_FORMAT", "svg")
+VEG_DIETS = [DietLabel.VEGAN, DietLabel.VEGETARIAN]
+
+
+# Apply the shared run_id/diet query filters to a UserProfile queryset
+def _filter_users(qs, params):
+    run_ids = params.getlist("run_id")
+    diets = params.getlist("diet")
+    if run_ids:
+        qs = qs.filter(run_id__in=run_ids)
+    if diets:
+        qs = qs.filter(diet__in=diets)
+    return qs
 
 
 def dashboard(request):
-    run_ids = request.GET.getlist("run_id")
-    diets   = request.GET.getlist("diet")
+    version, _ = versioning.for_request(request)
+    context = response_cache.get_or_set(
+        "dashboard", request.GET, version, lambda: _dashboard_context(request.GET)
+    )
 
+    # Filters to carry over in the pager links
+    filter_params = request.GET.copy()
+    filter_params.pop("page", None)
+    context = {
+        **context,
+        "selected_run_ids": request.GET.getlist("run_id"),
+        "selected_diets": request.GET.getlist("diet"),
+        "filter_query": filter_params.urlencode(),
+        "chart_format": "png" if CHART_FORMAT == "png" else "svg",
+    }
+    return render(request, "foods/dashboard.html", context)
+
+# Everything the dashboard shows that depends on data, not on the request
+# Fixed number of queries per page, whatever the number of users
+def _dashboard_context(params):
     # Queryset for users
-    qs_users = UserProfile.objects.all()
-    if "run_id" in request.GET and run_ids:
-        qs_users = qs_users.filter(run_id__in=run_ids)
-    if "diet" in request.GET and diets:
-        qs_users = qs_users.filter(diet__in=diets)
-
-    # Totals
-    agg = Conversation.objects.aggregate(
-        total_tokens=Sum("total_tokens"),
-        total_cost=Sum("estimated_cost_usd"),
+    qs_users = _filter_users(UserProfile.objects.all(), params)
+
+    # Totals from the per-run rollups
+    totals = summaries.totals()
+
+    # Options for dropdowns, newest runs first (indexed run table, not a user scan)
+    run_ids_all_qs = (
+        SimulationRun.objects
+        .filter(summary__users__gt=0)
+        .order_by("-started_at")
+        .values_list("id", flat=True)
     )
-    totals = {
-        "total_tokens": agg["total_tokens"] or 0,
-        "total_cost": round(float(agg["total_cost"] or 0), 4),
-    }
+    options_run_ids = [str(x) for x in run_ids_all_qs]
 
-    # Options for dropdowns
-    run_ids_all_qs = UserProfile.objects.exclude(run_id__isnull=True).values_list("run_id", flat=True)
-    options_run_ids = sorted(set(str(x) for x in run_ids_all_qs), reverse=True)
+    options_diets = sorted(c["diet"] for c in summaries.diet_counts())
 
-    diets_all_qs = UserProfile.objects.values_list("diet", flat=True)
-    options_diets = sorted(set(diets_all_qs))
+    # Table: latest conversation's tokens/cost as subqueries, favorites in one ordered prefetch
+    latest_conv = (
+        Conversation.objects
+        .filter(user=OuterRef("pk"))
+        .order_by("-created_at", "-pk")
+    )
+    table_qs = (
+        qs_users
+        .annotate(
+            tokens=Subquery(latest_conv.values("total_tokens")[:1]),
+            cost=Subquery(latest_conv.values("estimated_cost_usd")[:1]),
+        )
+        .prefetch_related(Prefetch("foods", queryset=FavoriteFood.objects.order_by("rank")))
+        .order_by("-created_at", "pk")
+    )
+    page = Paginator(table_qs, DASHBOARD_PAGE_SIZE).get_page(params.get("page"))
 
-    # Table
     rows = []
-    for u in qs_users.prefetch_related("foods").order_by("-created_at"):
-        foods = [f.food_name for f in u.foods.all().order_by("rank")]
-        conv = Conversation.objects.filter(user=u).order_by("-created_at").first()
+    for u in page.object_list:
         rows.append({
             "run_id": u.run_id,
             "user_id": u.id,
             "diet": u.diet,
-            "foods": foods,
-            "tokens": getattr(conv, "total_tokens", None),
-            "cost": getattr(conv, "estimated_cost_usd", None),
+            "foods": [f.food_name for f in u.foods.all()],
+            "tokens": u.tokens,
+            "cost": u.cost,
         })
 
-    # Seen foods
+    # Seen foods: distinct catalog entries, plus names that never got a catalog match
     seen = []
-    seen_keys = set()
-
-    fav_qs = (
-        FavoriteFood.objects
-        .filter(user__in=qs_users)
-        .select_related("catalog")
-        .order_by("catalog__food_name", "food_name")
+    catalog_qs = (
+        FoodCatalog.objects
+        .filter(favoritefood__user__in=qs_users)
+        .distinct()
+        .values("food_name", "diet", "source", "confidence")
     )
-
-    for f in fav_qs:
-        cat = f.catalog
-        key = (cat.id if cat else f.food_name.lower())
-        if key in seen_keys:
-            continue
-        seen_keys.add(key)
-
-        name = getattr(cat, "food_name", f.food_name)
-        diet = getattr(cat, "diet", "unknown")
-        source = getattr(cat, "source", None)
-        confidence = getattr(cat, "confidence", None)
-
-        if source == "seed":
+    for cat in catalog_qs:
+        if cat["source"] == "seed":
             confidence_display = "Seed"
+        elif cat["confidence"] is not None:
+            confidence_display = f"{cat['confidence']:.2f}"
         else:
-            confidence_display = f"{confidence:.2f}" if (confidence is not None) else "—"
-
+            confidence_display = "—"
         seen.append({
-            "food_name": name,
-            "diet": diet,
+            "food_name": cat["food_name"],
+            "diet": cat["diet"],
             "confidence_display": confidence_display,
         })
 
+    uncatalogued = (
+        FavoriteFood.objects
+        .filter(user__in=qs_users, catalog__isnull=True)
+        .values_list("food_name", flat=True)
+        .distinct()
+    )
+    for name in uncatalogued:
+        seen.append({"food_name": name, "diet": "unknown", "confidence_display": "—"})
+    seen.sort(key=lambda item: item["food_name"])
 
-    context = {
+    return {
         "rows": rows,
+        "page": {
+            "number": page.number,
+            "num_pages": page.paginator.num_pages,
+            "count": page.paginator.count,
+            "has_previous": page.has_previous(),
+            "has_next": page.has_next(),
+            "previous": page.number - 1,
+            "next": page.number + 1,
+        },
         "totals": totals,
-        "selected_run_ids": run_ids,
-        "selected_diets": diets,
         "options_run_ids": options_run_ids,
         "options_diets": options_diets,
         "seen_foods": seen,
     }
-    return render(request, "foods/dashboard.html", context)
 
 def simulate(request):
     count = int(request.GET.get("count", "10"))
     call_command("simulate_foods", runs=count)
     return redirect("/ui/")
 
+@conditional_on_data()
 def diets_png(request):
-    run_ids = request.GET.getlist("run_id")
-    diets   = request.GET.getlist("diet")
-
-    qs = UserProfile.objects.all()
-    if "run_id" in request.GET and run_ids:
-        qs = qs.filter(run_id__in=run_ids)
-    if "diet" in request.GET and diets:
-        qs = qs.filter(diet__in=diets)
+    version, _ = versioning.for_request(request)
+    png = response_cache.get_or_set(
+        "diets_png", request.GET, version, lambda: _render_diets_png(request.GET)
+    )
+    return HttpResponse(png, content_type="image/png")
 
-    counts = qs.values("diet").annotate(c=Count("id")).order_by("-c")
-    labels = [c["diet"] for c in counts] or ["no data"]
-    values = [c["c"] for c in counts] or [1]
+def _render_diets_png(params):
+    counts = summaries.diet_counts(params.getlist("run_id"), params.getlist("diet"))
+    return charts.pie_png(counts)
 
-    # Pie chart
-    fig, ax = plt.subplots(figsize=(4.2, 4.2))
-    ax.pie(values, labels=labels, autopct="%1.1f%%", startangle=90)
-    ax.axis("equal")
+@conditional_on_data()
+def diets_svg(request):
+    version, _ = versioning.for_request(request)
+    svg = response_cache.get_or_set(
+        "diets_svg", request.GET, version, lambda: _render_diets_svg(request.GET)
+    )
+    return HttpResponse(svg, content_type="image/svg+xml")
 
-    buf = io.BytesIO()
-    plt.savefig(buf, format="png", bbox_inches="tight")
-    plt.close(fig)
-    return HttpResponse(buf.getvalue(), content_type="image/png")
+def _render_diets_svg(params):
+    counts = summaries.diet_counts(params.getlist("run_id"), params.getlist("diet"))
+    return charts.pie_svg(counts)
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@conditional_on_data()
 def veg_users_view(request):
+    version, _ = versioning.for_request(request)
+    data = response_cache.get_or_set(
+        "veg_users", request.query_params, version, _veg_users_data
+    )
+    return Response(data)
+
+def _veg_users_data():
     # One-to-one query with JOIN to pull 'catalog' relation (each food has it's catalog info)
     fav_qs = FavoriteFood.objects.select_related("catalog").order_by("pk")
 
     qs = (
         UserProfile.objects
-        .filter(diet__in=[DietLabel.VEGAN, DietLabel.VEGETARIAN])
+        .filter(diet__in=VEG_DIETS)
         # Many-to-many (customers have multiple food favorites)
         .prefetch_related(Prefetch("foods", queryset=fav_qs))
     )
@@ -165,14 +231,216 @@ def veg_users_view(request):
             "diet": user.diet,
             "top3": top3,
         })
+    return _validate_veg_users(data)
 
+def _validate_veg_users(data):
     ser = VegUserSerializer(data=data, many=True)
     ser.is_valid(raise_exception=True)
-    return Response(ser.data)
+    return list(ser.data)
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+@conditional_on_data()
+def stats_view(request):
+    # Per-run rollups plus totals, optionally restricted with ?run_id=
+    return Response(summaries.stats(request.query_params.getlist("run_id")))
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+@conditional_on_data()
+def food_stats_view(request):
+    # NumPy is only imported on the first analytics request
+    from . import analytics
+
+    try:
+        top = max(1, min(int(request.query_params.get("top", analytics.TOP_N)), 100))
+    except ValueError:
+        return JsonResponse({"error": "top must be an integer"}, status=400)
+    version, _ = versioning.for_request(request)
+    return Response(response_cache.get_or_set(
+        "food_stats", request.query_params, version, lambda: analytics.report(top)
+    ))
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+@conditional_on_data()
+def runs_view(request):
+    # Newest first, optionally filtered with ?status=
+    qs = SimulationRun.objects.order_by("-started_at")
+    statuses = request.query_params.getlist("status")
+    if statuses:
+        qs = qs.filter(status__in=statuses)
+    return Response(SimulationRunSerializer(qs, many=True).data)
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def catalog_search_view(request):
+    # Prefix search over the in-memory catalog index, ?q= is normalized like stored names
+    query = request.query_params.get("q") or ""
+    if not query.strip():
+        return JsonResponse({"error": "q is required"}, status=400)
+    try:
+        limit = int(request.query_params.get("limit", catalog.SEARCH_LIMIT))
+    except ValueError:
+        return JsonResponse({"error": "limit must be an integer"}, status=400)
+    limit = max(1, min(limit, catalog.SEARCH_MAX_LIMIT))
+    return Response({"results": catalog.search(query, limit)})
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+@conditional_on_data()
+def related_foods_view(request, name):
+    # Foods most often co-favorited with <name>, from the FoodPair index, optionally ?diet= suitable only
+    diet = request.query_params.get("diet") or None
+    if diet is not None and diet not in pairs.SUITABLE_DIETS:
+        return JsonResponse({"error": f"diet must be one of {sorted(pairs.SUITABLE_DIETS)}"}, status=400)
+    try:
+        limit = int(request.query_params.get("limit", pairs.RELATED_LIMIT))
+    except ValueError:
+        return JsonResponse({"error": "limit must be an integer"}, status=400)
+    limit = max(1, min(limit, pairs.RELATED_MAX_LIMIT))
+
+    data = pairs.related_foods(name, diet=diet, limit=limit)
+    if data is None:
+        raise Http404("food not in catalog")
+    return Response(data)
+
+
+class ClassifyThrottle(UserRateThrottle):
+    scope = "classify"
+
+
+# Billed LLM calls and new catalog rows: staff, or users allowed to add catalog rows
+def _may_expand_catalog(user):
+    return user.is_staff or user.has_perm("foods.add_foodcatalog")
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+@throttle_classes([ClassifyThrottle])
+def classify_view(request):
+    # Diet labels for up to CLASSIFY_MAX_FOODS names, catalog first, misses in one LLM request
+    if not isinstance(request.data, dict):
+        return JsonResponse({"error": "body must be a JSON object"}, status=400)
+    foods = request.data.get("foods")
+    if not isinstance(foods, list) or not 1 <= len(foods) <= catalog.CLASSIFY_MAX_FOODS:
+        return JsonResponse(
+            {"error": f"foods must be a list of 1 to {catalog.CLASSIFY_MAX_FOODS} names"}, status=400
+        )
+    max_len = FoodCatalog._meta.get_field("food_name").max_length
+    if not all(isinstance(f, str) and f.strip() and len(f) <= max_len for f in foods):
+        return JsonResponse({"error": f"each food must be a non-empty string of at most {max_len} chars"}, status=400)
+
+    # Callers can lower the per-request LLM budget, never raise it
+    try:
+        llm_limit = min(int(request.data.get("llm_budget", catalog.CLASSIFY_LLM_LIMIT)), catalog.CLASSIFY_LLM_LIMIT)
+    except (TypeError, ValueError):
+        return JsonResponse({"error": "llm_budget must be an integer"}, status=400)
+    # Other callers get catalog lookups only, their misses stay unknown
+    if not _may_expand_catalog(request.user):
+        llm_limit = 0
+    return Response(catalog.classify_many(foods, llm_limit=llm_limit))
+
+
+# Pseudo-buffer so csv.writer returns each line instead of buffering it
+class _Echo:
+    def write(self, value):
+        return value
+
+
+# Yield one plain dict per user, reading users in server-side chunks
+# with_prompts adds the user's rendered A prompt (templates joined, one extra query per chunk)
+def _export_rows(qs, with_prompts=False):
+    fav_qs = FavoriteFood.objects.only("user", "rank", "food_name").order_by("rank")
+    qs = (
+        qs.only("id", "run_id", "diet")
+        .order_by("pk")
+        .prefetch_related(Prefetch("foods", queryset=fav_qs))
+    )
+    if with_prompts:
+        msg_qs = (
+            Conversation.objects
+            .filter(role=MessageRole.A)
+            .select_related("prompt_template")
+            .only("user", "prompt", "prompt_params", "prompt_template__template")
+            .order_by("pk")
+        )
+        qs = qs.prefetch_related(Prefetch("messages", queryset=msg_qs))
+    for user in qs.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        row = {
+            "user_id": str(user.pk),
+            "run_id": str(user.run_id) if user.run_id else None,
+            "diet": user.diet,
+            "top3": [f.food_name for f in user.foods.all()],
+        }
+        if with_prompts:
+            messages = user.messages.all()
+            row["prompt"] = messages[0].prompt_text if messages else None
+        yield row
+
+
+def _stream_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row) + "\n"
+
+
+def _stream_csv(rows, with_prompts=False):
+    writer = csv.writer(_Echo())
+    header = ["user_id", "run_id", "diet", "food_1", "food_2", "food_3"]
+    yield writer.writerow(header + ["prompt"] if with_prompts else header)
+    for row in rows:
+        foods = (row["top3"] + ["", "", ""])[:3]
+        line = [row["user_id"], row["run_id"] or "", row["diet"], *foods]
+        if with_prompts:
+            line.append(row["prompt"] or "")
+        yield writer.writerow(line)
+
+
+# Stream users matching the request filters as NDJSON (default) or CSV
+def _export_response(request, qs, filename):
+    fmt = (request.query_params.get("fmt") or "ndjson").lower()
+    if fmt not in EXPORT_FORMATS:
+        return JsonResponse({"error": f"fmt must be one of {sorted(EXPORT_FORMATS)}"}, status=400)
+
+    # Validate here, a bad UUID would otherwise fail mid-stream
+    try:
+        for rid in request.query_params.getlist("run_id"):
+            uuid.UUID(rid)
+    except ValueError:
+        return JsonResponse({"error": "run_id must be a UUID"}, status=400)
+
+    with_prompts = request.query_params.get("prompts") == "1"
+    rows = _export_rows(_filter_users(qs, request.query_params), with_prompts)
+    if fmt == "csv":
+        response = StreamingHttpResponse(_stream_csv(rows, with_prompts), content_type="text/csv")
+    else:
+        response = StreamingHttpResponse(_stream_ndjson(rows), content_type="application/x-ndjson")
+    response["Content-Disposition"] = f'attachment; filename="{filename}.{fmt}"'
+    return response
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+@conditional_on_data()
+def veg_users_export_view(request):
+    qs = UserProfile.objects.filter(diet__in=VEG_DIETS)
+    return _export_response(request, qs, "veg-users")
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+@conditional_on_data()
+def users_export_view(request):
+    return _export_response(request, UserProfile.objects.all(), "users")
 
 
 @api_view(["POST"])
-@authentication_classes([TokenAuthentication, BasicAuthentication])
+@authentication_classes([CachedTokenAuthentication, CachedBasicAuthentication])
 @permission_classes([IsAdminUser])
 def run_simulation(request):
     # Trigger the simulate_foods management command
@@ -199,3 +467,41 @@ def run_simulation(request):
                 os.environ.pop("EFB_LLM_CALL_BUDGET", None)
             else:
                 os.environ["EFB_LLM_CALL_BUDGET"] = old_budget
+
+
+@api_view(["GET"])
+@authentication_classes([CachedTokenAuthentication, CachedBasicAuthentication])
+@permission_classes([IsAdminUser])
+def cache_stats(request):
+    # Hit/miss counters of this worker process only; totals over all workers
+    # are efb_response_cache_requests_total on /metrics
+    return JsonResponse({"scope": "worker", "pid": os.getpid(), "caches": response_cache.stats()})
+
+
+@api_view(["GET"])
+@authentication_classes([CachedTokenAuthentication, CachedBasicAuthentication])
+@permission_classes([IsAdminUser])
+def metrics_view(request):
+    # Prometheus scrape target, all workers when EFB_METRICS_DIR is shared
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@api_view(["GET"])
+@authentication_classes([CachedTokenAuthentication, CachedBasicAuthentication])
+@permission_classes([IsAdminUser])
+def profiles_view(request):
+    # Stored request profiles of this host, newest first
+    return JsonResponse({"profiles": profiling.list_profiles()})
+
+
+@api_view(["GET"])
+@authentication_classes([CachedTokenAuthentication, CachedBasicAuthentication])
+@permission_classes([IsAdminUser])
+def profile_download(request, profile_id):
+    # The pstats file, or ?fmt=txt for the top functions by cumulative time
+    path = profiling.profile_path(profile_id)
+    if path is None:
+        raise Http404("Unknown profile")
+    if request.query_params.get("fmt") == "txt":
+        return HttpResponse(profiling.summary(path), content_type="text/plain; charset=utf-8")
+    return FileResponse(open(path, "rb"), as_attachment=True, filename=path.name)
@@ -0,0 +1,74 @@
+"""
+Favorites analytics: the NumPy engine (foods.analytics) against the same
+popularity and co-occurrence counts done by iterating FavoriteFood rows in
+Python. Load (DB to arrays) and compute are timed separately.
+
+Usage (from the repo root):
+    python benchmarks/analytics.py --users 100000
+"""
+import argparse
+import itertools
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.common import seed, setup_django
+
+
+def _python_counts():
+    from foods.models import FavoriteFood
+
+    popularity = Counter()
+    pairs = Counter()
+    rows = (
+        FavoriteFood.objects
+        .filter(catalog__isnull=False)
+        .select_related("catalog")
+        .order_by("user_id", "catalog_id")
+        .iterator(chunk_size=10000)
+    )
+    for _, favs in itertools.groupby(rows, key=lambda f: f.user_id):
+        names = sorted({f.catalog.food_name for f in favs})
+        popularity.update(names)
+        pairs.update(itertools.combinations(names, 2))
+    return popularity, pairs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        setup_django(Path(tmp) / "bench.sqlite3")
+        seed(args.users)
+
+        from foods import analytics
+
+        start = time.perf_counter()
+        popularity, pairs = _python_counts()
+        python_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        data = analytics.Dataset.load()
+        load_s = time.perf_counter() - start
+        start = time.perf_counter()
+        counts = data.popularity()
+        _, _, pair_counts = data.cooccurrence()
+        analytics.bucket_mix(data)
+        analytics.confidence_histograms(data)
+        compute_s = time.perf_counter() - start
+
+        assert len(pair_counts) == len(pairs) and int(counts.sum()) == sum(popularity.values())
+        print(f"users={args.users} favorites={len(data.items)} pairs={len(pair_counts)}")
+        print(f"{'python loop':<24}{python_s * 1000:>10.0f} ms")
+        print(f"{'numpy load':<24}{load_s * 1000:>10.0f} ms")
+        print(f"{'numpy compute':<24}{compute_s * 1000:>10.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Concurrent-request throughput of the WSGI setup (sync gunicorn workers)
+against the ASGI setup (uvicorn workers + async read endpoints).
+
+Usage (from the repo root):
+    python benchmarks/asgi_vs_wsgi.py --users 2000 --requests 600 --concurrency 32
+"""
+import argparse
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.common import (
+    bench_env,
+    create_api_user,
+    free_port,
+    seed,
+    setup_django,
+    start_server,
+    stop_server,
+)
+from benchmarks.loadtest import auth_header, parse_paths, run
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=600)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--paths", default="/api/veg-users/,/ui/diets.png",
+                        help='Comma-separated paths, optionally weighted ("path@weight")')
+    parser.add_argument("--auth", choices=["basic", "token"], default="basic")
+    parser.add_argument("--cache", action="store_true",
+                        help="Keep the response cache on (default off, so every request queries)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "bench.sqlite3"
+        extra = {} if args.cache else {"EFB_CACHE_TIMEOUT": 0}
+        setup_django(db_path, **extra)
+        seed(args.users)
+        username, password, token = create_api_user()
+        authorization = auth_header(args.auth, username, password, token)
+        targets = parse_paths(args.paths)
+        paths = [path for _, path, _ in targets]
+
+        print(f"users={args.users} requests={args.requests} concurrency={args.concurrency} "
+              f"workers={args.workers} paths={paths}")
+        print(f"{'mode':<6}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+        for mode in ("wsgi", "asgi"):
+            port = free_port()
+            proc = start_server(mode, bench_env(db_path, **extra), port, workers=args.workers)
+            try:
+                base_url = f"http://127.0.0.1:{port}"
+                # Warm-up so worker boot and first-request imports are not measured
+                run(base_url, targets, concurrency=args.workers, requests=args.workers * 4,
+                    authorization=authorization)
+                r = run(base_url, targets, concurrency=args.concurrency, requests=args.requests,
+                        authorization=authorization)["overall"]
+            finally:
+                stop_server(proc)
+            errors = r["requests"] - r["statuses"].get("200", 0)
+            print(f"{mode:<6}{r['rps']:>10.1f}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['p99_ms']:>10.1f}{errors:>8}")
+
+
+if __name__ == "__main__":
+    main()
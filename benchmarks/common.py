@@ -0,0 +1,175 @@
+"""
+Shared helpers for the offline benchmarks: Django bootstrap on a throwaway
+SQLite file, synthetic data, and local server processes.
+"""
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+import uuid
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+APP_DIR = REPO_ROOT / "app"
+
+API_USERNAME = "bench"
+API_PASSWORD = "bench-pass"
+
+FOODS = [
+    ("banana", "vegan"), ("hummus", "vegan"), ("falafel", "vegan"), ("lentil soup", "vegan"),
+    ("caprese salad", "vegetarian"), ("shakshuka", "vegetarian"), ("paneer tikka", "vegetarian"),
+    ("pierogi", "vegetarian"), ("jollof rice with chicken", "omnivore"), ("pho bo", "omnivore"),
+    ("beef rendang", "omnivore"), ("ceviche", "omnivore"),
+]
+
+
+# Environment shared by the in-process Django setup and spawned servers
+def bench_env(db_path, **extra):
+    env = dict(os.environ)
+    env.update({
+        "DJANGO_SETTINGS_MODULE": "config.settings.dev",
+        "DATABASE_URL": f"sqlite:///{db_path}",
+        "EFB_DRY_RUN": "1",
+        "LOG_LEVEL": "WARNING",
+        "PYTHONPATH": os.pathsep.join(filter(None, [str(APP_DIR), env.get("PYTHONPATH")])),
+    })
+    env.update({k: str(v) for k, v in extra.items()})
+    return env
+
+
+# Configure Django in this process against db_path and create the schema
+def setup_django(db_path, **extra):
+    os.environ.update(bench_env(db_path, **extra))
+    if str(APP_DIR) not in sys.path:
+        sys.path.insert(0, str(APP_DIR))
+
+    import django
+    from django.core.management import call_command
+
+    django.setup()
+    call_command("migrate", run_syncdb=True, verbosity=0)
+
+
+# Staff user with a token, returns (username, password, token_key)
+def create_api_user():
+    from django.contrib.auth import get_user_model
+    from rest_framework.authtoken.models import Token
+
+    User = get_user_model()
+    user = User.objects.filter(username=API_USERNAME).first()
+    if user is None:
+        user = User.objects.create_superuser(API_USERNAME, "bench@example.com", API_PASSWORD)
+    token, _ = Token.objects.get_or_create(user=user)
+    return API_USERNAME, API_PASSWORD, token.key
+
+
+# Synthetic users with three favorites and A/B conversations each
+def seed(users, runs=10, batch_size=5000, rng_seed=7):
+    from foods import pairs, prompts, summaries
+    from foods.diet import derive_user_diet
+    from foods.models import (
+        Conversation,
+        FavoriteFood,
+        FoodCatalog,
+        MessageRole,
+        RunStatus,
+        SimulationRun,
+        UserProfile,
+    )
+
+    rng = random.Random(rng_seed)
+    catalog = {}
+    for name, diet in FOODS:
+        obj, _ = FoodCatalog.objects.get_or_create(food_name=name, defaults={"diet": diet})
+        catalog[name] = obj
+    run_ids = [
+        SimulationRun.objects.create(status=RunStatus.COMPLETED, requested_users=users).id
+        for _ in range(max(1, runs))
+    ]
+
+    created = 0
+    while created < users:
+        n = min(batch_size, users - created)
+        profiles, favorites, messages = [], [], []
+        for i in range(n):
+            picks = rng.sample(FOODS, 3)
+            run_id = run_ids[(created + i) % len(run_ids)]
+            profile = UserProfile(
+                id=uuid.uuid4(),
+                diet=derive_user_diet([diet for _, diet in picks]),
+                run_id=run_id,
+            )
+            profiles.append(profile)
+            for rank, (name, _) in enumerate(picks, start=1):
+                favorites.append(FavoriteFood(
+                    user=profile, rank=rank, name_raw=name, food_name=name, catalog=catalog[name],
+                ))
+            # Stored like simulate_foods does: shared template plus the seed
+            prompt = prompts.compact(f"Give your top-3 favorite foods.\n(seed:{run_id}-{created + i})")
+            messages.append(Conversation(
+                user=profile, role=MessageRole.A, **prompt, model="bench",
+                prompt_tokens=40, completion_tokens=12, total_tokens=52,
+                estimated_cost_usd=0.0001, run_id=run_id,
+            ))
+            messages.append(Conversation(
+                user=profile, role=MessageRole.B, **prompt, model="bench",
+                response=", ".join(name for name, _ in picks),
+                prompt_tokens=0, completion_tokens=0, total_tokens=0,
+                estimated_cost_usd=0, run_id=run_id,
+            ))
+        UserProfile.objects.bulk_create(profiles)
+        FavoriteFood.objects.bulk_create(favorites)
+        Conversation.objects.bulk_create(messages)
+        created += n
+    # bulk_create skips the per-user rollup updates, rebuild them once
+    summaries.rebuild(run_ids)
+    pairs.rebuild()
+    return run_ids
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# Start a gunicorn server for "wsgi" or "asgi" and wait until it answers
+# Same config file as the Azure entrypoint, preload=True forks warm workers
+def start_server(mode, env, port, workers=3, timeout=30.0, preload=False):
+    env = {**env, "EFB_PRELOAD": "1" if preload else "0"}
+    cmd = [sys.executable, "-m", "gunicorn", "--chdir", str(APP_DIR),
+           "--config", str(APP_DIR / "config" / "gunicorn.conf.py"),
+           "--bind", f"127.0.0.1:{port}", "--workers", str(workers), "--timeout", "90",
+           "--log-level", "warning"]
+    if mode == "asgi":
+        cmd += ["--worker-class", "uvicorn.workers.UvicornWorker", "config.asgi:application"]
+    else:
+        cmd += ["config.wsgi:application"]
+    proc = subprocess.Popen(cmd, env=env)
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"{mode} server exited with code {proc.returncode}")
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/api/veg-users/", timeout=1)
+            return proc
+        except urllib.error.HTTPError:
+            # Any HTTP answer (401 without credentials) means it is up
+            return proc
+        except OSError:
+            time.sleep(0.2)
+    stop_server(proc)
+    raise RuntimeError(f"{mode} server did not start within {timeout}s")
+
+
+def stop_server(proc):
+    proc.terminate()
+    try:
+        proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
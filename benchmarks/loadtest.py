@@ -0,0 +1,223 @@
+"""
+HTTP load generator for a running server (local gunicorn, docker, Azure).
+
+Each client thread keeps one keep-alive connection and picks paths from a
+weighted mix. Reports throughput, error rate and p50/p95/p99 latency per
+path and overall.
+
+Usage (from the repo root):
+    python benchmarks/loadtest.py --url http://127.0.0.1:8000 --auth basic \\
+        --username admin --password secret --concurrency 16 --duration 30
+    python benchmarks/loadtest.py --auth token --token <key> \\
+        --paths "/api/veg-users/@8,/ui/?page=2@1,/ui/diets.png@1,POST /ops/run-sim/@0.1"
+"""
+import argparse
+import base64
+import http.client
+import json
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+DEFAULT_PATHS = "/api/veg-users/@6,/ui/@2,/ui/diets.png@2,POST /ops/run-sim/@0"
+# Body of POST requests, one simulated user per /ops/run-sim/ call
+POST_BODY = json.dumps({"runs": 1})
+
+
+# "[METHOD ]path[@weight]" items, weight 0 disables an entry
+# "path=weight" is still read for paths without a query string, where "=" can only be the weight
+def parse_paths(spec):
+    targets = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        if "@" in item:
+            target, _, weight = item.rpartition("@")
+        elif "=" in item and "?" not in item:
+            target, _, weight = item.rpartition("=")
+        else:
+            target, weight = item, "1"
+        try:
+            weight = float(weight)
+        except ValueError:
+            raise ValueError(f"bad weight in {item!r}") from None
+        method, _, path = target.strip().rpartition(" ")
+        method = (method or ("POST" if path.startswith("/ops/run-sim") else "GET")).upper()
+        if weight > 0:
+            targets.append((method, path, weight))
+    if not targets:
+        raise ValueError("no path with a positive weight")
+    return targets
+
+
+def auth_header(mode, username=None, password=None, token=None):
+    if mode == "basic":
+        return "Basic " + base64.b64encode(f"{username}:{password}".encode()).decode()
+    if mode == "token":
+        return f"Token {token}"
+    return None
+
+
+def _percentile(ordered, pct):
+    return ordered[round(pct * (len(ordered) - 1))] if ordered else None
+
+
+def _summary(samples, elapsed):
+    latencies = sorted(s[0] for s in samples)
+    statuses = Counter(s[1] for s in samples)
+    errors = sum(n for status, n in statuses.items() if not (200 <= status < 400))
+    ms = lambda v: round(v * 1000, 1) if v is not None else None  # noqa: E731
+    return {
+        "requests": len(samples),
+        "rps": round(len(samples) / elapsed, 1) if elapsed else None,
+        "error_rate": round(errors / len(samples), 4) if samples else None,
+        "statuses": {str(k): v for k, v in sorted(statuses.items())},
+        "p50_ms": ms(_percentile(latencies, 0.50)),
+        "p95_ms": ms(_percentile(latencies, 0.95)),
+        "p99_ms": ms(_percentile(latencies, 0.99)),
+        "max_ms": ms(latencies[-1] if latencies else None),
+    }
+
+
+class _Client:
+    def __init__(self, base_url, headers, timeout):
+        parts = urlsplit(base_url)
+        conn_cls = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        self._connect = lambda: conn_cls(parts.hostname, parts.port, timeout=timeout)
+        self._prefix = parts.path.rstrip("/")
+        self._headers = headers
+        self._conn = None
+
+    # Returns (seconds, status), status 0 for connection errors and timeouts
+    def request(self, method, path):
+        body = POST_BODY if method == "POST" else None
+        headers = dict(self._headers)
+        if body is not None:
+            headers["Content-Type"] = "application/json"
+        start = time.perf_counter()
+        try:
+            if self._conn is None:
+                self._conn = self._connect()
+            self._conn.request(method, self._prefix + path, body=body, headers=headers)
+            res = self._conn.getresponse()
+            res.read()
+            status = res.status
+            if res.getheader("Connection", "").lower() == "close":
+                self.close()
+        except (OSError, http.client.HTTPException):
+            self.close()
+            status = 0
+        return time.perf_counter() - start, status
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+# Drive the server until `requests` are sent or `duration` seconds passed
+def run(base_url, targets, concurrency=8, requests=None, duration=None,
+        authorization=None, timeout=60.0, seed=7):
+    if requests is None and duration is None:
+        raise ValueError("set requests or duration")
+    headers = {"Authorization": authorization} if authorization else {}
+    samples = defaultdict(list)
+    lock = threading.Lock()
+    budget = [requests]
+
+    def take():
+        if budget[0] is None:
+            return True
+        with lock:
+            if budget[0] <= 0:
+                return False
+            budget[0] -= 1
+            return True
+
+    def worker(i):
+        rng = random.Random(seed + i)
+        client = _Client(base_url, headers, timeout)
+        weights = [t[2] for t in targets]
+        local = defaultdict(list)
+        try:
+            while (deadline is None or time.perf_counter() < deadline) and take():
+                method, path, _ = rng.choices(targets, weights)[0]
+                local[f"{method} {path}"].append(client.request(method, path))
+        finally:
+            client.close()
+        with lock:
+            for key, items in local.items():
+                samples[key].extend(items)
+
+    start = time.perf_counter()
+    deadline = start + duration if duration else None
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    report = {
+        "url": base_url,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 2),
+        "overall": _summary([s for items in samples.values() for s in items], elapsed),
+        "paths": {key: _summary(items, elapsed) for key, items in sorted(samples.items())},
+    }
+    return report
+
+
+# Rates and percentiles are None without samples or elapsed time, shown as "-"
+def _fmt(value, spec):
+    return "-" if value is None else format(value, spec)
+
+
+def print_report(report):
+    cols = f"{'requests':>9}{'req/s':>9}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+    print(f"{'':<28}{cols}")
+    rows = [*report["paths"].items(), ("overall", report["overall"])]
+    for name, r in rows:
+        print(f"{name:<28}{r['requests']:>9}{_fmt(r['rps'], '.1f'):>9}{_fmt(r['error_rate'], '.1%'):>8}"
+              f"{_fmt(r['p50_ms'], '.1f'):>9}{_fmt(r['p95_ms'], '.1f'):>9}{_fmt(r['p99_ms'], '.1f'):>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--paths", default=DEFAULT_PATHS,
+                        help='Weighted mix, "[METHOD ]path@weight" items separated by commas')
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, help="Seconds to run (default 30 unless --requests)")
+    parser.add_argument("--requests", type=int, help="Total requests to send")
+    parser.add_argument("--auth", choices=["basic", "token", "none"], default="basic")
+    parser.add_argument("--username")
+    parser.add_argument("--password")
+    parser.add_argument("--token")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--json", dest="json_out", help="Write the report to this file")
+    args = parser.parse_args()
+
+    if args.auth == "basic" and not (args.username and args.password):
+        parser.error("--auth basic needs --username and --password")
+    if args.auth == "token" and not args.token:
+        parser.error("--auth token needs --token")
+    duration = args.duration if args.duration or args.requests else 30.0
+
+    report = run(
+        args.url, parse_paths(args.paths), concurrency=args.concurrency,
+        requests=args.requests, duration=duration, timeout=args.timeout,
+        authorization=auth_header(args.auth, args.username, args.password, args.token),
+    )
+    print(f"{args.url} concurrency={args.concurrency} auth={args.auth} seconds={report['seconds']}")
+    print_report(report)
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(report, f, indent=2)
+    sys.exit(1 if report["overall"]["requests"] == 0 else 0)
+
+
+if __name__ == "__main__":
+    main()
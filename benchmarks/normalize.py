@@ -0,0 +1,119 @@
+"""
+Food name normalization micro-benchmark: throughput with and without the
+LRU cache and batch mode, and catalog hit rate of the bundled alias file
+against the original five-entry typo map.
+
+The workload is LLM-style answers for the seed catalog: case and spacing
+noise, trailing punctuation, accents, typos and plurals, with a skewed
+repetition like real runs. No database needed.
+
+Usage (from the repo root):
+    python benchmarks/normalize.py --names 200000
+"""
+import argparse
+import csv
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.common import APP_DIR
+
+sys.path.insert(0, str(APP_DIR))
+
+from foods.normalize import ALIASES_PATH, Normalizer, load_aliases
+
+SEED_PATH = APP_DIR / "foods" / "seeds" / "food_catalog.csv"
+# The map normalize.py shipped with before the alias file
+LEGACY_TYPOS = {
+    "avocato": "avocado",
+    "humus": "hummus",
+    "bolonese": "bolognese",
+    "omlette": "omelette",
+    "margharita": "margherita",
+}
+ACCENTED = {"e": "é", "a": "à", "o": "ô", "u": "ü", "n": "ñ"}
+
+
+def _noisy(name, rng):
+    roll = rng.random()
+    if roll < 0.3:
+        name = name.title()
+    elif roll < 0.4:
+        name = name.upper()
+    if rng.random() < 0.2:
+        name = f"  {name.replace(' ', '  ')}{rng.choice(['.', '!', ''])} "
+    if rng.random() < 0.1:
+        ch = rng.choice([c for c in name if c.lower() in ACCENTED] or [""])
+        if ch:
+            name = name.replace(ch, ACCENTED[ch.lower()], 1)
+    return name
+
+
+# (raw answer, catalog name it should match) pairs, skewed towards a few popular foods
+def workload(n, seed=7):
+    rng = random.Random(seed)
+    with open(SEED_PATH, newline="", encoding="utf-8") as f:
+        catalog = [row["food_name"] for row in csv.DictReader(f)]
+    words, phrases = load_aliases(ALIASES_PATH)
+    # Aliases that land on a catalog name, directly or as one word of it
+    variants = {name: [name] for name in catalog}
+    for alias, canonical in {**words, **phrases}.items():
+        for name in catalog:
+            if canonical == name:
+                variants[name].append(alias)
+            elif canonical in name.split(" "):
+                variants[name].append(name.replace(canonical, alias))
+    weights = [1 / (rank + 1) for rank in range(len(catalog))]
+    items = []
+    for name in rng.choices(catalog, weights, k=n):
+        items.append((_noisy(rng.choice(variants[name]), rng), name))
+    return items, set(catalog)
+
+
+def _time(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--names", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    items, catalog = workload(args.names)
+    raws = [raw for raw, _ in items]
+    print(f"names={len(raws)} distinct={len(set(raws))} catalog={len(catalog)}")
+
+    legacy = Normalizer(LEGACY_TYPOS, cache_size=0)
+    uncached = Normalizer.from_file(ALIASES_PATH, cache_size=0)
+    cached = Normalizer.from_file(ALIASES_PATH)
+
+    rows = [
+        ("legacy map, no cache", lambda: [legacy(r) for r in raws]),
+        ("aliases, no cache", lambda: [uncached(r) for r in raws]),
+        ("aliases, LRU cache", lambda: [cached(r) for r in raws]),
+        ("aliases, normalize_many", lambda: cached.many(raws)),
+    ]
+    print(f"{'variant':<26}{'names/s':>14}{'us/name':>10}")
+    for label, fn in rows:
+        seconds = _time(fn, args.repeat)
+        print(f"{label:<26}{len(raws) / seconds:>14,.0f}{seconds / len(raws) * 1e6:>10.2f}")
+
+    print(f"{'':<26}{'catalog hits':>14}{'correct':>10}")
+    for label, normalizer in (("legacy map", legacy), ("aliases", cached)):
+        normalized = normalizer.many(raws)
+        hits = sum(norm in catalog for norm in normalized)
+        correct = sum(norm == name for norm, (_, name) in zip(normalized, items, strict=True))
+        print(f"{label:<26}{hits / len(raws):>14.1%}{correct / len(raws):>10.1%}")
+
+
+if __name__ == "__main__":
+    main()
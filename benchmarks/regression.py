@@ -0,0 +1,200 @@
+"""
+Query-count and latency regression suite, offline against SQLite.
+
+For each dataset size a child process seeds a fresh database and measures
+the read endpoints in-process (Django test client, response cache off) and
+a dry-run simulate_foods. Query counts must stay under fixed ceilings
+whatever the size; the exit code is 1 when one is exceeded.
+
+Usage (from the repo root):
+    python benchmarks/regression.py --sizes 1000,10000,100000 --out report.json
+    python benchmarks/regression.py --sizes 1000 --compare main.json
+"""
+import argparse
+import io
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.common import REPO_ROOT, create_api_user, seed, setup_django
+
+# Most queries a single request (or simulated user) may run, at any data size
+QUERY_CEILINGS = {
+    "veg_users": 3,
+    # Dashboard and charts include the run_id IS NULL reads for users and messages without a run
+    "dashboard": 11,
+    "diets_png": 3,
+    "diets_svg": 3,
+    # Includes the one co-occurrence upsert (FoodPair) per user
+    "simulate_foods_per_user": 14,
+}
+
+ENDPOINTS = {
+    "veg_users": "/api/veg-users/",
+    "dashboard": "/ui/",
+    "diets_png": "/ui/diets.png",
+    "diets_svg": "/ui/diets.svg",
+}
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[round(pct * (len(ordered) - 1))]
+
+
+def _measure_endpoint(client, path, iterations, headers):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    # Warm-up: URLconf, templates, first matplotlib import
+    client.get(path, **headers)
+    latencies, queries = [], []
+    for _ in range(iterations):
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            res = client.get(path, **headers)
+            latencies.append(time.perf_counter() - start)
+        if res.status_code != 200:
+            raise RuntimeError(f"{path} returned {res.status_code}")
+        queries.append(len(ctx.captured_queries))
+    return {
+        "median_ms": round(statistics.median(latencies) * 1000, 2),
+        "p95_ms": round(_percentile(latencies, 0.95) * 1000, 2),
+        "queries": max(queries),
+        "bytes": len(res.content),
+    }
+
+
+def _simulate(users):
+    from django.core.management import call_command
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    with CaptureQueriesContext(connection) as ctx:
+        start = time.perf_counter()
+        call_command("simulate_foods", runs=users, stdout=io.StringIO())
+        elapsed = time.perf_counter() - start
+    return elapsed, len(ctx.captured_queries)
+
+
+# Per-user cost: the difference between a 1-user and an N-user run cancels
+# the per-run work (catalog seed check, run bookkeeping)
+def _measure_simulation(users):
+    _, one_user_queries = _simulate(1)
+    elapsed, queries = _simulate(users)
+    return {
+        "users": users,
+        "users_per_s": round(users / elapsed, 1),
+        "queries_per_user": round((queries - one_user_queries) / max(1, users - 1), 2),
+    }
+
+
+# Child process: one dataset size, prints its results as JSON
+def run_size(size, iterations, sim_users):
+    with tempfile.TemporaryDirectory() as tmp:
+        setup_django(Path(tmp) / "bench.sqlite3", EFB_CACHE_TIMEOUT=0, EFB_DASHBOARD_PAGE_SIZE=50)
+        from django.test import Client
+
+        start = time.perf_counter()
+        seed(size)
+        seed_s = time.perf_counter() - start
+        _, _, token = create_api_user()
+
+        client = Client()
+        results = {"seed_s": round(seed_s, 2), "endpoints": {}}
+        for name, path in ENDPOINTS.items():
+            headers = {"HTTP_AUTHORIZATION": f"Token {token}"} if path.startswith("/api/") else {}
+            results["endpoints"][name] = _measure_endpoint(client, path, iterations, headers)
+        results["simulate_foods"] = _measure_simulation(sim_users)
+    print(json.dumps(results))
+
+
+def _ceiling_failures(size, results):
+    failures = []
+    for name, data in results["endpoints"].items():
+        if data["queries"] > QUERY_CEILINGS[name]:
+            failures.append(f"{size}: {name} ran {data['queries']} queries (ceiling {QUERY_CEILINGS[name]})")
+    per_user = results["simulate_foods"]["queries_per_user"]
+    if per_user > QUERY_CEILINGS["simulate_foods_per_user"]:
+        failures.append(
+            f"{size}: simulate_foods ran {per_user} queries per user "
+            f"(ceiling {QUERY_CEILINGS['simulate_foods_per_user']})"
+        )
+    return failures
+
+
+def _git_rev():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _print_size(size, results, baseline=None):
+    print(f"\nusers={size} (seeded in {results['seed_s']}s)")
+    print(f"  {'endpoint':<12}{'median ms':>11}{'p95 ms':>10}{'queries':>9}{'vs base':>10}")
+    for name, data in results["endpoints"].items():
+        delta = ""
+        base = (baseline or {}).get("endpoints", {}).get(name)
+        if base and base["median_ms"]:
+            delta = f"{data['median_ms'] / base['median_ms']:.2f}x"
+        print(f"  {name:<12}{data['median_ms']:>11.1f}{data['p95_ms']:>10.1f}{data['queries']:>9}{delta:>10}")
+    sim = results["simulate_foods"]
+    print(f"  simulate_foods: {sim['users_per_s']} users/s, {sim['queries_per_user']} queries/user")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Comma-separated user counts")
+    parser.add_argument("--iterations", type=int, default=5, help="Timed requests per endpoint")
+    parser.add_argument("--sim-users", type=int, default=50, help="Users simulated (dry run) per size")
+    parser.add_argument("--out", help="Write the JSON report to this file")
+    parser.add_argument("--compare", help="Earlier JSON report to compare latencies against")
+    parser.add_argument("--one-size", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.one_size:
+        run_size(args.one_size, args.iterations, args.sim_users)
+        return
+
+    baseline = json.loads(Path(args.compare).read_text()) if args.compare else {}
+    report = {
+        "git_rev": _git_rev(),
+        "python": platform.python_version(),
+        "ceilings": QUERY_CEILINGS,
+        "sizes": {},
+        "failures": [],
+    }
+    for size in (int(s) for s in args.sizes.split(",") if s.strip()):
+        # A fresh process per size: own database, no state carried between sizes
+        res = subprocess.run(
+            [sys.executable, __file__, "--one-size", str(size),
+             "--iterations", str(args.iterations), "--sim-users", str(args.sim_users)],
+            capture_output=True, text=True,
+        )
+        if res.returncode != 0:
+            sys.stderr.write(res.stderr)
+            raise SystemExit(f"size {size} failed")
+        results = json.loads(res.stdout.strip().splitlines()[-1])
+        report["sizes"][str(size)] = results
+        report["failures"] += _ceiling_failures(size, results)
+        _print_size(size, results, baseline.get("sizes", {}).get(str(size)))
+
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2))
+    for failure in report["failures"]:
+        print(f"QUERY CEILING EXCEEDED: {failure}")
+    sys.exit(1 if report["failures"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Concurrent read/write throughput on SQLite, default settings against the
+tuned profile (WAL, synchronous=NORMAL, busy_timeout, mmap, cache, persistent
+connections; see common.db).
+
+Each mode gets a fresh database in its own process and a gunicorn WSGI server
+like the Azure one; clients mix reads with POST /ops/run-sim/ writes (one
+dry-run user each). Errors are mostly "database is locked" 500s.
+
+Usage (from the repo root):
+    python benchmarks/sqlite_concurrency.py --users 5000 --duration 20 --concurrency 12
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.common import (
+    bench_env,
+    create_api_user,
+    free_port,
+    seed,
+    setup_django,
+    start_server,
+    stop_server,
+)
+from benchmarks.loadtest import auth_header, parse_paths, run
+
+MODES = {
+    "default": {"EFB_SQLITE_TUNE": 0, "EFB_CONN_MAX_AGE": 0},
+    "tuned": {"EFB_SQLITE_TUNE": 1, "EFB_CONN_MAX_AGE": 60},
+}
+
+
+def _group(report, method):
+    rows = [r for key, r in report["paths"].items() if key.startswith(method + " ")]
+    requests = sum(r["requests"] for r in rows)
+    return {
+        "requests": requests,
+        "rps": round(requests / report["seconds"], 1),
+        # Worst path of the group
+        "p95_ms": max((r["p95_ms"] for r in rows), default=None),
+        "errors": sum(round(r["error_rate"] * r["requests"]) for r in rows),
+    }
+
+
+# Child process: one mode, prints its results as JSON
+def run_mode(mode, args):
+    extra = {"EFB_CACHE_TIMEOUT": 0, **MODES[mode]}
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "bench.sqlite3"
+        setup_django(db_path, **extra)
+        seed(args.users)
+        username, password, _ = create_api_user()
+
+        from django.db import connection, connections
+
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode")
+            journal_mode = cursor.fetchone()[0]
+        connections.close_all()
+
+        targets = parse_paths(args.paths)
+        authorization = auth_header("basic", username, password)
+        port = free_port()
+        proc = start_server("wsgi", bench_env(db_path, **extra), port, workers=args.workers)
+        try:
+            base_url = f"http://127.0.0.1:{port}"
+            run(base_url, targets, concurrency=args.workers, requests=args.workers * 4,
+                authorization=authorization)
+            report = run(base_url, targets, concurrency=args.concurrency, duration=args.duration,
+                         authorization=authorization)
+        finally:
+            stop_server(proc)
+    print(json.dumps({
+        "journal_mode": journal_mode,
+        "reads": _group(report, "GET"),
+        "writes": _group(report, "POST"),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds of load per mode")
+    parser.add_argument("--concurrency", type=int, default=12)
+    parser.add_argument("--workers", type=int, default=3, help="gunicorn workers, as on Azure")
+    parser.add_argument("--paths", default="/api/veg-users/@4,/ui/@2,POST /ops/run-sim/@1",
+                        help="Weighted mix passed to the load test")
+    parser.add_argument("--modes", default="default,tuned")
+    parser.add_argument("--one-mode", choices=list(MODES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.one_mode:
+        run_mode(args.one_mode, args)
+        return
+
+    print(f"users={args.users} duration={args.duration}s concurrency={args.concurrency} "
+          f"workers={args.workers} paths={args.paths}")
+    print(f"{'mode':<9}{'journal':>9}{'reads/s':>10}{'read p95':>10}{'writes/s':>10}{'write p95':>11}{'errors':>8}")
+    for mode in (m.strip() for m in args.modes.split(",") if m.strip()):
+        # A fresh process per mode: the PRAGMAs and CONN_MAX_AGE are read at import time
+        res = subprocess.run(
+            [sys.executable, __file__, "--one-mode", mode, "--users", str(args.users),
+             "--duration", str(args.duration), "--concurrency", str(args.concurrency),
+             "--workers", str(args.workers), "--paths", args.paths],
+            capture_output=True, text=True,
+        )
+        if res.returncode != 0:
+            sys.stderr.write(res.stderr)
+            raise SystemExit(f"mode {mode} failed")
+        r = json.loads(res.stdout.strip().splitlines()[-1])
+        reads, writes = r["reads"], r["writes"]
+        print(f"{mode:<9}{r['journal_mode']:>9}{reads['rps']:>10.1f}{reads['p95_ms'] or 0:>10.1f}"
+              f"{writes['rps']:>10.1f}{writes['p95_ms'] or 0:>11.1f}{reads['errors'] + writes['errors']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Worker startup cost: import time of the app (python -X importtime) and
+time-to-first-response of gunicorn, with and without --preload.
+
+Usage (from the repo root):
+    python benchmarks/startup.py --users 2000 --repeat 3
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.common import (
+    APP_DIR,
+    bench_env,
+    free_port,
+    seed,
+    setup_django,
+    start_server,
+    stop_server,
+)
+
+# What a worker imports before its first request: settings, apps, WSGI handler, URLconf
+IMPORT_SNIPPET = """
+import json, sys
+import config.wsgi
+from django.urls import get_resolver
+get_resolver().url_patterns
+print(json.dumps({name: name in sys.modules for name in ("openai", "matplotlib", "numpy")}))
+"""
+
+# Imported lazily by the app, they should not show up in a cold worker
+DEFERRED = ("openai", "matplotlib")
+
+
+# Parse -X importtime stderr into {top-level package: microseconds}
+# Self times, so a package is not charged for what its imports cost
+def parse_importtime(stderr):
+    totals = defaultdict(int)
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, _cumulative, name = line[len("import time:"):].split("|")
+        totals[name.strip().split(".")[0]] += int(self_us)
+    return dict(totals)
+
+
+def import_profile(env):
+    res = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", IMPORT_SNIPPET],
+        cwd=APP_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    loaded = json.loads(res.stdout.strip().splitlines()[-1])
+    packages = parse_importtime(res.stderr)
+    return {"total_ms": sum(packages.values()) / 1000, "packages": packages, "loaded": loaded}
+
+
+# Seconds from spawning gunicorn to its first HTTP answer, then the first dashboard render
+def first_response(mode, env, workers, preload):
+    port = free_port()
+    start = time.perf_counter()
+    proc = start_server(mode, env, port, workers=workers, preload=preload)
+    ready = time.perf_counter() - start
+    try:
+        start = time.perf_counter()
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/ui/", timeout=60).read()
+        except urllib.error.HTTPError:
+            pass
+        dashboard = time.perf_counter() - start
+    finally:
+        stop_server(proc)
+    return ready, dashboard
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--modes", nargs="+", default=["wsgi", "asgi"], choices=["wsgi", "asgi"])
+    parser.add_argument("--top", type=int, default=10, help="Slowest top-level imports to show")
+    parser.add_argument("--json", dest="json_out", help="Write the results to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "bench.sqlite3"
+        setup_django(db_path)
+        seed(args.users)
+        env = bench_env(db_path)
+
+        profile = import_profile(env)
+        print(f"app import: {profile['total_ms']:.0f} ms")
+        for name, us in sorted(profile["packages"].items(), key=lambda kv: -kv[1])[:args.top]:
+            print(f"  {name:<24} {us / 1000:8.1f} ms")
+        for name in DEFERRED:
+            state = "LOADED (should be deferred)" if profile["loaded"][name] else "not loaded"
+            print(f"  {name}: {state}")
+
+        results = {"import": profile, "servers": []}
+        print(f"\n{'mode':<6} {'preload':<8} {'first answer':>13} {'first /ui/':>11}")
+        for mode in args.modes:
+            for preload in (False, True):
+                runs = [first_response(mode, env, args.workers, preload) for _ in range(args.repeat)]
+                ready = statistics.median(r[0] for r in runs)
+                dashboard = statistics.median(r[1] for r in runs)
+                results["servers"].append({
+                    "mode": mode, "preload": preload,
+                    "first_answer_s": ready, "first_dashboard_s": dashboard,
+                })
+                print(f"{mode:<6} {str(preload):<8} {ready:>12.2f}s {dashboard:>10.3f}s")
+
+    if args.json_out:
+        Path(args.json_out).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -9,8 +9,19 @@ mkdir -p /home/data
 
 export PYTHONPATH="/app/app:${PYTHONPATH:-}"
 
-# Migrate on each start
-python /app/app/manage.py migrate --noinput
+# Migrate only when the schema inputs changed since the last successful migrate
+# (EFB_FORCE_MIGRATE=1 always runs it). The schema comes from syncdb plus the
+# post_migrate code (foods/schema.py, signals.py, summaries.py, ...), so every
+# module of the app package is hashed, not just models.py
+SCHEMA_STAMP_FILE=/home/data/.efb_schema_stamp
+SCHEMA_STAMP="$( (echo "${DATABASE_URL:-}"; cat /app/requirements.txt; find /app/app -name '*.py' -not -path '*/__pycache__/*' | sort | xargs cat) 2>/dev/null | sha1sum | cut -d' ' -f1)"
+if [[ "${EFB_FORCE_MIGRATE:-}" != "1" && -f "${SCHEMA_STAMP_FILE}" && "$(cat "${SCHEMA_STAMP_FILE}")" == "${SCHEMA_STAMP}" ]]; then
+  echo "Schema unchanged since last start, skipping migrate." >&2
+else
+  # foods has no migrations, its tables only come from syncdb
+  python /app/app/manage.py migrate --noinput --run-syncdb
+  echo "${SCHEMA_STAMP}" > "${SCHEMA_STAMP_FILE}"
+fi
 
 # smoke -> small LLM budget for safe deploy
 # live -> larger LLM budget for real usage
@@ -33,8 +44,11 @@ if [[ -z "${EFB_LLM_CALL_BUDGET:-}" ]]; then
 fi
 
 
-# Bootstrap runs only if EFB_BOOTSTRAP=1
-if [[ "${EFB_BOOTSTRAP:-}" = "1" ]]; then
+# Bootstrap runs only if EFB_BOOTSTRAP=1, once per data volume
+BOOTSTRAP_MARKER=/home/data/.efb_bootstrapped
+if [[ "${EFB_BOOTSTRAP:-}" = "1" && -f "${BOOTSTRAP_MARKER}" ]]; then
+  echo "EFB_BOOTSTRAP: already done (${BOOTSTRAP_MARKER}), skipping." >&2
+elif [[ "${EFB_BOOTSTRAP:-}" = "1" ]]; then
   echo "EFB_BOOTSTRAP: starting bootstrap tasks..." >&2
   # Create superuser if missing, generate a password if not provided.
   python - <<'PY'
@@ -75,15 +89,40 @@ PY
   # Seed a few conversations so the API has data
   RUNS="${EFB_BOOTSTRAP_RUNS:-3}"
   echo "EFB_BOOTSTRAP: running simulate_foods --runs=${RUNS}..." >&2
-  python /app/app/manage.py simulate_foods --runs="${RUNS}" || true
-
-  echo "EFB_BOOTSTRAP: bootstrap tasks done." >&2
+  # Marked done only when the seed run succeeded, a failed one is retried on the next start
+  if python /app/app/manage.py simulate_foods --runs="${RUNS}"; then
+    touch "${BOOTSTRAP_MARKER}"
+    echo "EFB_BOOTSTRAP: bootstrap tasks done." >&2
+  else
+    echo "EFB_BOOTSTRAP: simulate_foods failed, will retry on next start." >&2
+  fi
 fi
 
 
+# Serving mode
+# wsgi -> sync gunicorn workers (default)
+# asgi -> uvicorn workers, read endpoints served by async views
+EFB_SERVER="${EFB_SERVER:-wsgi}"
+WEB_WORKERS="${WEB_CONCURRENCY:-3}"
+# EFB_PRELOAD=1 -> app imported and catalog loaded once, before the workers fork
+# (read by config/gunicorn.conf.py)
+GUNICORN_CONF=/app/app/config/gunicorn.conf.py
+
+if [[ "${EFB_SERVER}" == "asgi" ]]; then
+  echo "Starting gunicorn with uvicorn workers (ASGI)..." >&2
+  exec gunicorn config.asgi:application \
+    --config "${GUNICORN_CONF}" \
+    --worker-class uvicorn.workers.UvicornWorker \
+    --chdir /app/app \
+    --bind 0.0.0.0:8000 \
+    --workers "${WEB_WORKERS}" \
+    --timeout 90
+fi
+
 # Run Gunicorn on :8000
 exec gunicorn config.wsgi:application \
+  --config "${GUNICORN_CONF}" \
   --chdir /app/app \
   --bind 0.0.0.0:8000 \
-  --workers 3 \
+  --workers "${WEB_WORKERS}" \
   --timeout 90
@@ -15,7 +15,8 @@ if [[ "${DATABASE_URL:-}" == postgresql* ]]; then
 fi
 
 echo "[entrypoint] Running migrations…"
-python /app/app/manage.py migrate --noinput
+# foods has no migrations, its tables only come from syncdb
+python /app/app/manage.py migrate --noinput --run-syncdb
 
 echo "[entrypoint] Starting server…"
 exec python /app/app/manage.py runserver 0.0.0.0:8000
@@ -55,6 +55,40 @@ def _force_sqlite_db():
     yield
 
 
+# Cache keys embed the data version, which restarts at zero in every test DB
+@pytest.fixture(autouse=True)
+def _clear_response_cache():
+    from django.core.cache import cache
+    from foods import response_cache
+    cache.clear()
+    response_cache.reset_stats()
+    yield
+
+
+# User pks are reused across test DBs, so verified credentials must not survive a test
+@pytest.fixture(autouse=True)
+def _clear_credential_cache():
+    from common.authentication import credential_cache
+    credential_cache.clear()
+    yield
+
+
+# Catalog pks differ per test DB as well
+@pytest.fixture(autouse=True)
+def _reset_catalog_snapshot():
+    from foods import catalog
+    catalog.reset_snapshot()
+    yield
+
+
+# Same for the prompt template ids
+@pytest.fixture(autouse=True)
+def _reset_prompt_templates():
+    from foods import prompts
+    prompts.reset_cache()
+    yield
+
+
 @pytest.fixture
 # Returns either API client or plain django client
 def api_client():
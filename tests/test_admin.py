@@ -0,0 +1,69 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.test import Client
+from foods.models import Conversation, DietLabel, FavoriteFood, FoodCatalog, UserProfile
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def staff_client():
+    user = get_user_model().objects.create_superuser("boss", "boss@example.com", "pw")
+    client = Client()
+    client.force_login(user)
+    return client
+
+
+def _users(n):
+    banana, _ = FoodCatalog.objects.get_or_create(food_name="banana", defaults={"diet": DietLabel.VEGAN})
+    users = []
+    for _ in range(n):
+        user = UserProfile.objects.create(diet=DietLabel.VEGAN)
+        FavoriteFood.objects.create(user=user, rank=1, name_raw="Banana", food_name="banana", catalog=banana)
+        FavoriteFood.objects.create(user=user, rank=2, name_raw="Pho", food_name="pho bo")
+        Conversation.objects.create(user=user, role="A")
+        users.append(user)
+    return users
+
+
+# Changelists cost the same number of queries whatever the page size
+@pytest.mark.parametrize("path", ["/admin/foods/favoritefood/", "/admin/foods/conversation/"])
+def test_changelist_queries_do_not_grow_with_rows(staff_client, path, django_assert_max_num_queries):
+    _users(2)
+    with django_assert_max_num_queries(12) as small:
+        assert staff_client.get(path).status_code == 200
+    _users(20)
+    with django_assert_max_num_queries(len(small.captured_queries)):
+        assert staff_client.get(path).status_code == 200
+
+
+def test_search_uses_exact_ids_and_name_prefixes(staff_client):
+    users = _users(3)
+    res = staff_client.get("/admin/foods/favoritefood/", {"q": "PHO"})
+    assert res.context["cl"].result_count == 3
+
+    # Terms are normalized like stored names: accents and aliases
+    FoodCatalog.objects.create(food_name="creme brulee")
+    FoodCatalog.objects.create(food_name="mac and cheese")
+    for term, name in [("Crème Brûlée", "creme brulee"), ("mac n cheese", "mac and cheese")]:
+        res = staff_client.get("/admin/foods/foodcatalog/", {"q": term})
+        assert [obj.food_name for obj in res.context["cl"].result_list] == [name]
+
+    res = staff_client.get("/admin/foods/favoritefood/", {"q": str(users[0].id)})
+    assert res.context["cl"].result_count == 2
+
+    # Neither a UUID nor a known prefix: no match, no table scan
+    res = staff_client.get("/admin/foods/userprofile/", {"q": "not-a-uuid"})
+    assert res.context["cl"].result_count == 0
+
+
+def test_paginator_estimates_large_unfiltered_tables(monkeypatch):
+    from common import pagination
+
+    _users(5)
+    monkeypatch.setattr(pagination, "EXACT_COUNT_LIMIT", 3)
+    # Estimate from the table statistics instead of COUNT(*)
+    assert pagination.EstimatedCountPaginator(FavoriteFood.objects.order_by("pk"), 2).count >= 10
+    # Filtered: counting stops at the limit
+    filtered = FavoriteFood.objects.filter(rank=1).order_by("pk")
+    assert pagination.EstimatedCountPaginator(filtered, 2).count == 3
@@ -0,0 +1,164 @@
+import json
+from io import StringIO
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+
+from foods import analytics, pairs
+from foods.models import (
+    Conversation,
+    DietLabel,
+    FavoriteFood,
+    FoodCatalog,
+    FoodPair,
+    MessageRole,
+    UserProfile,
+)
+
+pytestmark = pytest.mark.django_db
+
+
+def _catalog():
+    return {
+        name: FoodCatalog.objects.create(food_name=name, diet=diet, source="llm", confidence=confidence)
+        for name, diet, confidence in [
+            ("tofu", DietLabel.VEGAN, 0.95),
+            ("hummus", DietLabel.VEGAN, 0.85),
+            ("pizza", DietLabel.VEGETARIAN, 0.7),
+            ("steak", DietLabel.OMNIVORE, None),
+        ]
+    }
+
+
+def _user(diet, bucket, foods, catalog):
+    user = UserProfile.objects.create(diet=diet)
+    for rank, name in enumerate(foods, start=1):
+        FavoriteFood.objects.create(user=user, rank=rank, name_raw=name, food_name=name, catalog=catalog.get(name))
+    Conversation.objects.create(user=user, role=MessageRole.A, prompt_params={"bucket": bucket} if bucket else None)
+    Conversation.objects.create(user=user, role=MessageRole.B)
+
+
+def test_report_counts_pairs_buckets_and_confidence():
+    catalog = _catalog()
+    _user(DietLabel.VEGAN, "Levantine", ["tofu", "hummus", "mystery"], catalog)
+    _user(DietLabel.VEGAN, "Levantine", ["hummus", "tofu", "tofu"], catalog)
+    _user(DietLabel.VEGETARIAN, "Italian", ["pizza", "hummus", "tofu"], catalog)
+    _user(DietLabel.OMNIVORE, None, ["steak", "pizza"], catalog)
+
+    report = analytics.report(top=3)
+
+    assert (report["users"], report["favorites"], report["catalog_foods"]) == (4, 9, 4)
+    assert [(f["food_name"], f["users"]) for f in report["top_foods"]] == [("tofu", 3), ("hummus", 3), ("pizza", 2)]
+    top_pair = report["top_pairs"][0]
+    assert [f["food_name"] for f in top_pair["foods"]] == ["tofu", "hummus"]
+    assert top_pair["users"] == 3
+    assert top_pair["lift"] == pytest.approx(4 * 3 / (3 * 3), abs=1e-3)
+    assert report["buckets"]["Levantine"] == {"users": 2, "vegan": 2, "vegetarian": 0, "omnivore": 0, "unknown": 0}
+    assert report["buckets"][analytics.NO_BUCKET]["omnivore"] == 1
+    assert report["confidence"]["vegan"]["count"] == 2
+    assert report["confidence"]["vegan"]["mean"] == pytest.approx(0.9)
+    assert "omnivore" not in report["confidence"]
+
+
+# Pair counts match a plain Python count over the same favorites
+def test_cooccurrence_matches_python_count():
+    import itertools
+    import random
+
+    rng = random.Random(3)
+    names = [f"food {i}" for i in range(12)]
+    catalog = {name: FoodCatalog.objects.create(food_name=name) for name in names}
+    expected = {}
+    for _ in range(40):
+        foods = sorted(set(rng.sample(names, rng.randint(1, 4))), key=lambda n: catalog[n].pk)
+        _user(DietLabel.UNKNOWN, None, foods, catalog)
+        for a, b in itertools.combinations(foods, 2):
+            expected[(a, b)] = expected.get((a, b), 0) + 1
+
+    data = analytics.dataset()
+    a, b, counts = data.cooccurrence()
+    got = {(data.names[i], data.names[j]): int(c) for i, j, c in zip(a, b, counts, strict=True)}
+    assert got == expected
+
+
+def test_stats_endpoint_and_command(api_client):
+    catalog = _catalog()
+    _user(DietLabel.VEGAN, "Levantine", ["tofu", "hummus"], catalog)
+    user = get_user_model().objects.create_user("analyst", password="pw")
+    api_client.force_authenticate(user)
+
+    res = api_client.get("/api/stats/foods", {"top": 1})
+    assert res.status_code == 200
+    assert [f["food_name"] for f in res.data["top_foods"]] == ["tofu"]
+    assert res["ETag"]
+    assert api_client.get("/api/stats/foods", {"top": "x"}).status_code == 400
+
+    out = StringIO()
+    call_command("food_analytics", "--json", stdout=out)
+    assert json.loads(out.getvalue())["top_pairs"][0]["users"] == 1
+
+
+def _pair_rows():
+    return set(FoodPair.objects.values_list("food__food_name", "related__food_name", "users"))
+
+
+# Saves and deletes one row at a time, cascades included, leave the same index as a rebuild
+def test_food_pairs_follow_favorites_and_match_rebuild():
+    catalog = _catalog()
+    _user(DietLabel.VEGAN, None, ["tofu", "hummus"], catalog)
+    _user(DietLabel.VEGETARIAN, None, ["tofu", "hummus", "pizza"], catalog)
+    _user(DietLabel.OMNIVORE, None, ["steak", "tofu"], catalog)
+    assert {("tofu", "hummus", 2), ("hummus", "tofu", 2), ("steak", "tofu", 1)} <= _pair_rows()
+
+    UserProfile.objects.get(diet=DietLabel.OMNIVORE).delete()
+    assert not any("steak" in row for row in _pair_rows())
+
+    fav = FavoriteFood.objects.get(user__diet=DietLabel.VEGETARIAN, food_name="pizza")
+    fav.catalog = catalog["steak"]
+    fav.save()
+    FavoriteFood.objects.get(user__diet=DietLabel.VEGAN, food_name="hummus").delete()
+    incremental = _pair_rows()
+    assert ("tofu", "hummus", 1) in incremental and ("steak", "hummus", 1) in incremental
+
+    pairs.rebuild()
+    assert _pair_rows() == incremental
+
+
+def test_related_endpoint_filters_by_diet(api_client):
+    catalog = _catalog()
+    _user(DietLabel.VEGAN, None, ["tofu", "hummus"], catalog)
+    _user(DietLabel.OMNIVORE, None, ["tofu", "steak", "pizza"], catalog)
+    _user(DietLabel.OMNIVORE, None, ["tofu", "steak"], catalog)
+    pairs.rebuild()
+    api_client.force_authenticate(get_user_model().objects.create_user("reader", password="pw"))
+
+    res = api_client.get("/api/foods/Tofu/related")
+    assert res.status_code == 200
+    assert res.data["food_name"] == "tofu"
+    assert [(r["food_name"], r["users"]) for r in res.data["related"]] == [("steak", 2), ("hummus", 1), ("pizza", 1)]
+
+    res = api_client.get("/api/foods/tofu/related", {"diet": "vegetarian"})
+    assert [r["food_name"] for r in res.data["related"]] == ["hummus", "pizza"]
+    res = api_client.get("/api/foods/tofu/related", {"diet": "vegan", "limit": 1})
+    assert [r["food_name"] for r in res.data["related"]] == ["hummus"]
+
+    assert api_client.get("/api/foods/mystery stew/related").status_code == 404
+    assert api_client.get("/api/foods/tofu/related", {"diet": "carnivore"}).status_code == 400
+
+
+# Databases upgraded from before food_pair get the table and its rows on migrate
+@pytest.mark.django_db(transaction=True)
+def test_migrate_backfills_food_pairs():
+    from django.db import connection
+
+    catalog = _catalog()
+    _user(DietLabel.VEGAN, None, ["tofu", "hummus"], catalog)
+    with connection.schema_editor() as editor:
+        editor.delete_model(FoodPair)
+
+    # Without syncdb the table stays missing and the backfill waits for it
+    call_command("migrate", verbosity=0)
+    call_command("migrate", run_syncdb=True, verbosity=0)
+
+    assert _pair_rows() == {("tofu", "hummus", 1), ("hummus", "tofu", 1)}
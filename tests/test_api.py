@@ -60,3 +60,357 @@ def test_token_auth_allows_access(token_client):
 def test_basic_auth_allows_access(basic_client):
     res = basic_client.get(API_PATH)
     assert res.status_code == 200
+
+
+EXPORT_PATH = "/api/veg-users/export"
+
+@pytest.fixture
+def veg_user_with_foods():
+    from foods.models import DietLabel, FavoriteFood, SimulationRun, UserProfile
+    run = SimulationRun.objects.create()
+    user = UserProfile.objects.create(diet=DietLabel.VEGAN, run=run)
+    for rank, name in enumerate(["banana", "hummus", "falafel"], start=1):
+        FavoriteFood.objects.create(user=user, rank=rank, name_raw=name, food_name=name)
+    # Omnivores never appear in the veg export
+    UserProfile.objects.create(diet=DietLabel.OMNIVORE, run=run)
+    return user
+
+def test_export_ndjson_streams_veg_users(token_client, veg_user_with_foods):
+    import json
+    res = token_client.get(EXPORT_PATH)
+    assert res.status_code == 200
+    assert res["Content-Type"] == "application/x-ndjson"
+    lines = b"".join(res.streaming_content).decode().splitlines()
+    assert [json.loads(line) for line in lines] == [{
+        "user_id": str(veg_user_with_foods.id),
+        "run_id": str(veg_user_with_foods.run_id),
+        "diet": "vegan",
+        "top3": ["banana", "hummus", "falafel"],
+    }]
+
+def test_export_csv_with_filters(token_client, veg_user_with_foods):
+    res = token_client.get("/api/users/export", {"fmt": "csv", "diet": "vegan"})
+    assert res.status_code == 200
+    lines = b"".join(res.streaming_content).decode().splitlines()
+    assert lines[0] == "user_id,run_id,diet,food_1,food_2,food_3"
+    assert lines[1:] == [f"{veg_user_with_foods.id},{veg_user_with_foods.run_id},vegan,banana,hummus,falafel"]
+
+    res = token_client.get("/api/users/export", {"run_id": str(uuid.uuid4())})
+    assert b"".join(res.streaming_content) == b""
+
+def test_export_includes_rendered_prompts_on_request(token_client, veg_user_with_foods):
+    import json
+
+    from foods import prompts
+    from foods.models import Conversation
+
+    text = "Give your top-3 favorite foods.\nUse the perspective of African cuisine.\n(seed:r-0)"
+    Conversation.objects.create(user=veg_user_with_foods, role="A", **prompts.compact(text))
+    res = token_client.get(EXPORT_PATH, {"prompts": "1"})
+    rows = [json.loads(line) for line in b"".join(res.streaming_content).decode().splitlines()]
+    assert rows[0]["prompt"] == text
+
+    res = token_client.get(EXPORT_PATH, {"prompts": "1", "fmt": "csv"})
+    content = b"".join(res.streaming_content).decode()
+    assert content.splitlines()[0] == "user_id,run_id,diet,food_1,food_2,food_3,prompt"
+    assert "(seed:r-0)" in content
+
+def test_export_rejects_bad_params(token_client):
+    assert token_client.get(EXPORT_PATH, {"fmt": "xml"}).status_code == 400
+    assert token_client.get(EXPORT_PATH, {"run_id": "nope"}).status_code == 400
+
+def test_conditional_get_returns_304_until_data_changes(
+    token_client, django_assert_max_num_queries, django_capture_on_commit_callbacks
+):
+    from foods.models import DietLabel, FavoriteFood, SimulationRun, UserProfile
+
+    first = token_client.get(API_PATH)
+    etag = first["ETag"]
+    assert etag
+
+    # Only the token lookup and the version lookup run on a revalidation
+    with django_assert_max_num_queries(2):
+        res = token_client.get(API_PATH, HTTP_IF_NONE_MATCH=etag)
+    assert res.status_code == 304
+
+    with django_capture_on_commit_callbacks(execute=True):
+        user = UserProfile.objects.create(diet=DietLabel.VEGAN, run=SimulationRun.objects.create())
+        FavoriteFood.objects.create(user=user, rank=1, name_raw="banana", food_name="banana")
+
+    res = token_client.get(API_PATH, HTTP_IF_NONE_MATCH=etag)
+    assert res.status_code == 200
+    assert res["ETag"] != etag
+    assert res.has_header("Last-Modified")
+
+def test_version_bumps_once_per_transaction(django_capture_on_commit_callbacks):
+    from django.db import transaction
+    from foods import versioning
+    from foods.models import DataVersion, FavoriteFood, UserProfile
+
+    with django_capture_on_commit_callbacks(execute=True):
+        with transaction.atomic():
+            user = UserProfile.objects.create()
+            FavoriteFood.objects.create(user=user, rank=1, name_raw="banana", food_name="banana")
+            user.save()
+    # One UPDATE for the three writes (the first bump creates the row at 1)
+    assert DataVersion.objects.get(scope=versioning.SCOPE_USERS).version == 1
+
+    # Writes rolled back with their transaction leave nothing that swallows the next bump
+    with pytest.raises(RuntimeError), transaction.atomic():
+        UserProfile.objects.create()
+        raise RuntimeError
+    with django_capture_on_commit_callbacks(execute=True):
+        UserProfile.objects.create()
+    assert DataVersion.objects.get(scope=versioning.SCOPE_USERS).version == 2
+
+def test_repeated_reads_are_served_from_cache(
+    token_client, veg_user_with_foods, django_assert_max_num_queries
+):
+    first = token_client.get(API_PATH)
+    # Token lookup + version lookup, the user/favorites queries are skipped
+    with django_assert_max_num_queries(2):
+        second = token_client.get(API_PATH)
+    assert second.status_code == 200
+    assert second.data == first.data
+
+    User = get_user_model()
+    User.objects.create_superuser(username="ops", password="ops-pass")
+    token_client.credentials(
+        HTTP_AUTHORIZATION="Basic " + base64.b64encode(b"ops:ops-pass").decode()
+    )
+    stats = token_client.get("/ops/cache-stats/").json()
+    assert stats["scope"] == "worker"
+    assert stats["caches"]["veg_users"] == {"hits": 1, "misses": 1, "hit_ratio": 0.5}
+
+def test_unknown_params_share_the_cache_entry(token_client, client, veg_user_with_foods):
+    from foods import response_cache
+
+    response_cache.reset_stats()
+    token_client.get(API_PATH)
+    token_client.get(API_PATH + "?_=123")
+    token_client.get(API_PATH + "?refresh=1&x=y")
+    assert response_cache.stats()["veg_users"]["misses"] == 1
+    assert response_cache.stats()["veg_users"]["hits"] == 2
+
+    response_cache.reset_stats()
+    client.get("/ui/diets.svg?diet=vegan&cb=1")
+    client.get("/ui/diets.svg?cb=2&diet=vegan")
+    client.get("/ui/diets.svg?diet=omnivore")
+    assert response_cache.stats()["diets_svg"] == {"hits": 1, "misses": 2, "hit_ratio": 0.3333}
+
+def test_basic_auth_skips_hashing_for_cached_credentials(
+    basic_client, user_and_password, monkeypatch
+):
+    from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+    calls = []
+    original = PBKDF2PasswordHasher.verify
+    def counting_verify(self, password, encoded):
+        calls.append(password)
+        return original(self, password, encoded)
+    monkeypatch.setattr(PBKDF2PasswordHasher, "verify", counting_verify)
+
+    assert basic_client.get(API_PATH).status_code == 200
+    assert basic_client.get(API_PATH).status_code == 200
+    assert len(calls) == 1
+
+    # Changing the password drops the cached verification
+    user, _ = user_and_password
+    user.set_password("rotated-456")
+    user.save()
+    assert basic_client.get(API_PATH).status_code in (401, 403)
+
+def test_deleted_token_is_rejected(token_client, user_and_password):
+    from rest_framework.authtoken.models import Token
+
+    assert token_client.get(API_PATH).status_code == 200
+    Token.objects.filter(user=user_and_password[0]).delete()
+    assert token_client.get(API_PATH).status_code in (401, 403)
+
+def test_stats_endpoint_serves_run_rollups(token_client):
+    from foods import summaries
+    from foods.models import SimulationRun
+
+    run_a, run_b = SimulationRun.objects.create().id, SimulationRun.objects.create().id
+    summaries.start_run(run_a)
+    summaries.start_run(run_b)
+    summaries.record_user(run_a, diet="vegan", tokens=50, cost_usd=0.001, llm_calls=1,
+                          catalog_lookups=3, catalog_hits=2)
+    summaries.record_user(run_b, diet="omnivore", tokens=10, cost_usd=0.0005, llm_calls=2,
+                          catalog_lookups=3, catalog_hits=3)
+
+    res = token_client.get("/api/stats/")
+    assert res.status_code == 200
+    totals = res.data["totals"]
+    assert totals["runs"] == 2
+    assert totals["users"] == 2
+    assert totals["diets"] == {"vegan": 1, "vegetarian": 0, "omnivore": 1, "unknown": 0}
+    assert totals["total_tokens"] == 60
+    assert totals["llm_calls"] == 3
+    assert totals["estimated_cost_usd"] == pytest.approx(0.0015)
+    assert totals["catalog_hit_rate"] == pytest.approx(5 / 6, abs=1e-4)
+
+    res = token_client.get("/api/stats/", {"run_id": str(run_a)})
+    assert [r["run_id"] for r in res.data["runs"]] == [str(run_a)]
+    assert res.data["runs"][0]["catalog_hit_rate"] == pytest.approx(0.6667)
+
+    # Users and messages without a run count in the unfiltered totals and the chart
+    from foods.models import Conversation, MessageRole, UserProfile
+    loner = UserProfile.objects.create(diet="vegetarian")
+    Conversation.objects.create(user=loner, role=MessageRole.A, total_tokens=7)
+    totals = token_client.get("/api/stats/").data["totals"]
+    assert (totals["runs"], totals["users"], totals["diets"]["vegetarian"], totals["total_tokens"]) == (2, 3, 1, 67)
+    assert {"diet": "vegetarian", "c": 1} in summaries.diet_counts()
+    assert summaries.totals()["total_tokens"] == 67
+    assert token_client.get("/api/stats/", {"run_id": str(run_a)}).data["totals"]["users"] == 1
+
+def test_runs_endpoint_lists_newest_first(token_client):
+    from datetime import timedelta
+
+    from django.utils import timezone
+    from foods.models import RunStatus, SimulationRun
+
+    older = SimulationRun.objects.create(started_at=timezone.now() - timedelta(hours=1))
+    newer = SimulationRun.objects.create(status=RunStatus.FAILED, error="budget")
+
+    res = token_client.get("/api/runs/")
+    assert res.status_code == 200
+    assert [r["run_id"] for r in res.data] == [str(newer.id), str(older.id)]
+
+    res = token_client.get("/api/runs/", {"status": "failed"})
+    assert [(r["run_id"], r["error"]) for r in res.data] == [(str(newer.id), "budget")]
+
+
+def _catalog(*names):
+    from foods.models import DietLabel, FoodCatalog
+    return [FoodCatalog.objects.create(food_name=name, diet=DietLabel.VEGETARIAN) for name in names]
+
+
+def test_catalog_search_by_prefix_and_word(token_client, django_assert_num_queries):
+    from foods import catalog
+
+    _catalog("pizza", "pierogi", "margherita pizza", "pho bo", "tofu")
+    catalog.warm()
+
+    res = token_client.get("/api/catalog/search", {"q": "PI"})
+    assert res.status_code == 200
+    assert [r["food_name"] for r in res.data["results"]] == ["pierogi", "pizza", "margherita pizza"]
+    assert res.data["results"][0] == {"food_name": "pierogi", "diet": "vegetarian", "source": "static"}
+
+    res = token_client.get("/api/catalog/search", {"q": "Pizzas", "limit": 1})
+    assert [r["food_name"] for r in res.data["results"]] == ["pizza"]
+
+    # Served from memory
+    with django_assert_num_queries(0):
+        assert catalog.search("bo") == [{"food_name": "pho bo", "diet": "vegetarian", "source": "static"}]
+
+    assert token_client.get("/api/catalog/search").status_code == 400
+    assert token_client.get("/api/catalog/search", {"q": "pi", "limit": "x"}).status_code == 400
+
+
+# A catalog write reads back the changed rows only; a delete reloads everything
+def test_catalog_snapshot_refresh_applies_changed_rows(django_assert_num_queries):
+    from foods import catalog
+
+    pizza, tofu = _catalog("pizza", "tofu")
+    catalog.warm()
+    old_index = catalog._snapshot["index"]
+
+    _catalog("pierogi")
+    tofu.diet = "vegan"
+    tofu.save()
+    with django_assert_num_queries(2):
+        catalog._refresh("c2")
+    assert [r["food_name"] for r in catalog.search("p")] == ["pierogi", "pizza"]
+    assert catalog.search("tofu")[0]["diet"] == "vegan"
+    assert catalog.lookup("pierogi").food_name == "pierogi"
+    assert len(old_index) == 2
+
+    pizza.delete()
+    catalog._refresh("c3")
+    assert [r["food_name"] for r in catalog.search("p")] == ["pierogi"]
+
+
+class _FakeBatchLLM:
+    def __init__(self):
+        self.batches = []
+
+    def cost_usd(self):
+        return 0.001
+
+    def classify_food_diets(self, food_names):
+        self.batches.append(list(food_names))
+        return {name: ("vegan", 0.9) for name in food_names if name != "mystery stew"}
+
+
+def test_classify_resolves_catalog_hits_and_batches_misses(token_client, monkeypatch):
+    from foods import catalog
+    from foods.models import FoodCatalog
+
+    _catalog("pizza", "hummus")
+    fake = _FakeBatchLLM()
+    monkeypatch.setattr(catalog, "OpenAIClient", lambda: fake)
+    get_user_model().objects.filter(username="apiuser").update(is_staff=True)
+
+    foods = ["Pizzas", "HUMUS", "Seitan Wrap", "mystery stew", "seitan  wrap!", "tempeh", "jackfruit"]
+    res = token_client.post("/api/classify/", {"foods": foods, "llm_budget": 2}, format="json")
+    assert res.status_code == 200
+
+    # One LLM request for the distinct misses within the budget
+    assert fake.batches == [["seitan wrap", "mystery stew"]]
+    assert res.data["llm"] == {"sent": 2, "skipped": 2, "cost_usd": 0.001}
+    by_name = {r["name"]: r for r in res.data["results"]}
+    assert [r["name"] for r in res.data["results"]] == foods
+    assert by_name["Pizzas"] == {
+        "name": "Pizzas", "food_name": "pizza", "diet": "vegetarian",
+        "confidence": None, "source": "static", "cached": True,
+    }
+    assert by_name["seitan  wrap!"]["diet"] == by_name["Seitan Wrap"]["diet"] == "vegan"
+    assert by_name["Seitan Wrap"]["source"] == "llm"
+    assert by_name["mystery stew"]["diet"] == by_name["tempeh"]["diet"] == "unknown"
+
+    # Saved with one upsert, the next request is served from the catalog
+    assert FoodCatalog.objects.get(food_name="seitan wrap").confidence == 0.9
+    res = token_client.post("/api/classify/", {"foods": ["seitan wrap"]}, format="json")
+    assert res.data["results"][0]["cached"] is True
+    assert len(fake.batches) == 1
+
+
+# A label stored while the LLM request was in flight is kept, not overwritten
+def test_classify_keeps_rows_written_during_the_llm_call(token_client, monkeypatch):
+    from foods import catalog
+    from foods.models import FoodCatalog
+
+    class _Racing(_FakeBatchLLM):
+        def classify_food_diets(self, food_names):
+            FoodCatalog.objects.create(food_name="tempeh", diet="vegetarian", source="static")
+            return super().classify_food_diets(food_names)
+
+    monkeypatch.setattr(catalog, "OpenAIClient", _Racing)
+    get_user_model().objects.filter(username="apiuser").update(is_staff=True)
+    res = token_client.post("/api/classify/", {"foods": ["tempeh", "seitan"]}, format="json")
+
+    assert [(r["diet"], r["source"]) for r in res.data["results"]] == [("vegetarian", "static"), ("vegan", "llm")]
+    assert FoodCatalog.objects.get(food_name="tempeh").source == "static"
+
+
+# Without staff or the add_foodcatalog permission: catalog only, and a per-user throttle
+def test_classify_is_catalog_only_and_throttled_for_plain_users(token_client, monkeypatch):
+    from foods import catalog, views
+
+    _catalog("pizza")
+    monkeypatch.setattr(catalog, "OpenAIClient", lambda: pytest.fail("plain users never reach the LLM"))
+    monkeypatch.setattr(views.ClassifyThrottle, "THROTTLE_RATES", {"classify": "2/min"})
+
+    res = token_client.post("/api/classify/", {"foods": ["pizza", "seitan wrap"]}, format="json")
+    assert res.status_code == 200
+    assert [r["diet"] for r in res.data["results"]] == ["vegetarian", "unknown"]
+    assert res.data["llm"]["sent"] == 0 and res.data["llm"]["skipped"] == 1
+    assert token_client.post("/api/classify/", {"foods": ["pizza"]}, format="json").status_code == 200
+    assert token_client.post("/api/classify/", {"foods": ["pizza"]}, format="json").status_code == 429
+
+
+@pytest.mark.parametrize("body", [{}, {"foods": []}, {"foods": "pizza"}, {"foods": [""]}, {"foods": [1]},
+                                  {"foods": ["pizza"], "llm_budget": "lots"}, ["pizza"]])
+def test_classify_rejects_bad_bodies(token_client, body):
+    assert token_client.post("/api/classify/", body, format="json").status_code == 400
@@ -0,0 +1,92 @@
+import io
+from datetime import timedelta
+
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+from foods import prompts
+from foods.models import (
+    Conversation,
+    DietLabel,
+    FavoriteFood,
+    FoodCatalog,
+    RunStatus,
+    RunSummary,
+    SimulationRun,
+    UserProfile,
+)
+
+pytestmark = pytest.mark.django_db
+
+
+def _make_run(users, started_days_ago=0):
+    run = SimulationRun.objects.create(
+        status=RunStatus.COMPLETED,
+        requested_users=users,
+        completed_users=users,
+        started_at=timezone.now() - timedelta(days=started_days_ago),
+    )
+    RunSummary.objects.create(run=run, users=users, vegan=users, total_tokens=10 * users)
+    banana, _ = FoodCatalog.objects.get_or_create(food_name="banana", defaults={"diet": DietLabel.VEGAN})
+    for i in range(users):
+        user = UserProfile.objects.create(diet=DietLabel.VEGAN, run=run)
+        FavoriteFood.objects.create(user=user, rank=1, name_raw="Banana", food_name="banana", catalog=banana)
+        FavoriteFood.objects.create(user=user, rank=2, name_raw="Mystery", food_name="mystery")
+        stored = prompts.compact(f"Give your top-3 favorite foods.\n(seed:{run.id}-{i})")
+        Conversation.objects.create(user=user, role="A", run=run, total_tokens=10, **stored)
+        Conversation.objects.create(user=user, role="B", run=run, response="banana, mystery", **stored)
+    return run
+
+
+# Archive in chunks, then restore: same rows, links, prompts and timestamps
+def test_archive_and_restore_round_trip(tmp_path):
+    run = _make_run(5)
+    kept = _make_run(1)
+    before = {
+        u.id: (u.created_at, [m.prompt_text for m in u.messages.order_by("pk")])
+        for u in UserProfile.objects.filter(run=run)
+    }
+
+    out = io.StringIO()
+    call_command("archive_runs", run_ids=[str(run.id)], out_dir=str(tmp_path), chunk_size=2, stdout=out)
+    assert "Archived and deleted 1 runs, 5 users." in out.getvalue()
+    path = tmp_path / f"run-{run.id}.jsonl.gz"
+    assert path.is_file()
+    assert not SimulationRun.objects.filter(id=run.id).exists()
+    assert UserProfile.objects.filter(run_id=run.id).count() == 0
+    assert Conversation.objects.count() == 2
+    assert FavoriteFood.objects.count() == 2
+    assert SimulationRun.objects.filter(id=kept.id).exists()
+
+    call_command("archive_runs", restore=[str(path)], chunk_size=2, stdout=io.StringIO())
+    restored = SimulationRun.objects.get(id=run.id)
+    assert restored.completed_users == 5
+    assert (restored.summary.users, restored.summary.total_tokens) == (5, 50)
+    users = UserProfile.objects.filter(run=restored)
+    assert {
+        u.id: (u.created_at, [m.prompt_text for m in u.messages.order_by("pk")]) for u in users
+    } == before
+    assert FavoriteFood.objects.filter(user__run=restored, catalog__food_name="banana").count() == 5
+    assert FavoriteFood.objects.filter(user__run=restored, catalog__isnull=True).count() == 5
+
+    # A run that is back in the database is not restored twice
+    with pytest.raises(Exception, match="already exists"):
+        call_command("archive_runs", restore=[str(path)], stdout=io.StringIO())
+
+
+def test_retention_policy_selects_old_runs_and_keeps_newest(tmp_path):
+    old = _make_run(1, started_days_ago=40)
+    older = _make_run(1, started_days_ago=50)
+    recent = _make_run(1, started_days_ago=1)
+    running = SimulationRun.objects.create(status=RunStatus.RUNNING, started_at=timezone.now() - timedelta(days=90))
+
+    out = io.StringIO()
+    call_command("archive_runs", older_than_days=30, keep_last=2, dry_run=True, stdout=out)
+    # The 2 newest runs are recent and old; running runs are never archived
+    assert str(older.id) in out.getvalue()
+    assert str(old.id) not in out.getvalue()
+    assert str(running.id) not in out.getvalue()
+    assert "1 runs would be archived." in out.getvalue()
+
+    call_command("archive_runs", older_than_days=30, out_dir=str(tmp_path), stdout=io.StringIO())
+    assert set(SimulationRun.objects.values_list("id", flat=True)) == {recent.id, running.id}
@@ -0,0 +1,73 @@
+import base64
+import json
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.test import RequestFactory
+
+from foods import async_views
+from foods.models import DietLabel, FavoriteFood, SimulationRun, UserProfile
+
+pytestmark = pytest.mark.django_db
+
+
+def _basic_header(username, password):
+    return "Basic " + base64.b64encode(f"{username}:{password}".encode()).decode()
+
+@pytest.fixture
+def auth_header():
+    get_user_model().objects.create_user(username="async", password="async-pass")
+    return _basic_header("async", "async-pass")
+
+@pytest.fixture
+def vegan_user():
+    user = UserProfile.objects.create(diet=DietLabel.VEGAN, run=SimulationRun.objects.create())
+    for rank, name in enumerate(["banana", "hummus", "falafel"], start=1):
+        FavoriteFood.objects.create(user=user, rank=rank, name_raw=name, food_name=name)
+    return user
+
+def test_async_veg_users_matches_sync_view(api_client, auth_header, vegan_user):
+    request = RequestFactory().get("/api/veg-users/", HTTP_AUTHORIZATION=auth_header)
+    res = async_to_sync(async_views.veg_users_view)(request)
+    assert res.status_code == 200
+    assert res.has_header("ETag")
+
+    api_client.credentials(HTTP_AUTHORIZATION=auth_header)
+    sync_res = api_client.get("/api/veg-users/")
+    assert json.loads(res.content) == json.loads(sync_res.content)
+
+    # Revalidation with the ETag short-circuits to 304
+    request = RequestFactory().get(
+        "/api/veg-users/", HTTP_AUTHORIZATION=auth_header, HTTP_IF_NONE_MATCH=res["ETag"]
+    )
+    assert async_to_sync(async_views.veg_users_view)(request).status_code == 304
+
+def test_async_veg_users_requires_auth():
+    request = RequestFactory().get("/api/veg-users/")
+    res = async_to_sync(async_views.veg_users_view)(request)
+    assert res.status_code == 401
+
+    request = RequestFactory().get("/api/veg-users/", HTTP_AUTHORIZATION=_basic_header("x", "y"))
+    assert async_to_sync(async_views.veg_users_view)(request).status_code == 401
+
+def test_async_diets_png(vegan_user):
+    request = RequestFactory().get("/ui/diets.png", {"diet": "vegan"})
+    res = async_to_sync(async_views.diets_png)(request)
+    assert res.status_code == 200
+    assert res.content.startswith(b"\x89PNG")
+
+
+# Methods and auth errors answer like the DRF views they replace
+@pytest.mark.parametrize("view, path", [(async_views.veg_users_view, "/api/veg-users/"),
+                                        (async_views.stats_view, "/api/stats/")])
+def test_async_views_reject_like_drf(api_client, auth_header, view, path):
+    cases = [("post", auth_header), ("post", None), ("get", None), ("delete", _basic_header("x", "y"))]
+    for method, header in cases:
+        extra = {"HTTP_AUTHORIZATION": header} if header else {}
+        res = async_to_sync(view)(getattr(RequestFactory(), method)(path, **extra))
+        api_client.credentials(**extra)
+        sync_res = getattr(api_client, method)(path)
+        assert (res.status_code, json.loads(res.content)) == (sync_res.status_code, sync_res.json())
+        assert res.get("WWW-Authenticate") == sync_res.get("WWW-Authenticate")
+    assert view.csrf_exempt
@@ -0,0 +1,54 @@
+import subprocess
+import sys
+import xml.etree.ElementTree as ET
+
+from conftest import DJANGO_APP_DIR
+
+from foods import charts
+
+
+def test_views_import_does_not_load_matplotlib():
+    code = (
+        "import sys, django; django.setup(); import foods.views, foods.urls; "
+        "sys.exit('matplotlib' in sys.modules)"
+    )
+    res = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=DJANGO_APP_DIR,
+        env={"DJANGO_SETTINGS_MODULE": "config.settings.dev", "PATH": ""},
+    )
+    assert res.returncode == 0
+
+def test_png_cached_by_count_vector():
+    counts = [{"diet": "vegan", "c": 3}, {"diet": "omnivore", "c": 1}]
+    charts._render_png.cache_clear()
+    first = charts.pie_png(counts)
+    second = charts.pie_png([dict(c) for c in counts])
+    assert first.startswith(b"\x89PNG")
+    assert second is first
+    assert charts._render_png.cache_info().hits == 1
+
+def test_svg_renders_slices_without_matplotlib():
+    svg = charts.pie_svg([{"diet": "vegan", "c": 3}, {"diet": "<b>", "c": 1}])
+    root = ET.fromstring(svg)
+    ns = "{http://www.w3.org/2000/svg}"
+    assert len(root.findall(f"{ns}path")) == 2
+    texts = [t.text for t in root.findall(f"{ns}text")]
+    assert "75.0%" in texts and "<b>" in texts
+
+    # No data renders a single full circle
+    root = ET.fromstring(charts.pie_svg([]))
+    assert root.find(f"{ns}circle") is not None
+
+    # Rendering an SVG in a fresh process never imports matplotlib
+    code = (
+        "import sys, django; django.setup(); from foods import charts; "
+        "charts.pie_svg([{'diet': 'vegan', 'c': 3}]); charts.pie_svg([]); "
+        "sys.exit('matplotlib' in sys.modules)"
+    )
+    res = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=DJANGO_APP_DIR,
+        env={"DJANGO_SETTINGS_MODULE": "config.settings.dev", "PATH": ""},
+    )
+    assert res.returncode == 0
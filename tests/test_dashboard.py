@@ -0,0 +1,70 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from foods.models import (
+    Conversation,
+    DietLabel,
+    FavoriteFood,
+    FoodCatalog,
+    MessageRole,
+    SimulationRun,
+    UserProfile,
+)
+
+pytestmark = pytest.mark.django_db
+
+
+def _make_users(n, run=None):
+    run = run or SimulationRun.objects.create()
+    banana, _ = FoodCatalog.objects.get_or_create(food_name="banana", defaults={"diet": DietLabel.VEGAN})
+    for i in range(n):
+        user = UserProfile.objects.create(diet=DietLabel.VEGAN, run=run)
+        FavoriteFood.objects.create(user=user, rank=2, name_raw="mystery", food_name=f"mystery {i}")
+        FavoriteFood.objects.create(user=user, rank=1, name_raw="banana", food_name="banana", catalog=banana)
+        Conversation.objects.create(user=user, role=MessageRole.A, total_tokens=10, run=run)
+        Conversation.objects.create(user=user, role=MessageRole.B, total_tokens=i, run=run)
+    return run
+
+
+def _dashboard_queries(client, **params):
+    with CaptureQueriesContext(connection) as ctx:
+        res = client.get("/ui/", params)
+    assert res.status_code == 200
+    return res, len(ctx.captured_queries)
+
+
+# Query count must not grow with the number of users on the page
+def test_dashboard_query_count_is_constant(client, monkeypatch):
+    import foods.views as views
+    monkeypatch.setattr(views, "DASHBOARD_PAGE_SIZE", 50)
+
+    run = _make_users(2)
+    _, small = _dashboard_queries(client, run_id=str(run.id))
+
+    run = _make_users(20)
+    _, large = _dashboard_queries(client, run_id=str(run.id))
+
+    assert small == large
+    # Includes the two run_id IS NULL reads for users and messages without a run
+    assert large <= 12
+
+def test_dashboard_rows_and_pagination(client, monkeypatch):
+    import foods.views as views
+    monkeypatch.setattr(views, "DASHBOARD_PAGE_SIZE", 2)
+    _make_users(3)
+
+    res = client.get("/ui/")
+    rows = res.context["rows"]
+    assert len(rows) == 2
+    # Favorites keep rank order, tokens come from the latest (B) conversation
+    assert rows[0]["foods"][0] == "banana"
+    assert rows[0]["tokens"] == 2
+    assert res.context["page"]["num_pages"] == 2
+
+    res = client.get("/ui/", {"page": 2})
+    assert len(res.context["rows"]) == 1
+    assert res.context["page"]["has_previous"]
+
+    seen = [s["food_name"] for s in res.context["seen_foods"]]
+    assert seen == ["banana", "mystery 0", "mystery 1", "mystery 2"]
@@ -0,0 +1,18 @@
+import sys
+
+import pytest
+from conftest import REPO_ROOT
+
+sys.path.insert(0, str(REPO_ROOT))
+
+from benchmarks.loadtest import parse_paths  # noqa: E402
+
+
+def test_parse_paths_keeps_query_strings_whole():
+    assert parse_paths("/api/veg-users/?page=2,/ui/?diet=vegan@3,POST /ops/run-sim/@0,/ui/=2") == [
+        ("GET", "/api/veg-users/?page=2", 1.0),
+        ("GET", "/ui/?diet=vegan", 3.0),
+        ("GET", "/ui/", 2.0),
+    ]
+    with pytest.raises(ValueError):
+        parse_paths("/ui/@lots")
@@ -0,0 +1,43 @@
+import structlog
+from structlog.testing import capture_logs
+
+from common.logging import EventVolume
+
+
+def _run(processor, event):
+    try:
+        return processor(None, "info", {"event": event})
+    except structlog.DropEvent:
+        return None
+
+
+def test_sampled_and_aggregated_events_are_counted():
+    volume = EventVolume({"user_done": 3}, {"catalog_hit"}, interval=3600)
+
+    kept = [_run(volume, "user_done") for _ in range(7)]
+    assert [e is not None for e in kept] == [True, False, False, True, False, False, True]
+    assert kept[0]["sampled_1_in"] == 3
+    assert all(_run(volume, "catalog_hit") is None for _ in range(5))
+    assert _run(volume, "other") == {"event": "other"}
+
+    with capture_logs() as emitted:
+        volume.flush()
+        volume.flush()
+    assert len(emitted) == 1
+    assert emitted[0]["event"] == "log.counters"
+    assert emitted[0]["counts"] == {"user_done": 7, "catalog_hit": 5}
+
+
+# Counts from a burst are written once the interval passes, with no later event to trigger it
+def test_counters_are_written_for_idle_windows():
+    import time
+
+    volume = EventVolume({}, {"catalog_hit"}, interval=0.05)
+    with capture_logs() as emitted:
+        for _ in range(3):
+            _run(volume, "catalog_hit")
+        deadline = time.monotonic() + 2
+        while not emitted and time.monotonic() < deadline:
+            time.sleep(0.01)
+        volume.stop()
+    assert emitted and emitted[0]["counts"] == {"catalog_hit": 3}
@@ -0,0 +1,79 @@
+import base64
+import os
+
+import pytest
+from django.contrib.auth import get_user_model
+
+from common import metrics
+
+# Allows db access to the tests
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def admin_client(api_client):
+    get_user_model().objects.create_superuser(username="ops", password="ops-pass")
+    api_client.credentials(
+        HTTP_AUTHORIZATION="Basic " + base64.b64encode(b"ops:ops-pass").decode()
+    )
+    return api_client
+
+
+def test_metrics_requires_admin(api_client):
+    get_user_model().objects.create_user(username="apiuser", password="secret123")
+    assert api_client.get("/ops/metrics").status_code in (401, 403)
+    api_client.login(username="apiuser", password="secret123")
+    assert api_client.get("/ops/metrics").status_code in (401, 403)
+
+
+def test_metrics_exposes_request_and_db_series(admin_client):
+    metrics.default_registry.clear()
+    assert admin_client.get("/api/stats/").status_code == 200
+
+    res = admin_client.get("/ops/metrics")
+    assert res.status_code == 200
+    assert res["Content-Type"].startswith("text/plain; version=0.0.4")
+    body = res.content.decode()
+    assert "# TYPE efb_http_request_duration_seconds histogram" in body
+    assert 'efb_http_request_duration_seconds_count{method="GET",status="200",view="api:stats"} 1' in body
+    assert 'efb_db_queries_per_request_bucket{view="api:stats",le="0"} 0' in body
+    assert 'efb_http_response_size_bytes_count{view="api:stats"} 1' in body
+
+
+# Every worker dumps its registry, a scrape from any of them sums all dumps
+def test_registries_merge_across_processes(tmp_path):
+    first = metrics.Registry(directory=str(tmp_path), flush_interval=3600)
+    second = metrics.Registry(directory=str(tmp_path), flush_interval=3600)
+    first.observe("efb_llm_request_duration_seconds", 0.3, purpose="top3")
+    second.observe("efb_llm_request_duration_seconds", 2.0, purpose="top3")
+    second.inc("efb_llm_tokens_total", 40, purpose="top3", direction="input")
+    second.flush()
+
+    body = metrics.render(first)
+    assert 'efb_llm_request_duration_seconds_bucket{purpose="top3",le="0.5"} 1' in body
+    assert 'efb_llm_request_duration_seconds_bucket{purpose="top3",le="2.5"} 2' in body
+    assert 'efb_llm_request_duration_seconds_count{purpose="top3"} 2' in body
+    assert 'efb_llm_request_duration_seconds_sum{purpose="top3"} 2.3' in body
+    assert 'efb_llm_tokens_total{direction="input",purpose="top3"} 40' in body
+
+
+# Dumps of exited processes are folded into one file: counters keep their totals, files do not pile up
+def test_dead_process_dumps_are_folded(tmp_path):
+    import json
+
+    dead_pid = 2 ** 22 + 12345  # above pid_max, never a live process
+    for n in range(3):
+        (tmp_path / f"{dead_pid}-{n:08x}.json").write_text(json.dumps(
+            [["efb_llm_tokens_total", [["direction", "input"], ["purpose", "top3"]], 10]]
+        ))
+    live = metrics.Registry(directory=str(tmp_path), flush_interval=3600)
+    live.inc("efb_llm_tokens_total", 5, purpose="top3", direction="input")
+
+    for _ in range(2):
+        assert 'efb_llm_tokens_total{direction="input",purpose="top3"} 35' in metrics.render(live)
+    assert sorted(p.name for p in tmp_path.glob("*.json")) == [live._file.name, metrics.EXITED_FILE]
+
+    # The hook folds a given worker even while the pid is still visible
+    metrics.mark_process_dead(os.getpid(), str(tmp_path))
+    assert [p.name for p in tmp_path.glob("*.json")] == [metrics.EXITED_FILE]
+    assert 'efb_llm_tokens_total{direction="input",purpose="top3"} 35' in metrics.render(metrics.Registry(directory=str(tmp_path)))
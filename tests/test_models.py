@@ -25,3 +25,19 @@ def test_related_names_exist_and_work():
     # Assert it includes the created instances
     assert conv in user.messages.all()
     assert food in user.foods.all()
+
+
+# The connection_created hook tunes every SQLite connection
+def test_sqlite_connection_pragmas():
+    from django.db import connection
+
+    from common import db
+
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA busy_timeout")
+        assert cursor.fetchone()[0] == db.SQLITE_BUSY_TIMEOUT_MS
+        cursor.execute("PRAGMA synchronous")
+        # 1 = NORMAL
+        assert cursor.fetchone()[0] == 1
+        cursor.execute("PRAGMA cache_size")
+        assert cursor.fetchone()[0] == db.SQLITE_CACHE_SIZE
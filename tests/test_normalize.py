@@ -0,0 +1,65 @@
+import csv
+
+import pytest
+from foods.catalog import SEED_PATH
+from foods.normalize import Normalizer, default_normalizer, normalize_food_name, normalize_many
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("  Banana!! ", "banana"),
+    ("Bananas", "banana"),
+    ("HUMUS", "hummus"),
+    ("Mac & Cheese", "mac and cheese"),
+    ("mac 'n' cheese", "mac and cheese"),
+    ("Cheese Burgers", "cheeseburger"),
+    ("Pizza Margharita", "margherita pizza"),
+    ("Crème  Brûlée", "creme brulee"),
+    ("Fish & Chips", "fish and chips"),
+    (None, ""),
+])
+def test_variants_fold_to_catalog_names(raw, expected):
+    assert normalize_food_name(raw) == expected
+
+
+# Seed names are already normal, and normalizing twice changes nothing
+def test_seed_names_are_fixed_points():
+    with open(SEED_PATH, newline="", encoding="utf-8") as f:
+        names = [row["food_name"] for row in csv.DictReader(f)]
+    assert normalize_many(names) == names
+    canonicals = set(default_normalizer.words.values()) | set(default_normalizer.phrases.values())
+    assert all(normalize_food_name(name) == name for name in canonicals)
+
+
+def test_normalize_many_keeps_order_and_the_cache_is_bounded():
+    normalizer = Normalizer({"humus": "hummus"}, {"mac n cheese": "mac and cheese"}, cache_size=2)
+    assert normalizer.many(["Humus", "mac n cheese", "Humus", "tofu"]) == [
+        "hummus", "mac and cheese", "hummus", "tofu",
+    ]
+    info = normalizer.cache_info()
+    assert info.misses == 3
+    assert info.currsize == 2
+
+
+# Rows stored under keys from an older normalizer are renamed, or merged into the current name
+@pytest.mark.django_db
+def test_renormalize_foods_rekeys_catalog_and_favorites():
+    from django.core.management import call_command
+    from foods.models import DietLabel, FavoriteFood, FoodCatalog, UserProfile
+
+    current = FoodCatalog.objects.create(food_name="mac and cheese", diet=DietLabel.VEGETARIAN)
+    old_dup = FoodCatalog.objects.create(food_name="mac n cheese", diet=DietLabel.VEGETARIAN, source="llm")
+    old = FoodCatalog.objects.create(food_name="lasagne", diet=DietLabel.OMNIVORE, source="llm")
+    user = UserProfile.objects.create()
+    FavoriteFood.objects.create(user=user, rank=1, name_raw="Mac n Cheese", food_name="mac n cheese", catalog=old_dup)
+    FavoriteFood.objects.create(user=user, rank=2, name_raw="Lasagne", food_name="lasagne", catalog=old)
+    FavoriteFood.objects.create(user=user, rank=3, name_raw="macaroni cheese", food_name="macaroni cheese")
+
+    call_command("renormalize_foods", "--dry-run")
+    assert FoodCatalog.objects.filter(food_name="lasagne").exists()
+
+    call_command("renormalize_foods")
+    assert set(FoodCatalog.objects.values_list("food_name", flat=True)) == {"mac and cheese", "lasagna"}
+    favs = {f.rank: f for f in FavoriteFood.objects.all()}
+    assert (favs[1].food_name, favs[1].catalog_id) == ("mac and cheese", current.pk)
+    assert (favs[2].food_name, favs[2].catalog_id) == ("lasagna", old.pk)
+    assert (favs[3].food_name, favs[3].catalog_id) == ("mac and cheese", current.pk)
@@ -0,0 +1,91 @@
+import base64
+
+import pytest
+from django.contrib.auth import get_user_model
+
+from common import profiling
+
+# Allows db access to the tests
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def _profile_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", tmp_path)
+    profiling.reset_rate_limit()
+
+
+def _basic(client, username, password):
+    creds = base64.b64encode(f"{username}:{password}".encode()).decode()
+    client.credentials(HTTP_AUTHORIZATION=f"Basic {creds}")
+    return client
+
+
+@pytest.fixture
+def staff_client(api_client):
+    get_user_model().objects.create_superuser(username="ops", password="ops-pass")
+    return _basic(api_client, "ops", "ops-pass")
+
+
+def test_staff_request_is_profiled_and_downloadable(staff_client):
+    res = staff_client.get("/api/stats/", HTTP_X_EFB_PROFILE="1")
+    assert res.status_code == 200
+    profile_id = res["X-EFB-Profile-Id"]
+
+    listing = staff_client.get("/ops/profiles/").json()["profiles"]
+    assert [p["id"] for p in listing] == [profile_id]
+    assert listing[0]["view"] == "api:stats"
+
+    download = staff_client.get(res["X-EFB-Profile-Url"])
+    assert download.status_code == 200
+    assert download["Content-Disposition"].startswith("attachment")
+
+    text = staff_client.get(f"/ops/profiles/{profile_id}?fmt=txt")
+    assert "cumulative" in text.content.decode()
+
+    assert staff_client.get("/ops/profiles/../../etc").status_code == 404
+
+
+def test_non_staff_requests_are_never_profiled(api_client):
+    get_user_model().objects.create_user(username="apiuser", password="secret123")
+    res = _basic(api_client, "apiuser", "secret123").get("/api/stats/?_profile=1")
+    assert res.status_code == 200
+    assert "X-EFB-Profile-Id" not in res
+    assert profiling.list_profiles() == []
+
+
+def test_profiles_are_rate_limited(staff_client, monkeypatch):
+    monkeypatch.setattr(profiling, "MAX_PER_MINUTE", 1)
+    assert "X-EFB-Profile-Id" in staff_client.get("/api/stats/?_profile=1")
+    res = staff_client.get("/api/stats/?_profile=1")
+    assert res.status_code == 200
+    assert res["X-EFB-Profile"] == "rate-limited"
+
+
+# A request arriving while another is profiled is served without a profile, not a 500
+def test_overlapping_profiled_requests(rf):
+    from django.http import HttpResponse
+
+    staff = get_user_model().objects.create_superuser(username="ops", password="ops-pass")
+
+    def _request():
+        request = rf.get("/api/stats/", HTTP_X_EFB_PROFILE="1")
+        request.user = staff
+        return request
+
+    inner = []
+
+    # The first request, while profiled, lets a second one through the middleware
+    def _view(request):
+        if not inner:
+            inner.append(None)
+            inner[0] = middleware(_request())
+        return HttpResponse("ok")
+
+    middleware = profiling.RequestProfilerMiddleware(_view)
+    outer = middleware(_request())
+
+    assert "X-EFB-Profile-Id" in outer
+    assert inner[0]["X-EFB-Profile"] == "busy"
+    assert "X-EFB-Profile-Id" not in inner[0]
+    assert len(profiling.list_profiles()) == 1
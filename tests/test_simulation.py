@@ -1,10 +1,18 @@
+import io
+
 import pytest
 from django.core.management import call_command
+from foods import summaries
 from foods.models import (
     Conversation,
     DietLabel,
     FavoriteFood,
     FoodCatalog,
+    FoodPair,
+    PromptTemplate,
+    RunStatus,
+    RunSummary,
+    SimulationRun,
     UserProfile,
 )
 
@@ -59,6 +67,39 @@ def test_simulate_foods_command_smoke_runs_with_fake_client(monkeypatch):
     # 3 favorites per user
     assert FavoriteFood.objects.count() == 6
 
+    # Run rollup was incremented per user
+    summary = RunSummary.objects.get()
+    assert summary.users == 2
+    assert summary.vegan == 2
+    # Second user retries the duplicate trio: 13 + 26 tokens
+    assert summary.total_tokens == 39
+    assert (summary.catalog_lookups, summary.catalog_hits) == (6, 6)
+    assert summary.catalog_hit_rate == 1.0
+
+    # The run itself is recorded with its parameters and outcome
+    run = SimulationRun.objects.get()
+    assert run.status == RunStatus.COMPLETED
+    assert (run.requested_users, run.completed_users) == (2, 2)
+    assert run.params["runs"] == 2
+    assert run.finished_at is not None
+    assert UserProfile.objects.filter(run=run).count() == 2
+
+    # Prompts are stored once as a template, each message keeps only its bucket and seed
+    assert PromptTemplate.objects.count() == 1
+    first = Conversation.objects.filter(role="A").order_by("created_at", "pk").first()
+    assert first.prompt == ""
+    assert first.prompt_params == {"bucket": sim.CUISINE_BUCKETS[0], "seed": f"{run.id}-0"}
+    assert first.prompt_text.startswith("Give your top-3 favorite foods.")
+    assert first.prompt_text.endswith(f"Use the perspective of {sim.CUISINE_BUCKETS[0]} cuisine.\n"
+                                      "Avoid globally popular defaults unless they truly fit the chosen cuisine: "
+                                      f"pizza, sushi, tacos, burger, pasta.\n(seed:{run.id}-0)")
+
+    # Rebuilding from the base tables yields the same counters
+    RunSummary.objects.all().delete()
+    summaries.rebuild()
+    rebuilt = RunSummary.objects.get()
+    assert (rebuilt.users, rebuilt.vegan, rebuilt.total_tokens) == (2, 2, 39)
+
 
 # All 3 foods already in catalog -> no classification
 # Conversation A gets tokens (top-3 call), Conversation B stays at zero
@@ -99,6 +140,9 @@ def test_catalog_first_records_tokens_in_A_but_not_B(monkeypatch):
     assert (b.completion_tokens or 0) == 0
     assert (b.total_tokens or 0) == 0
 
+    # The three catalog foods are counted in the co-occurrence index, both directions
+    assert FoodPair.objects.filter(users=1).count() == 6
+
 
 # If at least one food is unknown, classification fires and B records those token
 def test_unknown_food_triggers_classification_tokens_in_B(monkeypatch):
@@ -156,6 +200,36 @@ def test_unknown_food_triggers_classification_tokens_in_B(monkeypatch):
     assert user.diet == DietLabel.OMNIVORE
 
 
+# A food the LLM labelled for one user is a catalog hit for the next, live and rebuilt
+def test_rebuild_counts_catalog_hits_like_the_live_rollup(monkeypatch):
+    _seed_catalog_minimum()
+
+    class _FakeOpenAI:
+        input_tokens = output_tokens = 0
+
+        def cost_usd(self):
+            return 0.0
+
+        def ask_top_three_favorite_foods(self, prompt):
+            return ["banana", "mystery stew", "avocado toast"]
+
+        def classify_food_diet(self, food_name):
+            return "omnivore"
+
+    import foods.management.commands.simulate_foods as sim
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setattr(sim, "OpenAIClient", _FakeOpenAI, raising=True)
+
+    call_command("simulate_foods", runs=2)
+    live = RunSummary.objects.get()
+    assert (live.catalog_lookups, live.catalog_hits) == (6, 5)
+
+    RunSummary.objects.all().delete()
+    summaries.rebuild()
+    rebuilt = RunSummary.objects.get()
+    assert (rebuilt.catalog_lookups, rebuilt.catalog_hits) == (6, 5)
+
+
 # Top-3 succeeds, classification exceeds budget and raises
 # Transaction should roll back the user's creations for that run
 def test_budget_limiter_stops_run_and_rolls_back(monkeypatch):
@@ -199,3 +273,164 @@ def test_budget_limiter_stops_run_and_rolls_back(monkeypatch):
     assert UserProfile.objects.count() == 0
     assert Conversation.objects.count() == 0
     assert FavoriteFood.objects.count() == 0
+
+    run = SimulationRun.objects.get()
+    assert run.status == RunStatus.FAILED
+    assert "budget exceeded" in run.error
+    assert run.completed_users == 0
+
+
+# Warm snapshot answers known foods without a query, new ones still come from the DB
+def test_catalog_lookup_served_from_warm_snapshot(django_assert_num_queries):
+    from foods import catalog
+
+    _seed_catalog_minimum()
+    assert catalog.warm() == 3
+
+    with django_assert_num_queries(0):
+        assert catalog.lookup("Banana").diet == DietLabel.VEGAN
+
+    FoodCatalog.objects.create(food_name="pierogi", diet=DietLabel.VEGETARIAN)
+    with django_assert_num_queries(2):
+        assert catalog.lookup("pierogi").diet == DietLabel.VEGETARIAN
+        assert catalog.lookup("mystery stew") is None
+
+
+# Stage table on stdout, JSON profile and pstats written on request
+def test_simulate_foods_writes_stage_profile(monkeypatch, tmp_path):
+    import io
+    import json
+    import pstats
+
+    _seed_catalog_minimum()
+
+    class _FakeOpenAI:
+        input_tokens = 0
+        output_tokens = 0
+
+        def cost_usd(self):
+            return 0.0
+
+        def ask_top_three_favorite_foods(self, prompt):
+            return ["banana", "hummus", "mystery stew"]
+
+        def classify_food_diet(self, food_name):
+            return "omnivore"
+
+    import foods.management.commands.simulate_foods as sim
+    monkeypatch.setattr(sim, "OpenAIClient", _FakeOpenAI, raising=True)
+
+    profile_out = tmp_path / "stages.json"
+    cprofile_out = tmp_path / "run.prof"
+    out = io.StringIO()
+    call_command("simulate_foods", runs=2, profile_out=str(profile_out), cprofile=str(cprofile_out), stdout=out)
+
+    profile = json.loads(profile_out.read_text())
+    stages = {row["stage"]: row for row in profile["stages"]}
+    assert profile["users"] == 2
+    assert stages["llm.top3"]["calls"] >= 2
+    assert stages["catalog.lookup"]["calls"] == 6
+    assert stages["llm.classify"]["calls"] == 1
+    assert stages["db.commit"]["calls"] == 2
+    assert sum(row["seconds"] for row in profile["stages"]) == pytest.approx(profile["wall_seconds"], abs=1e-3)
+    assert "catalog.lookup" in out.getvalue()
+    assert pstats.Stats(str(cprofile_out)).total_calls > 0
+
+
+# Rows written before templates existed are moved over, the rendered text is unchanged
+def test_compact_prompts_moves_literal_prompts_to_templates():
+    user = UserProfile.objects.create()
+    texts = [
+        "Give your top-3 favorite foods.\nUse the perspective of African cuisine.\nCost: $5 {max}\n(seed:r-0)",
+        "Give your top-3 favorite foods.\nUse the perspective of Oceania / Pacific cuisine.\nCost: $5 {max}\n(seed:r-1)",
+        "Something else entirely",
+    ]
+    for role, text in zip("ABA", texts, strict=True):
+        Conversation.objects.create(user=user, role=role, prompt=text)
+
+    call_command("compact_prompts", "--dry-run", stdout=io.StringIO())
+    assert Conversation.objects.filter(prompt_template__isnull=True).count() == 3
+
+    out = io.StringIO()
+    call_command("compact_prompts", batch_size=2, stdout=out)
+    assert "Compacted 3 conversations into 2 templates" in out.getvalue()
+    assert PromptTemplate.objects.count() == 2
+    rows = list(Conversation.objects.select_related("prompt_template").order_by("pk"))
+    assert [row.prompt for row in rows] == ["", "", ""]
+    assert [row.prompt_text for row in rows] == texts
+    assert rows[0].prompt_template_id == rows[1].prompt_template_id
+    assert rows[1].prompt_params == {"bucket": "Oceania / Pacific", "seed": "r-1"}
+
+
+# Upgrade from the layout before SimulationRun: plain run_id columns, no run table
+@pytest.mark.django_db(transaction=True)
+def test_migrate_backfills_runs_written_before_the_run_table():
+    import uuid
+
+    from django.db import connection, models
+
+    def plain_run_id():
+        field = models.UUIDField(null=True, blank=True)
+        field.set_attributes_from_name("run_id")
+        return field
+
+    legacy = [(UserProfile, UserProfile._meta.get_field("run")), (Conversation, Conversation._meta.get_field("run"))]
+    with connection.schema_editor() as editor:
+        editor.delete_model(RunSummary)
+        for model, field in legacy:
+            editor.alter_field(model, field, plain_run_id())
+        editor.delete_model(SimulationRun)
+
+    try:
+        run_id = uuid.uuid4()
+        with connection.cursor() as cursor:
+            for diet in (DietLabel.VEGAN, DietLabel.VEGAN, DietLabel.OMNIVORE):
+                cursor.execute(
+                    "INSERT INTO user_profile (id, diet, run_id, created_at) VALUES (%s, %s, %s, %s)",
+                    [uuid.uuid4().hex, diet, run_id.hex, "2024-01-01 10:00:00"],
+                )
+
+        call_command("migrate", run_syncdb=True, verbosity=0)
+
+        run = SimulationRun.objects.get(id=run_id)
+        assert (run.status, run.completed_users) == (RunStatus.COMPLETED, 3)
+        assert (run.summary.users, run.summary.vegan, run.summary.omnivore) == (3, 2, 1)
+        summaries.rebuild()
+        assert RunSummary.objects.get().users == 3
+        assert summaries.stats()["totals"]["users"] == 3
+    finally:
+        with connection.schema_editor() as editor:
+            for model, field in legacy:
+                editor.alter_field(model, plain_run_id(), field)
+
+
+# Catalog edits committed while a run is in progress reach the users simulated after them
+@pytest.mark.django_db(transaction=True)
+def test_simulate_refreshes_the_catalog_snapshot_between_users(monkeypatch):
+    from foods import catalog
+
+    _seed_catalog_minimum()
+    monkeypatch.setattr(catalog, "SNAPSHOT_TTL", 0)
+
+    class _FakeOpenAI:
+        input_tokens = output_tokens = 0
+
+        def cost_usd(self):
+            return 0.0
+
+        def ask_top_three_favorite_foods(self, prompt):
+            banana = FoodCatalog.objects.get(food_name="banana")
+            if banana.diet == DietLabel.VEGAN:
+                banana.diet = DietLabel.OMNIVORE
+                banana.save()
+            return ["banana", "avocado toast", "hummus"]
+
+    import foods.management.commands.simulate_foods as sim
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setattr(sim, "OpenAIClient", _FakeOpenAI, raising=True)
+
+    call_command("simulate_foods", runs=2)
+
+    # The first user still read the label from before the edit, the second sees it
+    diets = list(UserProfile.objects.order_by("created_at", "pk").values_list("diet", flat=True))
+    assert diets == [DietLabel.VEGAN, DietLabel.OMNIVORE]